@@ -1,35 +1,80 @@
-import atexit
 import os
 
-from dotenv import load_dotenv
 from fastapi import HTTPException, status
 from pymongo import MongoClient
 from pymongo.database import Database
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConfigurationError, PyMongoError
 
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
+from app.configurations.settings import get_env
+
+MONGO_URI = get_env("MONGO_URI")
+MONGO_DB_NAME = get_env("MONGO_DB_NAME", "farm_db")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(get_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+
+# Client toàn cục của process hiện tại. Không tạo ở thời điểm import để mỗi worker
+# (uvicorn --workers / gunicorn) tự mở connection pool của riêng nó sau khi fork.
+_client = None
+db = None
+
+
+def init_mongo_client(uri: str = None):
+    """
+    Khởi tạo MongoClient cho process hiện tại. An toàn để gọi nhiều lần.
+    Được gọi trong `lifespan` của app (chạy trong từng worker, sau khi fork).
+
+    Không ping ở đây: MongoClient tự kết nối ở background, nên một Mongo không truy cập được
+    không chặn startup. Dùng `ping_mongo()` để kiểm tra kết nối.
+    """
+    global _client, db
+    if _client is not None:
+        return _client
+
+    uri = uri or MONGO_URI
+    if not uri:
+        print("MONGO_URI not set")
+        return None
 
-client = None
-if MONGO_URI:
     try:
-        client = MongoClient(MONGO_URI)
-        client.admin.command('ping')
-        print("MongoDB connection successful.")
-    except (ConnectionFailure, AttributeError) as e:
+        _client = MongoClient(uri, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
+        db = _client[MONGO_DB_NAME]
+        print(f"MongoDB client initialized (pid {os.getpid()}).")
+    except (ConfigurationError, ValueError) as e:
+        print(f"Could not create MongoDB client: {e}")
+        _client = None
+        db = None
+
+    return _client
+
+
+def ping_mongo() -> bool:
+    """Ping MongoDB bằng client hiện tại; trả False nếu chưa khởi tạo hoặc không kết nối được."""
+    if _client is None:
+        return False
+    try:
+        _client.admin.command('ping')
+        return True
+    except PyMongoError as e:
         print(f"Could not connect to MongoDB: {e}")
-        client = None
-else:
-    print("MONGO_URI not set")
-
-if client is not None:
-    db: Database = client["farm_db"]
-else:
-    db = None
-
-# Đảm bảo đóng kết nối khi server dừng (chỉ đăng ký khi client tồn tại)
-if client is not None:
-    atexit.register(lambda: client.close())
+        return False
+
+
+def get_mongo_client():
+    """Trả về client của process hiện tại (có thể là None nếu chưa khởi tạo)."""
+    return _client
+
+
+def close_mongo_client():
+    """Đóng client của process hiện tại nếu nó tồn tại."""
+    global _client, db
+    try:
+        if _client is not None:
+            _client.close()
+            print("MongoDB client closed.")
+    except Exception as e:
+        print(f"Error closing MongoDB client: {e}")
+    finally:
+        _client = None
+        db = None
 
 
 def get_db() -> Database:
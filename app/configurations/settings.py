@@ -0,0 +1,19 @@
+import os
+
+from dotenv import load_dotenv
+
+_env_loaded = False
+
+
+def load_env():
+    """Nạp file .env đúng một lần cho cả process (thay vì mỗi module tự gọi load_dotenv)."""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_env(name: str, default=None):
+    """os.getenv sau khi đảm bảo .env đã được nạp."""
+    load_env()
+    return os.getenv(name, default)
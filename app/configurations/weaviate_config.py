@@ -1,30 +1,46 @@
-import os
-import weaviate
-from dotenv import load_dotenv
+import threading
 
-load_dotenv()
-WEAVIATE_HOST = os.getenv("WEAVIATE_HOST", "localhost")
-WEAVIATE_PORT = int(os.getenv("WEAVIATE_PORT", 8081))
+from app.configurations.settings import get_env
+
+WEAVIATE_HOST = get_env("WEAVIATE_HOST", "localhost")
+WEAVIATE_PORT = int(get_env("WEAVIATE_PORT", 8081))
 
 # Biến client toàn cục
 _client = None
+# init có thể được gọi đồng thời từ lifespan và health prober
+_init_lock = threading.Lock()
 
 
-def init_weaviate_client(host: str = None, port: int = None):
+def init_weaviate_client(host: str = None, port: int = None, blocking: bool = True):
     """
     Khởi tạo client Weaviate toàn cục. An toàn để gọi nhiều lần.
     Phiên bản này không còn xử lý API key của Google.
+    `blocking=False`: đang có một lượt kết nối khác chạy thì trả về None ngay thay vì chờ lượt đó.
     """
-    global _client
     if _client is not None:
         # Client đã được khởi tạo, trả về ngay lập tức
         return _client
 
+    if not _init_lock.acquire(blocking=blocking):
+        return None
+    try:
+        if _client is not None:
+            return _client
+        return _connect(host, port)
+    finally:
+        _init_lock.release()
+
+
+def _connect(host: str = None, port: int = None):
+    global _client
     # Sử dụng giá trị mặc định nếu không được cung cấp
     host = host or WEAVIATE_HOST
     port = port or WEAVIATE_PORT
 
     try:
+        # import lười: weaviate SDK nặng, chỉ nạp khi thật sự kết nối
+        import weaviate
+
         # Kết nối tới Weaviate không cần headers chứa API key
         _client = weaviate.connect_to_local(host=host, port=port)
 
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,19 +7,50 @@ from app.routes import chat
 from app.routes import conversation
 from app.routes import message_route
 from app.routes import knowledge
+from app.routes import health
+from app.routes import analytics
 
+from app.configurations.mongo_config import init_mongo_client, close_mongo_client
 from app.configurations.weaviate_config import init_weaviate_client, close_weaviate_client
+from app.services.batch_snapshot_service import batch_snapshots
+from app.services.cleanup_service import conversation_cleanup
+from app.services.embedding_service import close_embedding_service, warm_embedding_service
+from app.services.health_service import health_prober
+from app.services.message_retention_service import message_retention
+from app.services.speculative_prefetch import speculative_prefetch
+from app.utils.cache_backend import close_caches
+from app.utils.compression import CompressionMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Initialize resources on startup
-    init_weaviate_client()
+    # Initialize resources on startup. Lifespan chạy trong từng worker (sau khi fork),
+    # nên mỗi worker có client Mongo/Weaviate của riêng nó.
+    # Không chặn startup vì dependency chậm/không truy cập được: MongoClient tự kết nối ở
+    # background, còn kết nối Weaviate chạy trong thread; health prober ping các dependency định kỳ.
+    init_mongo_client()
+    startup_tasks = [
+        asyncio.create_task(asyncio.to_thread(init_weaviate_client)),
+        asyncio.create_task(asyncio.to_thread(warm_embedding_service)),
+    ]
+    health_prober.start()
+    batch_snapshots.start()
+    conversation_cleanup.start()
+    message_retention.start()
     try:
         yield
     finally:
         # Close/cleanup resources on shutdown
+        await health_prober.stop()
+        await batch_snapshots.stop()
+        await conversation_cleanup.stop()
+        await message_retention.stop()
+        await asyncio.wait(startup_tasks, timeout=5)
         close_weaviate_client()
+        close_mongo_client()
+        close_embedding_service()
+        speculative_prefetch.close()
+        close_caches()
 
 app = FastAPI(
     title="Farm AI Chatbot API",
@@ -45,11 +77,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Nén gzip/brotli các response một khối (lịch sử conversation/message); streaming đi nguyên
+app.add_middleware(CompressionMiddleware)
+
 # Mount routers (removed the message router)
 app.include_router(chat.router, prefix="/api")
 app.include_router(conversation.router, prefix="/api", tags=["Conversations"])
 app.include_router(message_route.router, prefix="/api", tags=["Messages"])
 app.include_router(knowledge.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
+app.include_router(health.router)
 
 
 @app.get("/", tags=["Root"])
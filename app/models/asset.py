@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class LatestAssetState:
+    """Trạng thái mới nhất của một đàn: chỉ `details` của entry history cuối cùng, không giữ cả mảng history."""
+    asset_id: str
+    details: Dict[str, Any]
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> Optional["LatestAssetState"]:
+        """Dựng từ document `batches` đã project `history: {$slice: -1}` (hoặc `latest` từ aggregation)."""
+        asset_id = doc.get("assetID")
+        if not asset_id:
+            return None
+        latest = doc.get("latest")
+        if latest is None:
+            history = doc.get("history") or []
+            latest = history[-1] if history else {}
+        details = latest.get("details") if isinstance(latest, dict) else None
+        return cls(asset_id=asset_id, details=details or {})
+
+    @property
+    def feeds(self) -> Optional[List[Dict[str, Any]]]:
+        return self.details.get("feeds")
+
+    @property
+    def medications(self) -> Optional[List[Dict[str, Any]]]:
+        return self.details.get("medications")
+
+    def as_trace(self) -> Dict[str, Any]:
+        """Dạng tương thích với payload của trace API để handler định dạng như cũ."""
+        return {"assetID": self.asset_id, "history": [{"details": self.details}]}
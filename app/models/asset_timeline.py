@@ -0,0 +1,115 @@
+"""Timeline feeds/medications của một đàn dựng từ toàn bộ `history`/`fullHistory`, truy vấn theo khoảng thời gian.
+
+Mỗi entry history chứa trạng thái feeds/medications tại thời điểm đó nên cùng một feed xuất hiện lặp lại
+qua nhiều entry; timeline gộp trùng theo (tên, ngày bắt đầu) / (tên, ngày áp dụng). Sự kiện được sắp theo
+thời gian và truy vấn bằng bisect:
+- medication là sự kiện điểm (ngày áp dụng),
+- feed là khoảng [startDate, endDate]; để tìm các khoảng giao với [start, end] dùng thêm mảng max tiền tố
+  của endDate (không giảm) nên cả hai đầu đều bisect được.
+"""
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from itertools import accumulate
+from typing import Any, List, Optional, Tuple
+
+from app.models.asset_trace import FeedEntry, MedicationEntry, parse_feed_entry, parse_medication_entry, as_list
+
+_ENTRY_TIME_KEYS = ("timestamp", "date", "createdAt", "eventDate")
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """ISO 8601 (có/không giờ, có hậu tố Z) hoặc epoch giây; thiếu timezone thì coi là UTC."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, (int, float)):
+        dt = datetime.fromtimestamp(value, UTC)
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            return None
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=UTC)
+
+
+@dataclass(slots=True, frozen=True)
+class FeedPeriod:
+    start: datetime
+    end: datetime
+    feed: FeedEntry
+
+
+@dataclass(slots=True, frozen=True)
+class MedicationEvent:
+    at: datetime
+    medication: MedicationEntry
+
+
+class AssetTimeline:
+    __slots__ = ("asset_id", "origin", "feeds", "medications", "_feed_starts", "_feed_max_ends", "_med_times")
+
+    def __init__(self, asset_id: str, feeds: List[FeedPeriod], medications: List[MedicationEvent],
+                 origin: Optional[datetime] = None):
+        self.asset_id = asset_id
+        self.feeds = sorted(feeds, key=lambda f: f.start)
+        self.medications = sorted(medications, key=lambda m: m.at)
+        starts = [f.start for f in self.feeds] + [m.at for m in self.medications]
+        # mốc "ngày 0" của đàn: do caller cung cấp, không thì lấy sự kiện sớm nhất
+        self.origin = origin or (min(starts) if starts else None)
+        self._feed_starts = [f.start.timestamp() for f in self.feeds]
+        self._feed_max_ends = list(accumulate((f.end.timestamp() for f in self.feeds), max))
+        self._med_times = [m.at.timestamp() for m in self.medications]
+
+    @classmethod
+    def from_payload(cls, payload: dict, asset_id: Optional[str] = None) -> "AssetTimeline":
+        payload = payload or {}
+        history = payload.get("fullHistory") or payload.get("history") or []
+
+        feeds: dict[Tuple[str, datetime], FeedPeriod] = {}
+        medications: dict[Tuple[str, datetime], MedicationEvent] = {}
+        first_entry_at: Optional[datetime] = None
+        for entry in history:
+            if not isinstance(entry, dict):
+                continue
+            entry_at = next((parse_datetime(entry.get(k)) for k in _ENTRY_TIME_KEYS if entry.get(k)), None)
+            if entry_at is not None and (first_entry_at is None or entry_at < first_entry_at):
+                first_entry_at = entry_at
+            details = entry.get("details") or {}
+
+            for raw in as_list(details.get("feeds") or details.get("feed")):
+                feed = parse_feed_entry(raw)
+                start = parse_datetime(feed.start_date) or entry_at
+                if start is None:
+                    continue
+                end = parse_datetime(feed.end_date) or start
+                feeds.setdefault((feed.name, start), FeedPeriod(start=start, end=max(start, end), feed=feed))
+
+            for raw in as_list(details.get("medications") or details.get("medication")):
+                medication = parse_medication_entry(raw)
+                at = parse_datetime(medication.date_applied) or entry_at
+                if at is not None:
+                    medications.setdefault((medication.name, at), MedicationEvent(at=at, medication=medication))
+
+        return cls(asset_id or payload.get("assetID") or "", list(feeds.values()), list(medications.values()),
+                   origin=first_entry_at)
+
+    def day(self, n: float) -> Optional[datetime]:
+        """Thời điểm ứng với "ngày thứ n" của đàn (tính từ origin)."""
+        return self.origin + timedelta(days=n) if self.origin is not None else None
+
+    def medications_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[MedicationEvent]:
+        lo = bisect_left(self._med_times, start.timestamp()) if start else 0
+        hi = bisect_right(self._med_times, end.timestamp()) if end else len(self._med_times)
+        return self.medications[lo:hi]
+
+    def feeds_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[FeedPeriod]:
+        """Các giai đoạn cho ăn giao với [start, end]."""
+        # các feed bắt đầu sau `end` bị loại; trước `lo` thì max endDate tiền tố vẫn < start nên cũng bị loại
+        hi = bisect_right(self._feed_starts, end.timestamp()) if end else len(self.feeds)
+        if start is None:
+            return self.feeds[:hi]
+        start_ts = start.timestamp()
+        lo = bisect_left(self._feed_max_ends, start_ts)
+        return [f for f in self.feeds[lo:hi] if f.end.timestamp() >= start_ts]
@@ -0,0 +1,119 @@
+"""Chuẩn hoá payload của trace API (hoặc snapshot `batches`) một lần thành cấu trúc gọn, có kiểu.
+
+Payload thực tế không đồng nhất: `fullHistory` hoặc `history`, `feeds` hoặc `feed`, `name` hoặc
+`feedName`/`medicationName`, `dateApplied` hoặc `appliedDate`... Parser xử lý mọi biến thể ở một chỗ
+và tính sẵn phần mô tả feeds/medications của trạng thái mới nhất để handler chỉ việc ghép câu trả lời.
+"""
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+UNNAMED = "(không tên)"
+
+
+@dataclass(slots=True, frozen=True)
+class FeedEntry:
+    name: str
+    dosage_kg: Any = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    notes: Optional[str] = None
+
+    def describe(self) -> str:
+        seg = self.name
+        if self.dosage_kg is not None:
+            seg += f" — liều {self.dosage_kg} kg/con/ngày"
+        if self.start_date or self.end_date:
+            seg += f" (từ {self.start_date or '??'} đến {self.end_date or '??'})"
+        if self.notes:
+            seg += f"; Ghi chú: {self.notes}"
+        return seg
+
+
+@dataclass(slots=True, frozen=True)
+class MedicationEntry:
+    name: str
+    dose: Any = None
+    date_applied: Optional[str] = None
+    next_due_date: Optional[str] = None
+
+    def describe(self) -> str:
+        seg = self.name
+        if self.dose:
+            seg += f" — liều: {self.dose}"
+        if self.date_applied:
+            seg += f"; đã áp dụng: {self.date_applied}"
+        if self.next_due_date:
+            seg += f"; hạn tiếp theo: {self.next_due_date}"
+        return seg
+
+
+@dataclass(slots=True, frozen=True)
+class AssetTrace:
+    asset_id: str
+    # False khi payload không có entry history nào có `details`
+    has_latest_details: bool
+    feeds: Tuple[FeedEntry, ...]
+    medications: Tuple[MedicationEntry, ...]
+    # mô tả đã ghép sẵn ("A — liều 2.5 kg/con/ngày, B"); rỗng khi không có dữ liệu
+    feed_summary: str
+    medication_summary: str
+
+
+def as_list(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def parse_feed_entry(item) -> FeedEntry:
+    if not isinstance(item, dict):
+        return FeedEntry(name=str(item))
+    return FeedEntry(
+        name=item.get("name") or item.get("feedName") or UNNAMED,
+        dosage_kg=item.get("dosageKg"),
+        start_date=item.get("startDate"),
+        end_date=item.get("endDate"),
+        notes=item.get("notes"),
+    )
+
+
+def parse_medication_entry(item) -> MedicationEntry:
+    if not isinstance(item, dict):
+        return MedicationEntry(name=str(item))
+    return MedicationEntry(
+        name=item.get("name") or item.get("medicationName") or UNNAMED,
+        dose=item.get("dose"),
+        date_applied=item.get("dateApplied") or item.get("appliedDate"),
+        next_due_date=item.get("nextDueDate"),
+    )
+
+
+def parse_asset_trace(payload: dict, asset_id: Optional[str] = None) -> AssetTrace:
+    """
+    Chỉ đọc entry history cuối cùng. Feeds/medications lấy từ `details` của entry đó; thiếu thì dùng
+    các field cùng tên ở cấp trên cùng của payload (feeds chỉ khi entry cuối có `details`).
+    """
+    payload = payload or {}
+    history = payload.get("fullHistory") or payload.get("history") or []
+    latest = history[-1] if history else None
+    details = (latest.get("details") or {}) if isinstance(latest, dict) else {}
+
+    feeds_raw = []
+    if details:
+        feeds_raw = as_list(details.get("feeds") or details.get("feed")) \
+            or as_list(payload.get("feed") or payload.get("feeds"))
+    meds_raw = as_list(details.get("medications") or details.get("medication")) \
+        or as_list(payload.get("medications") or payload.get("medication"))
+
+    feeds = tuple(parse_feed_entry(f) for f in feeds_raw)
+    medications = tuple(parse_medication_entry(m) for m in meds_raw)
+    return AssetTrace(
+        asset_id=asset_id or payload.get("assetID") or "",
+        has_latest_details=bool(details),
+        feeds=feeds,
+        medications=medications,
+        feed_summary=", ".join(f.describe() for f in feeds),
+        medication_summary=", ".join(m.describe() for m in medications),
+    )
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from bson import ObjectId
 from pydantic import BaseModel, Field, ConfigDict, field_serializer
@@ -20,6 +21,11 @@ class ConversationInDB(ConversationBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # tóm tắt do ConversationRepository.record_messages duy trì; None = conversation cũ chưa backfill
+    message_count: Optional[int] = None
+    last_message_preview: Optional[str] = None
+    last_sender: Optional[str] = None
+    last_message_at: Optional[datetime] = None
 
     model_config = ConfigDict(
         populate_by_name=True,
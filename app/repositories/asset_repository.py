@@ -1,15 +1,22 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Iterable
 
 from pymongo.database import Database
 
+from app.models.asset import LatestAssetState
+
+# Chỉ lấy entry history cuối cùng thay vì cả mảng (đàn nuôi lâu có hàng nghìn sự kiện).
+LATEST_HISTORY_PROJECTION = {"_id": 0, "assetID": 1, "history": {"$slice": -1}}
+
 
 class AssetRepository:
     def __init__(self, db: Database):
         self._collection = db["batches"]
 
-    def find_by_asset_and_facility(self, asset_id: str, facility_id: str) -> Optional[Dict[str, Any]]:
+    def find_by_asset_and_facility(self, asset_id: str, facility_id: str,
+                                   projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         try:
-            asset = self._collection.find_one({"assetID": asset_id, "history.details.facilityID": facility_id})
+            asset = self._collection.find_one({"assetID": asset_id, "history.details.facilityID": facility_id},
+                                              projection)
             if asset is None:
                 return None
             # convert to plain dict so callers can modify/format fields safely
@@ -17,3 +24,103 @@ class AssetRepository:
         except Exception as e:
             print(f"AssetRepository.find_by_asset_and_facility error: {e}")
             return None
+
+    def find_latest_state(self, asset_id: str, facility_id: str) -> Optional[LatestAssetState]:
+        asset = self.find_by_asset_and_facility(asset_id, facility_id, LATEST_HISTORY_PROJECTION)
+        return LatestAssetState.from_doc(asset) if asset else None
+
+    def find_latest_states(self, asset_ids: Iterable[str], facility_id: str) -> Dict[str, LatestAssetState]:
+        """Multi-get: trạng thái mới nhất của nhiều đàn trong một query, key theo assetID."""
+        asset_ids = list(dict.fromkeys(asset_ids))
+        if not asset_ids:
+            return {}
+        try:
+            cursor = self._collection.find(
+                {"assetID": {"$in": asset_ids}, "history.details.facilityID": facility_id},
+                LATEST_HISTORY_PROJECTION,
+            )
+            states = (LatestAssetState.from_doc(doc) for doc in cursor)
+            return {state.asset_id: state for state in states if state is not None}
+        except Exception as e:
+            print(f"AssetRepository.find_latest_states error: {e}")
+            return {}
+
+    def find_latest_states_by_facility(self, facility_id: str) -> List[LatestAssetState]:
+        """
+        Một lượt aggregation cho mọi đàn của facility: chỉ trả assetID và phần feeds/medications của
+        entry history cuối cùng, không kéo cả mảng history về app.
+        """
+        pipeline = [
+            {"$match": {"history.details.facilityID": facility_id}},
+            {"$project": {"_id": 0, "assetID": 1, "latest": {"$arrayElemAt": ["$history", -1]}}},
+            {"$project": {
+                "assetID": 1,
+                "latest.details.feeds": 1,
+                "latest.details.feed": 1,
+                "latest.details.medications": 1,
+                "latest.details.medication": 1,
+            }},
+        ]
+        # không nuốt lỗi: caller cần phân biệt "facility không có đàn nào" với "Mongo lỗi"
+        states = (LatestAssetState.from_doc(doc) for doc in self._collection.aggregate(pipeline))
+        return [state for state in states if state is not None]
+
+    def history_sizes_by_facility(self, facility_id: str) -> Dict[str, int]:
+        """Số entry history của từng đàn (tính ở server bằng $size), dùng để phát hiện đàn có thay đổi."""
+        pipeline = [
+            {"$match": {"history.details.facilityID": facility_id}},
+            {"$project": {"_id": 0, "assetID": 1, "historySize": {"$size": {"$ifNull": ["$history", []]}}}},
+        ]
+        return {row["assetID"]: row["historySize"] for row in self._collection.aggregate(pipeline) if row.get("assetID")}
+
+    def analytics_rows_by_facility(self, facility_id: str,
+                                   asset_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Mỗi đàn một dòng gọn cho analytics, tính hoàn toàn ở server từ entry history cuối cùng:
+        {assetID, historySize, feeds: [tên feed], dueMedications: [{name, nextDueDate}]}.
+        `asset_ids` giới hạn lại các đàn cần đọc (refresh tăng dần).
+        """
+        match: Dict[str, Any] = {"history.details.facilityID": facility_id}
+        if asset_ids is not None:
+            match["assetID"] = {"$in": list(asset_ids)}
+
+        def item_name(var: str, alias: str) -> dict:
+            # phần tử là object thì lấy name/<alias>, là chuỗi thì dùng chính nó
+            return {"$cond": [
+                {"$eq": [{"$type": var}, "object"]},
+                {"$ifNull": [f"{var}.name", {"$ifNull": [f"{var}.{alias}", "(không tên)"]}]},
+                {"$toString": var},
+            ]}
+
+        def as_array(field: str, alias: str) -> dict:
+            value = {"$ifNull": [f"$latest.details.{field}", f"$latest.details.{alias}"]}
+            return {"$cond": [{"$isArray": [value]}, value, []]}
+
+        pipeline = [
+            {"$match": match},
+            {"$project": {
+                "_id": 0,
+                "assetID": 1,
+                "historySize": {"$size": {"$ifNull": ["$history", []]}},
+                "latest": {"$arrayElemAt": ["$history", -1]},
+            }},
+            {"$project": {
+                "assetID": 1,
+                "historySize": 1,
+                "feeds": {"$map": {
+                    "input": as_array("feeds", "feed"),
+                    "as": "f",
+                    "in": item_name("$$f", "feedName"),
+                }},
+                "dueMedications": {"$map": {
+                    "input": {"$filter": {
+                        "input": as_array("medications", "medication"),
+                        "as": "m",
+                        "cond": {"$and": [{"$eq": [{"$type": "$$m"}, "object"]}, {"$gt": ["$$m.nextDueDate", None]}]},
+                    }},
+                    "as": "m",
+                    "in": {"name": item_name("$$m", "medicationName"), "nextDueDate": "$$m.nextDueDate"},
+                }},
+            }},
+        ]
+        return list(self._collection.aggregate(pipeline))
@@ -0,0 +1,213 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from bson import Binary, ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+from app.models.message import MessageCreate, MessageInDB
+from app.repositories.message_archive_repository import ARCHIVE_CODEC, decode_messages, encode_messages
+
+MESSAGE_BUCKET_COLLECTION = "message_buckets"
+
+# collection (theo full_name) đã đảm bảo index trong process này
+_indexed_collections: set[str] = set()
+
+
+def _bucket_message(msg: MessageCreate, timestamp: datetime) -> Dict[str, Any]:
+    doc = msg.model_dump()
+    doc["_id"] = ObjectId()
+    doc["timestamp"] = timestamp
+    return doc
+
+
+def _to_raw(convo_id: ObjectId, doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "_id": str(doc["_id"]),
+        "conversation_id": str(convo_id),
+        "sender_type": doc["sender_type"],
+        "content": doc.get("content", ""),
+        "sender_id": doc.get("sender_id"),
+        "timestamp": doc["timestamp"],
+    }
+
+
+def _to_model(convo_id: ObjectId, doc: Dict[str, Any]) -> MessageInDB:
+    return MessageInDB(**_to_raw(convo_id, doc))
+
+
+class BucketedMessageRepository:
+    """
+    Engine lưu message theo bucket pattern (MESSAGE_STORAGE=buckets): mỗi document của `message_buckets`
+    chứa tối đa `bucket_size` message liên tiếp của một conversation, kèm `seq`, `count`, `first_ts`, `last_ts`.
+
+    Bucket mới (seq + 1) chỉ được tạo khi bucket cuối đã đầy, nên message thứ i nằm ở bucket
+    i // bucket_size: đọc một trang chỉ chạm một hai bucket. Ghi là một `$push` có điều kiện
+    (`count` còn chỗ) lên bucket cuối; hết chỗ thì insert bucket mới, unique index (conversation_id, seq)
+    giải quyết hai request cùng mở bucket mới.
+
+    Thứ tự trong bucket là thứ tự ghi, còn MessageRepository sắp theo timestamp: người gọi phải ghi message của
+    một conversation theo timestamp tăng dần (create_many tự sắp trong một lượt ghi) để hai engine trả cùng thứ tự.
+
+    Bucket đã đầy và cũ có thể được nén tại chỗ (`payload` zlib thay cho `messages`) bởi retention.
+    Cùng API với MessageRepository.
+    """
+
+    def __init__(self, db: Database, bucket_size: int = 100):
+        self.collection = db[MESSAGE_BUCKET_COLLECTION]
+        self.bucket_size = bucket_size
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        if self.collection.full_name in _indexed_collections:
+            return
+        self.collection.create_index([("conversation_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+        self.collection.create_index([("last_ts", ASCENDING)])
+        _indexed_collections.add(self.collection.full_name)
+
+    # ---- ghi -----------------------------------------------------------------
+    def _last_bucket(self, convo_id: ObjectId) -> Optional[Dict[str, Any]]:
+        return self.collection.find_one({"conversation_id": convo_id}, {"seq": 1, "count": 1},
+                                        sort=[("seq", DESCENDING)])
+
+    def _append(self, convo_id: ObjectId, docs: List[Dict[str, Any]]):
+        """Nối các message vào cuối conversation, mở bucket mới khi bucket cuối đầy."""
+        pending = list(docs)
+        while pending:
+            last = self._last_bucket(convo_id)
+            if last is not None and last["count"] < self.bucket_size:
+                chunk = pending[:self.bucket_size - last["count"]]
+                result = self.collection.update_one(
+                    {"_id": last["_id"], "count": {"$lte": self.bucket_size - len(chunk)}},
+                    {"$push": {"messages": {"$each": chunk}}, "$inc": {"count": len(chunk)},
+                     "$min": {"first_ts": chunk[0]["timestamp"]}, "$max": {"last_ts": chunk[-1]["timestamp"]}},
+                )
+                if result.modified_count:
+                    pending = pending[len(chunk):]
+                # request khác vừa ghi vào bucket này: đọc lại bucket cuối rồi thử tiếp
+                continue
+
+            chunk = pending[:self.bucket_size]
+            try:
+                self.collection.insert_one({
+                    "conversation_id": convo_id,
+                    "seq": last["seq"] + 1 if last is not None else 0,
+                    "count": len(chunk),
+                    "first_ts": chunk[0]["timestamp"],
+                    "last_ts": chunk[-1]["timestamp"],
+                    "messages": chunk,
+                })
+                pending = pending[len(chunk):]
+            except DuplicateKeyError:
+                # request khác đã mở bucket seq này trước
+                continue
+
+    def create(self, convo_id: ObjectId, msg: MessageCreate, timestamp: datetime) -> MessageInDB:
+        doc = _bucket_message(msg, timestamp)
+        self._append(convo_id, [doc])
+        return _to_model(convo_id, doc)
+
+    def create_many(self, entries: List[Tuple[ObjectId, MessageCreate, datetime]]) -> List[MessageInDB]:
+        """Mỗi conversation một lượt `$push $each` (hoặc vài lượt nếu phải mở bucket mới)."""
+        if not entries:
+            return []
+        docs = [_bucket_message(msg, timestamp) for _, msg, timestamp in entries]
+        by_convo: Dict[ObjectId, List[Dict[str, Any]]] = {}
+        for (convo_id, _, _), doc in zip(entries, docs):
+            by_convo.setdefault(convo_id, []).append(doc)
+        for convo_id, convo_docs in by_convo.items():
+            # thứ tự trang là thứ tự nối: nối theo timestamp như MessageRepository sắp khi đọc
+            self._append(convo_id, sorted(convo_docs, key=lambda doc: doc["timestamp"]))
+        return [_to_model(convo_id, doc) for (convo_id, _, _), doc in zip(entries, docs)]
+
+    # ---- đọc -----------------------------------------------------------------
+    @staticmethod
+    def _bucket_messages(bucket: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if bucket.get("payload") is not None:
+            return decode_messages(bucket["payload"])
+        return bucket.get("messages") or []
+
+    def get_by_conversation_id(self, convo_id: ObjectId) -> List[MessageInDB]:
+        cursor = self.collection.find({"conversation_id": convo_id}).sort("seq", 1)
+        return [_to_model(convo_id, doc) for bucket in cursor for doc in self._bucket_messages(bucket)]
+
+    def get_page_by_conversation(self, convo_id: ObjectId, offset: int, limit: int) -> Tuple[List[MessageInDB], int]:
+        docs, total = self.get_page_raw(convo_id, offset, limit)
+        return [MessageInDB(**doc) for doc in docs], total
+
+    def get_page_raw(self, convo_id: ObjectId, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        last = self._last_bucket(convo_id)
+        if last is None:
+            return [], 0
+        total = last["seq"] * self.bucket_size + last["count"]
+        end = min(offset + limit, total)
+        if offset >= end:
+            return [], total
+
+        first_seq, last_seq = offset // self.bucket_size, (end - 1) // self.bucket_size
+        cursor = self.collection.find(
+            {"conversation_id": convo_id, "seq": {"$gte": first_seq, "$lte": last_seq}}
+        ).sort("seq", 1)
+        page: List[Dict[str, Any]] = []
+        for bucket in cursor:
+            base = bucket["seq"] * self.bucket_size
+            for i, doc in enumerate(self._bucket_messages(bucket), start=base):
+                if offset <= i < end:
+                    page.append(_to_raw(convo_id, doc))
+        return page, total
+
+    # ---- retention: nén tại chỗ các bucket đã đầy và cũ -------------------------
+    def conversations_with_messages_before(self, cutoff: datetime, limit: int) -> List[ObjectId]:
+        cursor = self.collection.aggregate([
+            {"$match": {"last_ts": {"$lt": cutoff}, "count": {"$gte": self.bucket_size}, "payload": None}},
+            {"$group": {"_id": "$conversation_id"}},
+            {"$limit": limit},
+        ])
+        return [row["_id"] for row in cursor]
+
+    def _old_full_buckets(self, convo_id: ObjectId, cutoff: datetime):
+        return {"conversation_id": convo_id, "last_ts": {"$lt": cutoff}, "count": {"$gte": self.bucket_size},
+                "payload": None}
+
+    def count_before(self, convo_id: ObjectId, cutoff: datetime) -> int:
+        return self.collection.count_documents(self._old_full_buckets(convo_id, cutoff)) * self.bucket_size
+
+    def find_before(self, convo_id: ObjectId, cutoff: datetime, limit: int) -> List[dict]:
+        """Message của bucket đầy, cũ và chưa nén đầu tiên (`limit` không áp dụng: bucket được nén nguyên khối)."""
+        bucket = self.collection.find_one(self._old_full_buckets(convo_id, cutoff), sort=[("seq", 1)])
+        return (bucket.get("messages") or []) if bucket else []
+
+    def archive_batch(self, convo_id: ObjectId, docs: List[dict]) -> dict:
+        messages = [{**d, "_id": str(d["_id"]), "timestamp": d["timestamp"].isoformat()} for d in docs]
+        raw_bytes = len(orjson.dumps(messages))
+        payload = encode_messages(messages)
+        self.collection.update_one(
+            {"conversation_id": convo_id, "messages._id": docs[0]["_id"]},
+            {"$set": {"payload": Binary(payload), "codec": ARCHIVE_CODEC}, "$unset": {"messages": ""}},
+        )
+        return {"messages": len(docs), "raw_bytes": raw_bytes, "stored_bytes": len(payload)}
+
+    # ---- dọn dẹp -------------------------------------------------------------
+    def delete_batch_by_conversation(self, convo_id: ObjectId, batch_size: int = 500) -> int:
+        """Xoá các bucket chứa tối đa khoảng `batch_size` message; trả về số message đã xoá (0 = đã hết)."""
+        buckets = list(self.collection.find({"conversation_id": convo_id}, {"_id": 1, "count": 1})
+                       .limit(max(1, batch_size // self.bucket_size)))
+        if not buckets:
+            return 0
+        self.collection.delete_many({"_id": {"$in": [b["_id"] for b in buckets]}})
+        return sum(b.get("count", 0) for b in buckets)
+
+    def iter_conversation_ids(self, batch_size: int = 500) -> Iterator[List[ObjectId]]:
+        cursor = self.collection.aggregate(
+            [{"$group": {"_id": "$conversation_id"}}], allowDiskUse=True, batchSize=batch_size
+        )
+        batch: List[ObjectId] = []
+        for row in cursor:
+            batch.append(row["_id"])
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+CLEANUP_JOB_COLLECTION = "cleanup_jobs"
+
+# Thứ tự các bước của một job; `stage` lưu bước đang làm để chạy lại từ đúng chỗ sau khi worker chết.
+STAGE_MESSAGES = "messages"
+STAGE_MEMORIES = "memories"
+STAGE_DONE = "done"
+
+
+class CleanupJobRepository:
+    """
+    Job dọn dữ liệu của một conversation đã xoá, khoá chính là id conversation nên enqueue lặp lại
+    không tạo job mới. Worker nhận job bằng lease (`lease_until`): job của worker chết sẽ được
+    worker khác nhận lại khi lease hết hạn.
+    """
+
+    def __init__(self, db: Database):
+        self.collection = db[CLEANUP_JOB_COLLECTION]
+
+    def enqueue(self, convo_id: ObjectId, email: Optional[str], facility_id: Optional[str], now: datetime) -> bool:
+        """Tạo job (hoặc mở lại job đã xong/thất bại); False nếu job đang chạy."""
+        try:
+            self.collection.update_one(
+                {"_id": convo_id, "status": {"$ne": "running"}},
+                {
+                    "$set": {"status": "pending", "stage": STAGE_MESSAGES, "attempts": 0, "lease_until": now,
+                             "updated_at": now, "error": None},
+                    "$setOnInsert": {"email": email, "facilityID": facility_id, "created_at": now,
+                                     "messages_deleted": 0, "memories_deleted": 0},
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # filter không khớp vì job đang running -> upsert đụng _id đã có
+            return False
+
+    def claim(self, now: datetime, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        return self.collection.find_one_and_update(
+            {"status": {"$in": ["pending", "running"]}, "lease_until": {"$lte": now}},
+            {"$set": {"status": "running", "lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("lease_until", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def record_progress(self, convo_id: ObjectId, now: datetime, lease_seconds: float, **increments: int):
+        """Cộng dồn số đã xoá và gia hạn lease sau mỗi lô."""
+        self.collection.update_one(
+            {"_id": convo_id},
+            {"$inc": increments, "$set": {"lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now}},
+        )
+
+    def set_stage(self, convo_id: ObjectId, stage: str, now: datetime):
+        update = {"stage": stage, "updated_at": now}
+        if stage == STAGE_DONE:
+            update.update(status="done", finished_at=now, error=None)
+        self.collection.update_one({"_id": convo_id}, {"$set": update})
+
+    def release_failed(self, convo_id: ObjectId, error: str, retry_at: datetime, give_up: bool, now: datetime):
+        self.collection.update_one(
+            {"_id": convo_id},
+            {"$set": {"status": "failed" if give_up else "pending", "lease_until": retry_at,
+                      "error": error, "updated_at": now}},
+        )
+
+    def count_by_status(self) -> Dict[str, int]:
+        return {row["_id"]: row["count"] for row in self.collection.aggregate(
+            [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        )}
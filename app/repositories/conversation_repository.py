@@ -4,6 +4,19 @@ from datetime import datetime, timezone
 from bson import ObjectId
 
 CONVERSATION_COLLECTION = "conversations"
+# độ dài tối đa của last_message_preview lưu trên conversation
+CONVERSATION_PREVIEW_CHARS = 120
+_SUMMARY_FIELDS = ("message_count", "last_message_preview", "last_sender", "last_message_at")
+# các trường ConversationInDB trả ra API
+_CONVERSATION_FIELDS = {"email": 1, "facilityID": 1, "title": 1, "created_at": 1, "updated_at": 1,
+                        **{field: 1 for field in _SUMMARY_FIELDS}}
+# đổi tiêu đề hay có message mới đều đổi ít nhất một trong các trường này
+_VERSION_FIELDS = {"updated_at": 1, "message_count": 1, "last_message_at": 1}
+
+
+def message_preview(content: str) -> str:
+    text = " ".join((content or "").split())
+    return text if len(text) <= CONVERSATION_PREVIEW_CHARS else text[:CONVERSATION_PREVIEW_CHARS - 1].rstrip() + "…"
 
 
 class ConversationRepository:
@@ -15,6 +28,8 @@ class ConversationRepository:
         convo_doc = convo.model_dump()
         convo_doc["created_at"] = now
         convo_doc["updated_at"] = now
+        # conversation mới bắt đầu đếm từ 0; conversation cũ chưa có trường này cho tới khi backfill
+        convo_doc["message_count"] = 0
 
         result = self.collection.insert_one(convo_doc)
         created_convo = self.collection.find_one({"_id": result.inserted_id})
@@ -43,6 +58,48 @@ class ConversationRepository:
             {"$set": {"updated_at": timestamp}}
         )
 
+    def record_messages(self, convo_id: ObjectId, count: int, timestamp: datetime, content: str,
+                        sender_type: str) -> bool:
+        """
+        Cập nhật tóm tắt khi ghi `count` message (message cuối cùng là `content`) trong một lượt update:
+        tăng message_count, đẩy updated_at, và thay last_message_* chỉ khi message này mới hơn message đã ghi
+        (hai request ghi đồng thời không làm preview lùi về message cũ hơn).
+        Trả về False nếu conversation không còn tồn tại.
+        """
+        is_newer = {"$gte": [timestamp, {"$ifNull": ["$last_message_at", datetime.min]}]}
+        result = self.collection.update_one(
+            {"_id": convo_id},
+            [{"$set": {
+                # chưa backfill thì giữ trống, backfill sẽ đếm cả message này
+                "message_count": {"$cond": [
+                    {"$eq": [{"$type": "$message_count"}, "missing"]},
+                    "$$REMOVE",
+                    {"$add": ["$message_count", count]},
+                ]},
+                "updated_at": {"$max": ["$updated_at", timestamp]},
+                "last_message_at": {"$max": ["$last_message_at", timestamp]},
+                "last_message_preview": {"$cond": [is_newer, {"$literal": message_preview(content)},
+                                                   "$last_message_preview"]},
+                "last_sender": {"$cond": [is_newer, {"$literal": sender_type}, "$last_sender"]},
+            }}],
+        )
+        return result.matched_count > 0
+
+    def set_summary(self, convo_id: ObjectId, message_count: int, last_message: dict | None,
+                    only_missing: bool = True) -> bool:
+        """Ghi tóm tắt tính lại từ message (backfill); mặc định chỉ cho conversation chưa có message_count."""
+        query: dict = {"_id": convo_id}
+        if only_missing:
+            query["message_count"] = {"$exists": False}
+        update: dict = {"message_count": message_count}
+        if last_message is not None:
+            update.update(
+                last_message_at=last_message["timestamp"],
+                last_message_preview=message_preview(last_message["content"]),
+                last_sender=last_message["sender_type"],
+            )
+        return self.collection.update_one(query, {"$set": update}).modified_count > 0
+
     def list_by_user(self, email: str, facilityID: str | None = None, limit: int = 50, offset: int = 0) -> list[ConversationInDB]:
         """Trả về danh sách Conversation cho một email (và optional facilityID) có phân trang.
 
@@ -62,6 +119,34 @@ class ConversationRepository:
             results.append(ConversationInDB(**d))
         return results
 
+    def list_by_user_raw(self, email: str, facilityID: str | None = None, limit: int = 50,
+                         offset: int = 0) -> list[dict]:
+        """Như `list_by_user` nhưng trả dict thô (đúng các trường của ConversationInDB, _id là string),
+        không dựng model: dùng cho response serialize thẳng bằng orjson."""
+        query = {"email": email}
+        if facilityID:
+            query["facilityID"] = facilityID
+
+        cursor = self.collection.find(query, _CONVERSATION_FIELDS).sort("updated_at", -1).skip(offset).limit(limit)
+        results: list[dict] = []
+        for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            for field in _SUMMARY_FIELDS:
+                doc.setdefault(field, None)
+            results.append(doc)
+        return results
+
+    def get_version(self, convo_id: ObjectId) -> dict | None:
+        """Metadata rẻ để tính ETag cho trang message: updated_at, message_count, last_message_at."""
+        return self.collection.find_one({"_id": convo_id}, _VERSION_FIELDS)
+
+    def list_versions(self, email: str, facilityID: str | None = None, limit: int = 50, offset: int = 0) -> list[dict]:
+        """Cùng truy vấn với `list_by_user` nhưng chỉ lấy các trường đổi khi conversation đổi (để tính ETag)."""
+        query = {"email": email}
+        if facilityID:
+            query["facilityID"] = facilityID
+        return list(self.collection.find(query, _VERSION_FIELDS).sort("updated_at", -1).skip(offset).limit(limit))
+
     def update_title(self, convo_id: ObjectId, new_title: str):
         self.collection.update_one(
             {"_id": convo_id},
@@ -71,3 +156,11 @@ class ConversationRepository:
     def delete_by_id(self, convo_id: ObjectId):
         self.collection.delete_one({"_id": convo_id})
 
+    def delete_and_get(self, convo_id: ObjectId) -> dict | None:
+        """Xoá conversation và trả về document vừa xoá (cần email/facilityID để dọn dữ liệu liên quan)."""
+        return self.collection.find_one_and_delete({"_id": convo_id})
+
+    def existing_ids(self, convo_ids: list[ObjectId]) -> set[ObjectId]:
+        if not convo_ids:
+            return set()
+        return {doc["_id"] for doc in self.collection.find({"_id": {"$in": convo_ids}}, {"_id": 1})}
@@ -0,0 +1,120 @@
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+import orjson
+from bson import Binary, ObjectId
+from pymongo import ASCENDING
+from pymongo.database import Database
+
+MESSAGE_ARCHIVE_COLLECTION = "messages_archive"
+ARCHIVE_CODEC = "zlib+orjson"
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+# collection (theo full_name) đã đảm bảo index trong process này
+_indexed_collections: set[str] = set()
+
+
+def encode_messages(docs: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(orjson.dumps(docs), ARCHIVE_COMPRESSION_LEVEL)
+
+
+def decode_messages(payload: bytes) -> List[Dict[str, Any]]:
+    return orjson.loads(zlib.decompress(payload))
+
+
+def _archived_message(doc: Dict[str, Any]) -> Dict[str, Any]:
+    # dạng gọn trong bucket: conversation_id nằm ở bucket, id/timestamp là chuỗi như khi trả ra API
+    timestamp = doc.get("timestamp")
+    return {
+        "_id": str(doc["_id"]),
+        "sender_type": doc.get("sender_type"),
+        "content": doc.get("content", ""),
+        "sender_id": doc.get("sender_id"),
+        "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+    }
+
+
+class MessageArchiveRepository:
+    """
+    Tầng lạnh của `messages`: mỗi document là một bucket gồm tối đa N message liên tiếp của một conversation,
+    nén zlib (JSON bằng orjson). Bucket giữ sẵn count và khoảng thời gian nên đọc một trang chỉ cần giải nén
+    các bucket giao với trang đó; danh sách bucket (không kèm payload) đóng vai trò index offset.
+    """
+
+    def __init__(self, db: Database):
+        self.collection = db[MESSAGE_ARCHIVE_COLLECTION]
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        if self.collection.full_name in _indexed_collections:
+            return
+        # mỗi lượt đọc trang liệt kê bucket của conversation theo first_ts
+        self.collection.create_index([("conversation_id", ASCENDING), ("first_ts", ASCENDING)])
+        _indexed_collections.add(self.collection.full_name)
+
+    def archive(self, convo_id: ObjectId, docs: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Ghi một bucket từ các message (đã sắp theo thời gian). _id của bucket là _id của message đầu tiên,
+        nên chạy lại sau khi bị ngắt giữa chừng chỉ ghi đè đúng bucket đó.
+        """
+        messages = [_archived_message(d) for d in docs]
+        raw = orjson.dumps(messages)
+        payload = zlib.compress(raw, ARCHIVE_COMPRESSION_LEVEL)
+        self.collection.replace_one(
+            {"_id": docs[0]["_id"]},
+            {
+                "conversation_id": convo_id,
+                "first_ts": docs[0].get("timestamp"),
+                "last_ts": docs[-1].get("timestamp"),
+                "count": len(messages),
+                "codec": ARCHIVE_CODEC,
+                "raw_bytes": len(raw),
+                "payload": Binary(payload),
+            },
+            upsert=True,
+        )
+        return {"messages": len(messages), "raw_bytes": len(raw), "stored_bytes": len(payload)}
+
+    def buckets(self, convo_id: ObjectId) -> List[Dict[str, Any]]:
+        """Metadata các bucket của conversation (không kèm payload), theo thứ tự thời gian."""
+        return list(self.collection.find({"conversation_id": convo_id}, {"payload": 0}).sort("first_ts", 1))
+
+    def read_buckets(self, bucket_ids: List[Any]) -> Dict[Any, List[Dict[str, Any]]]:
+        if not bucket_ids:
+            return {}
+        cursor = self.collection.find({"_id": {"$in": bucket_ids}}, {"payload": 1})
+        return {doc["_id"]: decode_messages(doc["payload"]) for doc in cursor}
+
+    def delete_batch_by_conversation(self, convo_id: ObjectId, batch_size: int = 50) -> int:
+        """Xoá tối đa `batch_size` bucket; trả về số message trong các bucket đã xoá."""
+        docs = list(self.collection.find({"conversation_id": convo_id}, {"_id": 1, "count": 1}).limit(batch_size))
+        if not docs:
+            return 0
+        self.collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        return sum(d.get("count", 0) for d in docs)
+
+    def iter_conversation_ids(self, batch_size: int = 500) -> Iterator[List[ObjectId]]:
+        cursor = self.collection.aggregate(
+            [{"$group": {"_id": "$conversation_id"}}], allowDiskUse=True, batchSize=batch_size
+        )
+        batch: List[ObjectId] = []
+        for row in cursor:
+            batch.append(row["_id"])
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def stats(self) -> Dict[str, int]:
+        rows = list(self.collection.aggregate([{"$group": {
+            "_id": None,
+            "buckets": {"$sum": 1},
+            "messages": {"$sum": "$count"},
+            "raw_bytes": {"$sum": "$raw_bytes"},
+            "stored_bytes": {"$sum": {"$binarySize": "$payload"}},
+        }}]))
+        stats = rows[0] if rows else {"buckets": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+        stats.pop("_id", None)
+        return stats
@@ -1,10 +1,21 @@
+from pymongo import ASCENDING
 from pymongo.database import Database
+from app.configurations.settings import get_env
 from app.models.message import MessageCreate, MessageInDB
+from app.repositories.message_archive_repository import MessageArchiveRepository
 from datetime import datetime
 from bson import ObjectId
-from typing import List, Any
+from typing import Iterator, List, Any, Tuple
 
 MESSAGE_COLLECTION = "messages"
+_MESSAGE_FIELDS = {"sender_type": 1, "content": 1, "sender_id": 1, "timestamp": 1}
+# "documents": mỗi message một document trong `messages`; "buckets": BucketedMessageRepository
+MESSAGE_STORAGE = get_env("MESSAGE_STORAGE", "documents").lower()
+# vị trí message trong conversation suy ra từ seq * MESSAGE_BUCKET_SIZE: không đổi giá trị khi đã có dữ liệu
+MESSAGE_BUCKET_SIZE = int(get_env("MESSAGE_BUCKET_SIZE", 100))
+
+# collection (theo full_name) đã đảm bảo index trong process này
+_indexed_collections: set[str] = set()
 
 
 def _sanitize_doc(d: Any) -> Any:
@@ -21,6 +32,16 @@ def _sanitize_doc(d: Any) -> Any:
 class MessageRepository:
     def __init__(self, db: Database):
         self.collection = db[MESSAGE_COLLECTION]
+        self.archive = MessageArchiveRepository(db)
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        if self.collection.full_name in _indexed_collections:
+            return
+        # đọc trang / find_before / count_before theo conversation; retention lọc theo timestamp trên cả collection
+        self.collection.create_index([("conversation_id", ASCENDING), ("timestamp", ASCENDING)])
+        self.collection.create_index([("timestamp", ASCENDING)])
+        _indexed_collections.add(self.collection.full_name)
 
     def create(self, convo_id: ObjectId, msg: MessageCreate, timestamp: datetime) -> MessageInDB:
         msg_doc = msg.model_dump()
@@ -34,16 +55,135 @@ class MessageRepository:
             return MessageInDB(**created_msg)
         raise ValueError("Failed to create message")
 
+    def create_many(self, entries: List[Tuple[ObjectId, MessageCreate, datetime]]) -> List[MessageInDB]:
+        """Ghi nhiều message trong một lượt insert_many; _id lấy từ kết quả insert thay vì đọc lại."""
+        if not entries:
+            return []
+        docs = []
+        for convo_id, msg, timestamp in entries:
+            msg_doc = msg.model_dump()
+            msg_doc["conversation_id"] = convo_id
+            msg_doc["timestamp"] = timestamp
+            docs.append(msg_doc)
+
+        result = self.collection.insert_many(docs, ordered=True)
+        created: List[MessageInDB] = []
+        for doc, inserted_id in zip(docs, result.inserted_ids):
+            doc["_id"] = inserted_id
+            created.append(MessageInDB(**_sanitize_doc(doc)))
+        return created
+
     def get_by_conversation_id(self, convo_id: ObjectId) -> List[MessageInDB]:
+        """Toàn bộ message của conversation: phần đã lưu trữ (tầng lạnh) trước, rồi tới `messages`."""
+        buckets = self.archive.buckets(convo_id)
+        cold = self.archive.read_buckets([b["_id"] for b in buckets])
+        result: List[MessageInDB] = [
+            MessageInDB(conversation_id=str(convo_id), **msg) for b in buckets for msg in cold.get(b["_id"], [])
+        ]
+
         cursor = self.collection.find(
             {"conversation_id": convo_id}
         ).sort("timestamp", 1)
 
         messages = list(cursor)
 
-        result: List[MessageInDB] = []
         for msg in messages:
             msg = _sanitize_doc(dict(msg))
             result.append(MessageInDB(**msg))
 
         return result
+
+    def get_page_raw(self, convo_id: ObjectId, offset: int, limit: int) -> Tuple[List[dict], int]:
+        """
+        Một trang message (theo thời gian tăng dần) dạng dict thô cùng tổng số message của conversation.
+        Chỉ giải nén các bucket lưu trữ giao với trang; phần còn lại đọc từ `messages` bằng skip/limit.
+        Dict có dạng của MessageInDB (`_id`, `conversation_id` là chuỗi) để serialize thẳng không qua Pydantic.
+        """
+        buckets = self.archive.buckets(convo_id)
+        cold_total = sum(b.get("count", 0) for b in buckets)
+        hot_total = self.collection.count_documents({"conversation_id": convo_id})
+        end = offset + limit
+        convo_str = str(convo_id)
+
+        page: List[dict] = []
+        if offset < cold_total:
+            needed, position = [], 0
+            for b in buckets:
+                count = b.get("count", 0)
+                if position + count > offset and position < end:
+                    needed.append((b["_id"], position))
+                position += count
+            cold = self.archive.read_buckets([bucket_id for bucket_id, _ in needed])
+            for bucket_id, position in needed:
+                for i, msg in enumerate(cold.get(bucket_id, []), start=position):
+                    if offset <= i < end:
+                        page.append({**msg, "conversation_id": convo_str})
+
+        if end > cold_total and hot_total:
+            skip = max(0, offset - cold_total)
+            cursor = self.collection.find({"conversation_id": convo_id}, _MESSAGE_FIELDS).sort("timestamp", 1) \
+                .skip(skip).limit(end - max(offset, cold_total))
+            page.extend({**msg, "_id": str(msg["_id"]), "conversation_id": convo_str} for msg in cursor)
+
+        return page, cold_total + hot_total
+
+    def get_page_by_conversation(self, convo_id: ObjectId, offset: int, limit: int) -> Tuple[List[MessageInDB], int]:
+        docs, total = self.get_page_raw(convo_id, offset, limit)
+        return [MessageInDB(**doc) for doc in docs], total
+
+    # ---- retention -----------------------------------------------------------
+    def conversations_with_messages_before(self, cutoff: datetime, limit: int) -> List[ObjectId]:
+        cursor = self.collection.aggregate([
+            {"$match": {"timestamp": {"$lt": cutoff}}},
+            {"$group": {"_id": "$conversation_id"}},
+            {"$limit": limit},
+        ], allowDiskUse=True)
+        return [row["_id"] for row in cursor if row["_id"] is not None]
+
+    def find_before(self, convo_id: ObjectId, cutoff: datetime, limit: int) -> List[dict]:
+        cursor = self.collection.find({"conversation_id": convo_id, "timestamp": {"$lt": cutoff}}) \
+            .sort("timestamp", 1).limit(limit)
+        return list(cursor)
+
+    def count_before(self, convo_id: ObjectId, cutoff: datetime) -> int:
+        return self.collection.count_documents({"conversation_id": convo_id, "timestamp": {"$lt": cutoff}})
+
+    def archive_batch(self, convo_id: ObjectId, docs: List[dict]) -> dict:
+        """Ghi các message vào một bucket lưu trữ rồi xoá chúng khỏi `messages` (bucket ghi trước, nên idempotent)."""
+        stats = self.archive.archive(convo_id, docs)
+        self.collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        return stats
+
+    # ---- dọn dẹp -------------------------------------------------------------
+    def delete_batch_by_conversation(self, convo_id: ObjectId, batch_size: int = 500) -> int:
+        """Xoá tối đa `batch_size` message (hoặc một lô bucket lưu trữ) của conversation; 0 = đã hết."""
+        ids = [doc["_id"] for doc in self.collection.find({"conversation_id": convo_id}, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return self.archive.delete_batch_by_conversation(convo_id)
+        return self.collection.delete_many({"_id": {"$in": ids}}).deleted_count
+
+    def iter_conversation_ids(self, batch_size: int = 500) -> Iterator[List[ObjectId]]:
+        """Các conversation_id khác nhau đang có message (cả tầng lưu trữ), theo từng lô (group ở server)."""
+        cursor = self.collection.aggregate(
+            [{"$group": {"_id": "$conversation_id"}}], allowDiskUse=True, batchSize=batch_size
+        )
+        batch: List[ObjectId] = []
+        for row in cursor:
+            if row["_id"] is None:
+                continue
+            batch.append(row["_id"])
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        yield from self.archive.iter_conversation_ids(batch_size)
+
+
+def get_message_repository(db: Database):
+    """Repository message theo MESSAGE_STORAGE; hai engine có cùng API."""
+    if MESSAGE_STORAGE == "buckets":
+        from app.repositories.bucketed_message_repository import BucketedMessageRepository
+
+        return BucketedMessageRepository(db, MESSAGE_BUCKET_SIZE)
+    return MessageRepository(db)
@@ -0,0 +1,52 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.services.analytics_service import analytics_service
+from app.services.auth_service import get_current_user, User
+
+router = APIRouter(tags=["Analytics"])
+
+
+def _query_or_503(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Analytics query failed: {e}")
+        raise HTTPException(status_code=503, detail="Analytics data is temporarily unavailable.")
+
+
+@router.get("/analytics/feeds")
+def feed_usage_endpoint(
+    feed: Optional[str] = Query(None, description="Lọc theo tên feed (chứa chuỗi, không phân biệt hoa thường)"),
+    current_user: User = Depends(get_current_user),
+):
+    """Số đàn của facility đang dùng từng loại thức ăn (theo entry history mới nhất)."""
+    return {
+        "facility_id": current_user.facilityID,
+        "feeds": _query_or_503(analytics_service.feed_usage, current_user.facilityID, feed),
+    }
+
+
+@router.get("/analytics/medications/due")
+def medications_due_endpoint(
+    from_date: Optional[date] = Query(None, description="Mặc định: hôm nay"),
+    to_date: Optional[date] = Query(None, description="Mặc định: from_date + 7 ngày"),
+    current_user: User = Depends(get_current_user),
+):
+    """Các thuốc/vắc-xin có nextDueDate trong khoảng ngày, trên mọi đàn của facility."""
+    return {
+        "facility_id": current_user.facilityID,
+        "medications": _query_or_503(analytics_service.medications_due, current_user.facilityID, from_date, to_date),
+    }
+
+
+@router.get("/analytics/summary")
+def facility_summary_endpoint(
+    days: int = Query(7, ge=1, le=90, description="Số ngày tới để tính lịch tiêm đến hạn"),
+    current_user: User = Depends(get_current_user),
+):
+    return _query_or_503(analytics_service.summary, current_user.facilityID, days)
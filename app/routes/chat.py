@@ -1,22 +1,53 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+import asyncio
+from datetime import datetime, timedelta, UTC
+from typing import Callable, List, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
 from app.services.asset_service import get_asset_service, AssetService
 from app.services.auth_service import User
 from app.services.auth_service import get_current_user
-from app.services.farm_weaviate_service import search_knowledge_base
-from app.services.gemini_service import detect_intent, generate_answer, generate_short_conversation_title, \
-    handle_get_feed_info, handle_get_medication_info, handle_suggest_feed, handle_suggest_medication, \
-    handle_general_chat
-from app.services.get_asset_http_service import get_asset_trace
+from app.services.farm_weaviate_service import search_knowledge_base, extract_age_days
+from app.services.gemini_service import (
+    DEFAULT_CONVERSATION_TITLE,
+    detect_intent,
+    detect_intents_batch,
+    format_feed_suggestion,
+    format_medication_suggestion,
+    generate_answer,
+    generate_short_conversation_title,
+    handle_facility_summary,
+    handle_general_chat,
+    handle_get_history_range,
+    handle_get_feed_info,
+    handle_get_medication_info,
+    handle_suggest_feed,
+    handle_suggest_medication,
+    make_placeholder_title,
+)
+from app.services.knowledge_reranker import extract_species
 from app.services.message_service import MessageService
-from app.repositories.message_repository import MessageRepository
+from app.services.session_cache import session_cache
+from app.services.speculative_prefetch import speculative_prefetch
+from app.repositories.message_repository import get_message_repository
 from app.repositories.conversation_repository import ConversationRepository
 from app.services.memory_weaviate_service import WeaviateChatMemoryService
+from app.configurations.settings import get_env
 from app.configurations.weaviate_config import get_weaviate_client
 from app.configurations.mongo_config import get_db
+from app.services.health_service import dependency_available
+from app.models.conversation import ConversationCreate
 from app.models.message import MessageCreate
-from typing import Optional
+
+CHAT_BATCH_MAX_ITEMS = int(get_env("CHAT_BATCH_MAX_ITEMS", 50))
+# số câu hỏi của một batch được xử lý song song (mỗi câu giữ một thread cho các lời gọi blocking)
+CHAT_BATCH_CONCURRENCY = int(get_env("CHAT_BATCH_CONCURRENCY", 4))
+# số memory gần nhất của conversation đưa vào prompt
+CHAT_MEMORY_LIMIT = 5
 
 
 class ChatRequest(BaseModel):
@@ -33,12 +64,25 @@ class ChatResponse(BaseModel):
     bot_message_id: str
 
 
+class ChatBatchItem(BaseModel):
+    question: str
+    conversation_id: Optional[str] = None
+    # giá trị tuỳ ý của client, được trả lại nguyên vẹn trong dòng kết quả tương ứng
+    client_ref: Optional[str] = None
+
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatBatchItem] = Field(..., min_length=1)
+    # tiêu đề cho conversation mới chứa các câu hỏi không có conversation_id
+    conversation_title: Optional[str] = "New Chat"
+
+
 router = APIRouter()
 
 
 def get_message_service():
     db = get_db()
-    message_repo = MessageRepository(db)
+    message_repo = get_message_repository(db)
     convo_repo = ConversationRepository(db)
 
     # Only create memory service if weaviate client is initialized
@@ -55,10 +99,280 @@ def get_message_service():
     return MessageService(message_repo, convo_repo, memory_service)
 
 
+def refresh_conversation_title(convo_repo: ConversationRepository, conversation_id: str, question: str):
+    """Background task: sinh tiêu đề bằng Gemini sau khi đã trả response và ghi đè tiêu đề tạm."""
+    try:
+        title = generate_short_conversation_title(question)
+        # Gemini lỗi/ngắt mạch thì giữ nguyên tiêu đề tạm thay vì ghi đè bằng tiêu đề mặc định
+        if title and title.strip() and title != DEFAULT_CONVERSATION_TITLE:
+            convo_repo.update_title(ObjectId(conversation_id), title.strip()[:100])
+            session_cache.update_title(conversation_id, title.strip()[:100])
+    except Exception as e:
+        print(f"Warning: failed to refresh conversation title for {conversation_id}: {e}")
+
+
+def load_memory_texts(message_service: MessageService, email: str, conversation_id: str,
+                      facility_id: Optional[str] = None) -> List[str]:
+    """Đọc tối đa 5 memory gần nhất của conversation dưới dạng text; trả về [] khi Weaviate không khả dụng."""
+    conversation_memories = []
+    try:
+        # Ensure memory_service is initialized lazily if possible
+        message_service._ensure_memory_service()
+
+        mem_service = message_service.memory_service
+        if mem_service is not None and not dependency_available("weaviate"):
+            print("Weaviate is known to be down; skipping conversation memory fetch.")
+        elif mem_service is not None:
+            try:
+                # conversation đang chat: memory lấy từ session cache (được cập nhật khi ghi), không đọc Weaviate
+                conversation_memories = session_cache.memories(
+                    conversation_id, email, facility_id, CHAT_MEMORY_LIMIT,
+                    lambda: mem_service.get_memories_by_email_and_conversation(
+                        email, conversation_id, limit=CHAT_MEMORY_LIMIT, facility_id=facility_id
+                    ),
+                )
+                print(f"Loaded {len(conversation_memories)} conversation memories for {email}/{conversation_id}")
+            except Exception as e:
+                print(f"Warning: unable to fetch conversation memories: {e}")
+        else:
+            print("Memory service not available; skipping conversation memory fetch.")
+    except Exception as e:
+        print(f"Warning while initializing memory service: {e}")
+
+    # Convert memory objects to strings (prefer 'content' field)
+    memory_texts = []
+    for m in conversation_memories:
+        try:
+            if isinstance(m, dict):
+                content = m.get('content') or m.get('text') or str(m)
+            else:
+                content = str(m)
+            memory_texts.append(content)
+        except Exception:
+            memory_texts.append(str(m))
+    return memory_texts
+
+
+def answer_for_intent(question: str, intent_data: dict, facility_id: str, memory_texts: List[str],
+                      knowledge_lookup: Optional[Callable[[str], Optional[dict]]] = None) -> str:
+    """
+    Chạy handler theo intent rồi để Gemini viết lại câu trả lời kèm memories.
+    `knowledge_lookup` (tuỳ chọn) thay cho search_knowledge_base ở các intent gợi ý, để batch dùng chung kết quả tra cứu.
+    """
+    intent = intent_data.get("intent", "unknown")
+    entities = intent_data.get("entities", {})
+
+    answer = ""
+    used_generate = False
+
+    if intent == "get_feed_info":
+        answer = handle_get_feed_info(entities, facility_id)
+    elif intent == "get_medication_info":
+        answer = handle_get_medication_info(entities, facility_id)
+    elif intent == "get_history_range":
+        answer = handle_get_history_range(entities)
+    elif intent == "facility_summary":
+        answer = handle_facility_summary(entities, facility_id)
+    elif intent == "suggest_feed":
+        answer = format_feed_suggestion(knowledge_lookup(question)) if knowledge_lookup \
+            else handle_suggest_feed(question, facility_id)
+    elif intent == "suggest_medication":
+        answer = format_medication_suggestion(knowledge_lookup(question)) if knowledge_lookup \
+            else handle_suggest_medication(question, facility_id)
+    else:  # Unknown intent
+        answer, used_generate = handle_general_chat(question, memory_texts)
+
+    # --- Enhance the answer using Gemini + memories ---
+    if not used_generate:
+        try:
+            generated = generate_answer(question, memories=memory_texts, assistant_context=answer)
+            if generated and isinstance(generated, str) and generated.strip():
+                answer = generated.strip()
+        except Exception as e:
+            print(f"Warning: Gemini generate_answer failed: {e}")
+    return answer
+
+
+def knowledge_group_key(question: str, facility_id: str) -> tuple:
+    """Các câu hỏi gợi ý cùng (facility, loài, tuổi) dùng chung một lượt tra cứu tri thức trong batch."""
+    return facility_id, extract_species(question), extract_age_days(question)
+
+
+def _ndjson(obj: dict) -> bytes:
+    return orjson.dumps(obj) + b"\n"
+
+
+def _save_quietly(message_service: MessageService, email: str, entries: list, facility_id: Optional[str]):
+    try:
+        message_service.save_messages_bulk(email, entries, facility_id)
+    except Exception as e:
+        print(f"ERROR saving batch bot messages: {e}")
+
+
+# Khai báo trước /chat/{conversation_id} để "batch" không bị hiểu là một conversation_id.
+@router.post("/chat/batch", tags=["Chat"])
+async def handle_chat_batch(request: ChatBatchRequest,
+                            background_tasks: BackgroundTasks,
+                            current_user: User = Depends(get_current_user),
+                            message_service: MessageService = Depends(get_message_service)):
+    """
+    Trả lời nhiều câu hỏi trong một request, kết quả stream về dạng NDJSON theo thứ tự hoàn thành:
+    mỗi câu một dòng {"type": "answer", "index", ...}, dòng cuối {"type": "summary", ...}.
+
+    Xác thực một lần; tin nhắn user/bot được ghi bằng insert_many; intent được phân loại bằng một lượt
+    gọi Gemini; các câu gợi ý cùng (facility, loài, tuổi) dùng chung một lượt tra cứu tri thức.
+    """
+    items = request.items
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {CHAT_BATCH_MAX_ITEMS} questions.")
+    questions = [item.question.strip() for item in items]
+    if not all(questions):
+        raise HTTPException(status_code=400, detail="Question cannot be empty.")
+
+    email = current_user.email
+    facility_id = current_user.facilityID
+    convo_repo = message_service.convo_repo
+
+    # --- conversation: các câu có conversation_id phải trỏ tới conversation tồn tại, còn lại dùng chung một conversation mới
+    convo_ids: List[ObjectId] = []
+    known: dict[str, ObjectId] = {}
+    new_convo_id: Optional[ObjectId] = None
+    for item, question in zip(items, questions):
+        if item.conversation_id:
+            if item.conversation_id not in known:
+                if not ObjectId.is_valid(item.conversation_id):
+                    raise HTTPException(status_code=400, detail="Invalid conversation ID format")
+                if await asyncio.to_thread(convo_repo.get_by_id, ObjectId(item.conversation_id)) is None:
+                    raise HTTPException(status_code=404, detail="Conversation not found")
+                known[item.conversation_id] = ObjectId(item.conversation_id)
+            convo_ids.append(known[item.conversation_id])
+            continue
+        if new_convo_id is None:
+            needs_generated_title = request.conversation_title in ("New Chat", None)
+            title = make_placeholder_title(question) if needs_generated_title else request.conversation_title
+            conversation = await asyncio.to_thread(
+                convo_repo.create, ConversationCreate(email=email, facilityID=facility_id, title=title)
+            )
+            new_convo_id = ObjectId(str(conversation.id))
+            if needs_generated_title:
+                background_tasks.add_task(refresh_conversation_title, convo_repo, str(new_convo_id), question)
+        convo_ids.append(new_convo_id)
+
+    # --- tin nhắn user: một lượt ghi. Timestamp theo đúng thứ tự ghi (user trước, bot khi có câu trả lời) để
+    # engine bucket (thứ tự trang = thứ tự ghi) và engine documents (sắp theo timestamp) cho cùng một thứ tự.
+    base_time = datetime.now(UTC)
+    user_entries = [
+        (convo_id, MessageCreate(content=item.question, sender_type="user", sender_id=email),
+         base_time + timedelta(milliseconds=i))
+        for i, (item, convo_id) in enumerate(zip(items, convo_ids))
+    ]
+    saved_user_messages = await asyncio.to_thread(message_service.save_messages_bulk, email, user_entries,
+                                                facility_id)
+
+    async def run_batch():
+        semaphore = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+
+        async def bounded(fn, *args):
+            async with semaphore:
+                return await asyncio.to_thread(fn, *args)
+
+        distinct_convos = list(dict.fromkeys(convo_ids))
+        memory_lists = await asyncio.gather(*(bounded(load_memory_texts, message_service, email, str(convo_id),
+                                                      facility_id)
+                                              for convo_id in distinct_convos))
+        memory_by_convo = dict(zip(distinct_convos, memory_lists))
+        # một prompt phân loại chung cho cả batch: gộp memory của các conversation (bỏ trùng)
+        batch_memories = list(dict.fromkeys(m for memories in memory_lists for m in memories))
+        intents = await asyncio.to_thread(detect_intents_batch, questions, batch_memories)
+
+        # --- tra cứu tri thức: một lượt cho mỗi nhóm (facility, loài, tuổi)
+        groups: dict[tuple, str] = {}
+        for question, intent_data in zip(questions, intents):
+            if intent_data.get("intent") in ("suggest_feed", "suggest_medication"):
+                groups.setdefault(knowledge_group_key(question, facility_id), question)
+        group_results = dict(zip(groups, await asyncio.gather(
+            *(bounded(search_knowledge_base, question, facility_id) for question in groups.values())
+        )))
+
+        def knowledge_lookup(question: str) -> Optional[dict]:
+            return group_results.get(knowledge_group_key(question, facility_id))
+
+        async def answer_item(index: int):
+            try:
+                answer = await bounded(answer_for_intent, questions[index], intents[index], facility_id,
+                                       memory_by_convo[convo_ids[index]], knowledge_lookup)
+                return index, answer, None
+            except Exception as e:
+                print(f"ERROR in handle_chat_batch item {index}: {e}")
+                return index, None, str(e)
+
+        answers: dict[int, str] = {}
+        persisted = False
+        failed = 0
+
+        def bot_entries(order: List[int]):
+            answered_at = max(datetime.now(UTC), base_time + timedelta(milliseconds=len(items)))
+            return [
+                (convo_ids[i], MessageCreate(content=answers[i], sender_type="bot", sender_id=None),
+                 answered_at + timedelta(milliseconds=i))
+                for i in order
+            ]
+
+        try:
+            for next_done in asyncio.as_completed([answer_item(i) for i in range(len(items))]):
+                index, answer, error = await next_done
+                if error is not None:
+                    failed += 1
+                    yield _ndjson({"type": "error", "index": index, "client_ref": items[index].client_ref,
+                                   "detail": error})
+                    continue
+                answers[index] = answer
+                yield _ndjson({
+                    "type": "answer",
+                    "index": index,
+                    "client_ref": items[index].client_ref,
+                    "conversation_id": str(convo_ids[index]),
+                    "user_message_id": str(saved_user_messages[index].id),
+                    "intent": intents[index].get("intent", "unknown"),
+                    "answer": answer,
+                })
+
+            # --- tin nhắn bot: một lượt ghi sau khi có đủ câu trả lời
+            order = sorted(answers)
+            bot_message_ids = {}
+            persisted = True
+            try:
+                # lượt ghi chạy ở thread: client ngắt kết nối lúc này thì việc ghi vẫn hoàn tất
+                saved_bot_messages = await asyncio.to_thread(message_service.save_messages_bulk, email,
+                                                           bot_entries(order), facility_id)
+                bot_message_ids = {str(i): str(m.id) for i, m in zip(order, saved_bot_messages)}
+            except Exception as e:
+                print(f"ERROR saving batch bot messages: {e}")
+            yield _ndjson({
+                "type": "summary",
+                "count": len(items),
+                "answered": len(answers),
+                "failed": failed,
+                "knowledge_lookups": len(groups),
+                "bot_message_ids": bot_message_ids,
+            })
+        finally:
+            if answers and not persisted:
+                # client ngắt kết nối giữa chừng (generator bị huỷ): vẫn ghi các câu trả lời đã có,
+                # ở executor để không phụ thuộc vào generator đang bị đóng
+                print(f"Batch stream closed early; saving {len(answers)} computed answers")
+                asyncio.get_running_loop().run_in_executor(
+                    None, _save_quietly, message_service, email, bot_entries(sorted(answers)), facility_id
+                )
+
+    return StreamingResponse(run_batch(), media_type="application/x-ndjson")
+
+
 # Support both /chat and /chat/{conversation_id}
 @router.post("/chat", response_model=ChatResponse, tags=["Chat"])
 @router.post("/chat/{conversation_id}", response_model=ChatResponse, tags=["Chat"])
 async def handle_chat(request: ChatRequest,
+                      background_tasks: BackgroundTasks,
                       conversation_id: Optional[str] = None,
                       current_user: User = Depends(get_current_user),
                       asset_service: AssetService = Depends(get_asset_service),
@@ -83,9 +397,13 @@ async def handle_chat(request: ChatRequest,
             sender_id=current_user.email
         )
 
-        conversation_title_renew = generate_short_conversation_title(request.question) \
-            if request.conversation_title == "New Chat" or request.conversation_title is None \
-            else request.conversation_title
+        # Tiêu đề do Gemini sinh sẽ được cập nhật sau khi trả response (background task);
+        # trong lúc đó dùng tiêu đề tạm cắt từ câu hỏi để không tốn thêm một lượt gọi LLM.
+        needs_generated_title = not use_conversation_id and \
+            (request.conversation_title == "New Chat" or request.conversation_title is None)
+        conversation_title_renew = make_placeholder_title(question) \
+            if needs_generated_title \
+            else request.conversation_title or "New Chat"
 
         saved_user_message = message_service.save_new_message(
             msg=user_message,
@@ -96,67 +414,27 @@ async def handle_chat(request: ChatRequest,
         )
         conversation_id_str = str(saved_user_message.conversation_id)
 
-        conversation_memories = []
+        if needs_generated_title:
+            background_tasks.add_task(
+                refresh_conversation_title, message_service.convo_repo, conversation_id_str, question
+            )
+
+        # đón đầu trace/tri thức theo mã đàn, tuổi trong câu hỏi, chạy song song với memory + detect_intent
+        speculation = speculative_prefetch.start(request.question, user_facility_id)
         try:
-            # Ensure memory_service is initialized lazily if possible
-            if hasattr(message_service, '_ensure_memory_service'):
-                message_service._ensure_memory_service()
-
-            mem_service = getattr(message_service, 'memory_service', None)
-            if mem_service is not None:
-                try:
-                    conversation_memories = mem_service.get_memories_by_email_and_conversation(
-                        current_user.email, conversation_id_str, limit=5
-                    )
-                    print(f"Loaded {len(conversation_memories)} conversation memories for {current_user.email}/{conversation_id_str}")
-                except Exception as e:
-                    print(f"Warning: unable to fetch conversation memories: {e}")
-            else:
-                print("Memory service not available; skipping conversation memory fetch.")
-        except Exception as e:
-            print(f"Warning while initializing memory service: {e}")
+            memory_texts = load_memory_texts(message_service, current_user.email, conversation_id_str,
+                                             user_facility_id)
 
-        # Convert memory objects to strings (prefer 'content' field)
-        memory_texts = []
-        for m in conversation_memories:
-            try:
-                if isinstance(m, dict):
-                    content = m.get('content') or m.get('text') or str(m)
-                else:
-                    content = str(m)
-                memory_texts.append(content)
-            except Exception:
-                memory_texts.append(str(m))
-
-        print("Calling detect_intent...")
-        intent_data = detect_intent(request.question, memories=memory_texts)
-        print(f"Intent data received: {intent_data}")
-
-        intent = intent_data.get("intent", "unknown")
-        entities = intent_data.get("entities", {})
-
-        answer = ""
-        used_generate = False
-
-        if intent == "get_feed_info":
-            answer = handle_get_feed_info(entities)
-        elif intent == "get_medication_info":
-            answer = handle_get_medication_info(entities)
-        elif intent == "suggest_feed":
-            answer = handle_suggest_feed(request.question, user_facility_id)
-        elif intent == "suggest_medication":
-            answer = handle_suggest_medication(request.question, user_facility_id)
-        else:  # Unknown intent
-            answer, used_generate = handle_general_chat(request.question, memory_texts)
-
-        # --- Enhance the answer using Gemini + memories ---
-        if not used_generate:
-            try:
-                generated = generate_answer(request.question, memories=memory_texts, assistant_context=answer)
-                if generated and isinstance(generated, str) and generated.strip():
-                    answer = generated.strip()
-            except Exception as e:
-                print(f"Warning: Gemini generate_answer failed: {e}")
+            print("Calling detect_intent...")
+            intent_data = detect_intent(request.question, memories=memory_texts)
+            print(f"Intent data received: {intent_data}")
+        except Exception:
+            speculation.discard()
+            raise
+        knowledge_lookup = await speculation.resolve(intent_data)
+
+        answer = answer_for_intent(request.question, intent_data, user_facility_id, memory_texts,
+                                   knowledge_lookup)
 
         # Lưu phản hồi của bot
         bot_message = MessageCreate(
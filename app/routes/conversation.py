@@ -1,5 +1,5 @@
 from bson import ObjectId
-from fastapi import APIRouter, Depends, status, Query, HTTPException
+from fastapi import APIRouter, Depends, status, Query, HTTPException, Request, Response
 from typing import List
 from pymongo.database import Database
 
@@ -8,6 +8,8 @@ from app.models.conversation import ConversationCreate, ConversationInDB
 from app.repositories.conversation_repository import ConversationRepository
 from app.services.conversation_service import ConversationService
 from app.services.auth_service import get_current_user, User
+from app.utils.fast_json import FastJSONResponse, fast_json_enabled
+from app.utils.http_cache import cache_headers, etag_matches, not_modified, record_full_response
 
 router = APIRouter()
 
@@ -38,16 +40,33 @@ def create_conversation_endpoint(
     status_code=status.HTTP_200_OK,
 )
 def list_conversations_endpoint(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     limit: int = Query(50, ge=1, le=200, description="Max number of conversations to return"),
     offset: int = Query(0, ge=0, description="Number of conversations to skip"),
     service: ConversationService = Depends(get_convo_service)
 ):
-    """Lấy danh sách conversation của user đang xác thực (email và facilityID lấy từ token)."""
+    """Lấy danh sách conversation của user đang xác thực (email và facilityID lấy từ token).
+
+    Có ETag: client gửi lại If-None-Match thì nhận 304 nếu trang không đổi (chỉ đọc metadata).
+    """
     # Lấy thông tin từ token
     email = current_user.email
     facilityID = current_user.facilityID
 
+    etag = service.list_etag(email=email, facilityID=facilityID, limit=limit, offset=offset)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    record_full_response()
+
+    if fast_json_enabled():
+        # document thô -> JSON bằng orjson, bỏ qua validate lại theo response_model (schema giữ nguyên cho docs)
+        return FastJSONResponse(
+            service.list_conversations_raw(email=email, facilityID=facilityID, limit=limit, offset=offset),
+            headers=cache_headers(etag),
+        )
+    response.headers.update(cache_headers(etag))
     return service.list_conversations_for_user(email=email, facilityID=facilityID, limit=limit, offset=offset)
 
 @router.delete(
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from app.services.health_service import health_prober
+from app.utils.circuit_breaker import breakers_snapshot
+from app.utils.metrics import metrics_snapshot
+
+router = APIRouter(tags=["Health"])
+
+
+@router.get("/healthz", summary="Liveness probe")
+async def healthz():
+    """Process còn sống và event loop còn phục vụ được; không kiểm tra dependency."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz", summary="Readiness probe")
+async def readyz():
+    """Trạng thái dependency lấy từ cache của health prober (không gọi ra ngoài theo request)."""
+    ready = health_prober.is_ready()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "last_probe_at": health_prober.last_probe_at,
+            "dependencies": health_prober.snapshot(),
+            "circuit_breakers": breakers_snapshot(),
+        },
+    )
+
+
+@router.get("/metrics", summary="Metrics nội bộ của process (JSON)")
+async def metrics():
+    return metrics_snapshot()
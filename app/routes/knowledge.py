@@ -6,12 +6,8 @@ from datetime import datetime, timezone
 
 from app.services.auth_service import get_current_user, User
 from app.configurations.weaviate_config import get_weaviate_client
-
-# weaviate 4.x query helpers
-try:
-    from weaviate.classes.query import Filter
-except Exception:
-    Filter = None
+from app.services.embedding_service import get_embedding_service
+from app.services.weaviate_tenancy import combine_filters, facility_filter, is_missing_tenant_error, tenant_collection
 
 router = APIRouter(tags=["Knowledge"], prefix="/knowledge")
 
@@ -29,11 +25,14 @@ def upload_knowledge(items: List[Dict[str, Any]], user: User = Depends(get_curre
         raise HTTPException(status_code=500, detail="Weaviate client chưa sẵn sàng")
 
     collection_name = "FarmingKnowledge"
-    collection = _ensure_collection(client, collection_name)
+    _ensure_collection(client, collection_name)
+    # multi-tenant: ghi vào tenant của facility (auto tenant creation tạo tenant ở lần ghi đầu)
+    collection = tenant_collection(client, collection_name, user.facilityID)
 
     inserted = 0
     errors: List[str] = []
 
+    data_objects: Dict[int, Dict[str, Any]] = {}
     for idx, item in enumerate(items):
         try:
             content = item.get("content")
@@ -68,7 +67,23 @@ def upload_knowledge(items: List[Dict[str, Any]], user: User = Depends(get_curre
             # Không thay đổi schema, nhưng gắn email vào nội dung để phân biệt người dùng
             # Nếu schema có sẵn trường createdByEmail, ta có thể thêm: data_object["createdByEmail"] = user.email
 
-            collection.data.insert(data_object)
+            data_objects[idx] = data_object
+        except Exception as e:
+            errors.append(f"Item {idx}: {e}")
+
+    # EMBEDDING_MODE=local: vector hoá toàn bộ nội dung trong một lượt batch trước khi insert
+    vectors: Dict[int, List[float]] = {}
+    embedder = get_embedding_service()
+    if embedder is not None and data_objects:
+        try:
+            indexes = list(data_objects)
+            vectors = dict(zip(indexes, embedder.embed_texts([data_objects[i]["content"] for i in indexes])))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Lỗi khi tạo embedding: {e}")
+
+    for idx, data_object in data_objects.items():
+        try:
+            collection.data.insert(data_object, vector=vectors.get(idx))
             inserted += 1
         except Exception as e:
             errors.append(f"Item {idx}: {e}")
@@ -95,7 +110,14 @@ def get_my_knowledge(
         raise HTTPException(status_code=500, detail="Weaviate client chưa sẵn sàng")
 
     collection_name = "FarmingKnowledge"
-    collection = _ensure_collection(client, collection_name)
+    _ensure_collection(client, collection_name)
+    collection = tenant_collection(client, collection_name, user.facilityID)
+
+    # weaviate 4.x query helpers (import lười để không nạp SDK lúc khởi động)
+    try:
+        from weaviate.classes.query import Filter
+    except Exception:
+        Filter = None
 
     try:
         # chua trien khai Filter API trong weaviate client hien tai
@@ -103,18 +125,19 @@ def get_my_knowledge(
         if Filter is None:
             raise HTTPException(status_code=500, detail="Weaviate Filter API không khả dụng trong phiên bản client hiện tại")
 
-        base_filter = Filter.by_property("facilityID").equal(user.facilityID)
-        if include_email:
-            email_filter = Filter.by_property("createdByEmail").equal(user.email)
-            final_filter = base_filter & email_filter
-        else:
-            final_filter = base_filter
-
-        result = collection.query.fetch_objects(
-            limit=limit,
-            offset=offset,
-            filters=final_filter,
-        )
+        email_filter = Filter.by_property("createdByEmail").equal(user.email) if include_email else None
+        final_filter = combine_filters(facility_filter(user.facilityID), email_filter)
+
+        try:
+            result = collection.query.fetch_objects(
+                limit=limit,
+                offset=offset,
+                filters=final_filter,
+            )
+        except Exception as e:
+            if not is_missing_tenant_error(e):
+                raise
+            return {"count": 0, "items": [], "facilityID": user.facilityID}
 
         mapped: List[Dict[str, Any]] = []
         # result.objects is a list of Objects with .properties and .uuid
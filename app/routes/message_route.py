@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from pymongo.database import Database
 from bson import ObjectId
 from app.configurations.mongo_config import get_db
-from app.repositories.message_repository import MessageRepository
+from app.repositories.conversation_repository import ConversationRepository
+from app.repositories.message_repository import get_message_repository
 from app.services.auth_service import get_current_user, User
+from app.utils.fast_json import FastJSONResponse, fast_json_enabled
+from app.utils.http_cache import cache_headers, etag_matches, make_etag, not_modified, record_full_response
 
 router = APIRouter()
 
@@ -11,6 +16,7 @@ router = APIRouter()
 @router.get("/conversations/{conversation_id}/messages")
 async def get_messages_by_conversation(
         conversation_id: str,
+        request: Request,
         limit: int = Query(default=50, le=100, ge=1),
         offset: int = Query(default=0, ge=0),
         db: Database = Depends(get_db),
@@ -21,6 +27,7 @@ async def get_messages_by_conversation(
     Query parameters:
     - limit: number of messages to return (default: 50, max: 100)
     - offset: number of messages to skip (default: 0)
+    Responses carry an ETag; If-None-Match with an unchanged page returns 304 after a metadata-only read.
     """
     try:
 
@@ -33,27 +40,44 @@ async def get_messages_by_conversation(
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid conversation ID format")
 
-        # Get messages using repository
-        message_repo = MessageRepository(db)
-        all_messages = message_repo.get_by_conversation_id(convo_id)
-
-        # Apply pagination
-        total_messages = len(all_messages)
-        paginated_messages = all_messages[offset:offset + limit]
+        # ETag từ metadata của conversation (message chỉ được thêm, không sửa): có message mới thì
+        # message_count/last_message_at đổi. Conversation chưa backfill message_count thì không có ETag.
+        etag = None
+        version = ConversationRepository(db).get_version(convo_id)
+        if version is not None and version.get("message_count") is not None:
+            etag = make_etag("messages", convo_id, version["message_count"], version.get("last_message_at"),
+                             limit, offset)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            record_full_response()
+        headers = cache_headers(etag) if etag else None
 
-        # Convert to response format
-        messages_data = []
-        for message in paginated_messages:
-            messages_data.append({
+        # Get messages using repository
+        message_repo = get_message_repository(db)
+        # đọc đúng một trang qua cả tầng lưu trữ lạnh (messages_archive) và `messages`
+        if fast_json_enabled():
+            # dict thô -> JSON bằng orjson, không dựng MessageInDB cho từng message
+            raw_messages, total_messages = message_repo.get_page_raw(convo_id, offset, limit)
+            messages_data = [{
+                'id': doc['_id'],
+                'conversation_id': doc['conversation_id'],
+                'content': doc.get('content', ''),
+                'sender_type': doc['sender_type'],
+                'sender_id': doc.get('sender_id'),
+                'timestamp': doc['timestamp'],
+            } for doc in raw_messages]
+        else:
+            paginated_messages, total_messages = message_repo.get_page_by_conversation(convo_id, offset, limit)
+            messages_data = [{
                 'id': str(message.id),
                 'conversation_id': str(message.conversation_id),
                 'content': message.content,
                 'sender_type': message.sender_type,
                 'sender_id': message.sender_id,
                 'timestamp': message.timestamp.isoformat()
-            })
+            } for message in paginated_messages]
 
-        return {
+        body = {
             'success': True,
             'data': {
                 'messages': messages_data,
@@ -63,6 +87,9 @@ async def get_messages_by_conversation(
                 'offset': offset
             }
         }
+        if fast_json_enabled():
+            return FastJSONResponse(body, headers=headers)
+        return JSONResponse(jsonable_encoder(body), headers=headers)
 
     except HTTPException:
         raise
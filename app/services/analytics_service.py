@@ -0,0 +1,168 @@
+"""Thống kê toàn facility (đàn nào đang dùng feed nào, lịch tiêm sắp tới hạn) từ collection `batches`.
+
+Dữ liệu gọn của từng đàn (tên feed, medication có nextDueDate của entry history cuối) được tính bằng
+aggregation pipeline ở Mongo rồi giữ trong bộ nhớ theo facility, cùng số feed → số đàn đã cộng dồn sẵn.
+
+Refresh tăng dần: mỗi ANALYTICS_REFRESH_SECONDS chỉ chạy một pipeline `$size` nhẹ để biết đàn nào có
+thêm entry history (hoặc mới/bị xoá), rồi đọc lại đúng các đàn đó và cập nhật phần đóng góp của chúng.
+Định kỳ ANALYTICS_FULL_RELOAD_SECONDS nạp lại toàn bộ để sửa các thay đổi không làm đổi số entry.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta, UTC
+from typing import Dict, List, Optional, Tuple
+
+from app.configurations.settings import get_env
+from app.models.asset_timeline import parse_datetime
+from app.utils.metrics import increment, register_metrics_source
+
+ANALYTICS_REFRESH_SECONDS = float(get_env("ANALYTICS_REFRESH_SECONDS", 60))
+ANALYTICS_FULL_RELOAD_SECONDS = float(get_env("ANALYTICS_FULL_RELOAD_SECONDS", 3600))
+
+
+@dataclass
+class FacilityAnalytics:
+    facility_id: str
+    history_sizes: Dict[str, int] = field(default_factory=dict)
+    feeds_by_asset: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    # (ngày đến hạn ISO, assetID, tên thuốc), sắp xếp để lọc theo khoảng ngày bằng bisect
+    due: List[Tuple[str, str, str]] = field(default_factory=list)
+    due_dates: List[str] = field(default_factory=list)
+    feed_counts: Counter = field(default_factory=Counter)
+    loaded_at: float = 0.0
+    refreshed_at: float = 0.0
+
+    def apply_rows(self, rows: List[dict], removed: Tuple[str, ...] = ()):
+        """Thay phần đóng góp của các đàn trong `rows` (và bỏ các đàn `removed`) vào số liệu cộng dồn."""
+        changed = {row["assetID"] for row in rows if row.get("assetID")} | set(removed)
+        for asset_id in changed:
+            self.feed_counts.subtract(set(self.feeds_by_asset.pop(asset_id, ())))
+            self.history_sizes.pop(asset_id, None)
+        self.due = [d for d in self.due if d[1] not in changed]
+
+        for row in rows:
+            asset_id = row.get("assetID")
+            if not asset_id:
+                continue
+            feeds = tuple(row.get("feeds") or ())
+            self.feeds_by_asset[asset_id] = feeds
+            self.feed_counts.update(set(feeds))
+            self.history_sizes[asset_id] = row.get("historySize", 0)
+            for med in row.get("dueMedications") or ():
+                due_at = parse_datetime(med.get("nextDueDate"))
+                if due_at is not None:
+                    self.due.append((due_at.date().isoformat(), asset_id, med.get("name") or ""))
+
+        self.feed_counts = +self.feed_counts  # bỏ các feed về 0
+        self.due.sort()
+        self.due_dates = [d[0] for d in self.due]
+
+
+def _default_repo():
+    from app.configurations.mongo_config import get_db
+    from app.repositories.asset_repository import AssetRepository
+
+    return AssetRepository(get_db())
+
+
+class AnalyticsService:
+    def __init__(self, repo_factory=_default_repo, refresh_interval: float = ANALYTICS_REFRESH_SECONDS,
+                 full_reload_interval: float = ANALYTICS_FULL_RELOAD_SECONDS):
+        self._repo_factory = repo_factory
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._facilities: Dict[str, FacilityAnalytics] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, facility_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(facility_id, threading.Lock())
+
+    def _full_load(self, facility_id: str) -> FacilityAnalytics:
+        analytics = FacilityAnalytics(facility_id=facility_id)
+        analytics.apply_rows(self._repo_factory().analytics_rows_by_facility(facility_id))
+        analytics.loaded_at = analytics.refreshed_at = time.monotonic()
+        increment("analytics.full_loads")
+        return analytics
+
+    def _incremental_refresh(self, analytics: FacilityAnalytics) -> FacilityAnalytics:
+        repo = self._repo_factory()
+        sizes = repo.history_sizes_by_facility(analytics.facility_id)
+        changed = [a for a, n in sizes.items() if analytics.history_sizes.get(a) != n]
+        removed = tuple(a for a in analytics.history_sizes if a not in sizes)
+        # cập nhật trên bản sao rồi thay cả object: request khác vẫn đọc bản cũ nhất quán trong lúc refresh
+        refreshed = replace(analytics, history_sizes=dict(analytics.history_sizes),
+                            feeds_by_asset=dict(analytics.feeds_by_asset), due=list(analytics.due),
+                            feed_counts=Counter(analytics.feed_counts))
+        if changed or removed:
+            rows = repo.analytics_rows_by_facility(analytics.facility_id, changed) if changed else []
+            refreshed.apply_rows(rows, removed)
+            increment("analytics.incremental_rows", len(changed) + len(removed))
+        refreshed.refreshed_at = time.monotonic()
+        increment("analytics.incremental_refreshes")
+        return refreshed
+
+    def get(self, facility_id: str) -> FacilityAnalytics:
+        """Số liệu của facility, nạp hoặc refresh khi đã quá hạn. Lỗi Mongo được ném ra cho caller."""
+        analytics = self._facilities.get(facility_id)
+        now = time.monotonic()
+        if analytics is not None and now - analytics.refreshed_at <= self.refresh_interval:
+            return analytics
+
+        with self._lock_for(facility_id):
+            analytics = self._facilities.get(facility_id)
+            now = time.monotonic()
+            if analytics is None or now - analytics.loaded_at > self.full_reload_interval:
+                analytics = self._facilities[facility_id] = self._full_load(facility_id)
+            elif now - analytics.refreshed_at > self.refresh_interval:
+                analytics = self._facilities[facility_id] = self._incremental_refresh(analytics)
+            return analytics
+
+    # ---- truy vấn ---------------------------------------------------------
+    def feed_usage(self, facility_id: str, feed_name: Optional[str] = None) -> List[dict]:
+        """Số đàn đang dùng từng feed (entry history cuối), nhiều nhất trước; lọc theo tên chứa `feed_name`."""
+        analytics = self.get(facility_id)
+        needle = (feed_name or "").strip().lower()
+        usage = []
+        for name, count in analytics.feed_counts.most_common():
+            if needle and needle not in name.lower():
+                continue
+            assets = sorted(a for a, feeds in analytics.feeds_by_asset.items() if name in feeds)
+            usage.append({"feed": name, "batches": count, "asset_ids": assets})
+        return usage
+
+    def medications_due(self, facility_id: str, start: Optional[date] = None,
+                        end: Optional[date] = None) -> List[dict]:
+        """Các thuốc/vắc-xin có nextDueDate trong [start, end] (mặc định: hôm nay đến 7 ngày tới)."""
+        analytics = self.get(facility_id)
+        start = start or datetime.now(UTC).date()
+        end = end or start + timedelta(days=7)
+        lo = bisect_left(analytics.due_dates, start.isoformat())
+        hi = bisect_right(analytics.due_dates, end.isoformat())
+        return [{"asset_id": asset_id, "medication": name, "next_due_date": due}
+                for due, asset_id, name in analytics.due[lo:hi]]
+
+    def summary(self, facility_id: str, days: int = 7) -> dict:
+        analytics = self.get(facility_id)
+        return {
+            "facility_id": facility_id,
+            "batches": len(analytics.history_sizes),
+            "top_feeds": [{"feed": name, "batches": count} for name, count in analytics.feed_counts.most_common(5)],
+            "medications_due": self.medications_due(facility_id, end=datetime.now(UTC).date() + timedelta(days=days)),
+            "days": days,
+        }
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            facility_id: {"batches": len(a.history_sizes), "age_seconds": round(now - a.refreshed_at, 1)}
+            for facility_id, a in list(self._facilities.items())
+        }
+
+
+analytics_service = AnalyticsService()
+register_metrics_source("analytics", analytics_service.snapshot)
@@ -4,6 +4,7 @@ from fastapi import Depends
 from pymongo.database import Database
 
 from app.configurations.mongo_config import get_db
+from app.models.asset import LatestAssetState
 from app.repositories.asset_repository import AssetRepository
 
 
@@ -37,12 +38,14 @@ class AssetService:
             return None
 
     def _get_latest_history_field(self, asset_id: str, facility_id: str, field: str) -> Optional[List[Dict[str, Any]]]:
-        asset_data = self.get_asset_info_by_id(asset_id, facility_id)
-        if not asset_data or not asset_data.get("history"):
+        # chỉ project entry history cuối cùng thay vì đọc cả document
+        state = self._repo.find_latest_state(asset_id, facility_id)
+        if state is None:
             return None
+        return state.details.get(field)
 
-        latest_history = asset_data["history"][-1]
-        return latest_history.get("details", {}).get(field)
+    def get_latest_states(self, asset_ids: List[str], facility_id: str) -> Dict[str, LatestAssetState]:
+        return self._repo.find_latest_states(asset_ids, facility_id)
 
     def get_current_feeds(self, asset_id: str, facility_id: str) -> Optional[List[Dict[str, Any]]]:
         return self._get_latest_history_field(asset_id, facility_id, "feeds")
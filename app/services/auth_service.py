@@ -1,4 +1,3 @@
-import os
 from datetime import datetime, timedelta, timezone
 
 from fastapi import Depends, HTTPException, status
@@ -6,11 +5,12 @@ from fastapi.security import HTTPBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel
 
+from app.configurations.settings import get_env
 from app.services.user_service import get_user_service, UserService
 
 # NOTE: when used as dependency, FastAPI will inject UserService via Depends(get_user_service)
 
-SECRET_KEY = os.getenv("SECRET_KEY")
+SECRET_KEY = get_env("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 24
 
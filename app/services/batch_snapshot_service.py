@@ -0,0 +1,145 @@
+"""Snapshot feeds/medications mới nhất của các đàn theo facility, giữ trong bộ nhớ của worker.
+
+Câu hỏi "đàn X đang ăn gì / đã tiêm gì" trước đây luôn gọi trace API cho từng đàn. Snapshot được nạp
+bằng một lượt aggregation trên collection `batches` cho cả facility (chỉ entry history cuối cùng),
+index theo assetID, rồi được làm mới định kỳ ở background cho các facility còn được hỏi tới.
+
+Đảm bảo độ tươi: snapshot cũ hơn BATCH_SNAPSHOT_TTL_SECONDS không bao giờ được dùng để trả lời; khi đó
+request nạp lại (single-flight theo facility). Đàn không có trong snapshot hoặc Mongo lỗi thì handler
+quay về gọi trace API trực tiếp như trước.
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from app.configurations.settings import get_env
+from app.models.asset import LatestAssetState
+from app.utils.metrics import increment, register_metrics_source
+
+BATCH_SNAPSHOT_ENABLED = get_env("BATCH_SNAPSHOT_ENABLED", "true").lower() == "true"
+# tuổi tối đa của snapshot được phép dùng để trả lời
+BATCH_SNAPSHOT_TTL_SECONDS = float(get_env("BATCH_SNAPSHOT_TTL_SECONDS", 300))
+# chu kỳ làm mới ở background; nhỏ hơn TTL để request hiếm khi phải tự nạp
+BATCH_SNAPSHOT_REFRESH_SECONDS = float(get_env("BATCH_SNAPSHOT_REFRESH_SECONDS", 120))
+# facility không được hỏi tới trong khoảng này thì bỏ khỏi bộ nhớ và ngừng làm mới
+BATCH_SNAPSHOT_IDLE_SECONDS = float(get_env("BATCH_SNAPSHOT_IDLE_SECONDS", 1800))
+
+
+@dataclass(slots=True)
+class FacilitySnapshot:
+    facility_id: str
+    batches: Dict[str, LatestAssetState]
+    loaded_at: float
+    last_access: float = field(default_factory=time.monotonic)
+
+
+def _default_repo():
+    from app.configurations.mongo_config import get_db
+    from app.repositories.asset_repository import AssetRepository
+
+    return AssetRepository(get_db())
+
+
+class BatchSnapshotService:
+    def __init__(self, repo_factory=_default_repo, ttl: float = BATCH_SNAPSHOT_TTL_SECONDS,
+                 refresh_interval: float = BATCH_SNAPSHOT_REFRESH_SECONDS, idle: float = BATCH_SNAPSHOT_IDLE_SECONDS):
+        self._repo_factory = repo_factory
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.idle = idle
+        self._snapshots: Dict[str, FacilitySnapshot] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _lock_for(self, facility_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(facility_id, threading.Lock())
+
+    def _is_fresh(self, snapshot: Optional[FacilitySnapshot]) -> bool:
+        return snapshot is not None and time.monotonic() - snapshot.loaded_at <= self.ttl
+
+    def load_facility(self, facility_id: str) -> FacilitySnapshot:
+        start = time.perf_counter()
+        batches = {state.asset_id: state for state in self._repo_factory().find_latest_states_by_facility(facility_id)}
+
+        previous = self._snapshots.get(facility_id)
+        snapshot = FacilitySnapshot(facility_id=facility_id, batches=batches, loaded_at=time.monotonic())
+        if previous is not None:
+            snapshot.last_access = previous.last_access
+        self._snapshots[facility_id] = snapshot
+        increment("batch_snapshot.loads")
+        print(f"Loaded batch snapshot for facility {facility_id}: {len(batches)} batches "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return snapshot
+
+    def get(self, asset_id: str, facility_id: str) -> Optional[LatestAssetState]:
+        """Trả snapshot của đàn nếu có dữ liệu đủ tươi; None nghĩa là caller nên gọi trace API."""
+        if not BATCH_SNAPSHOT_ENABLED or not asset_id or not facility_id:
+            return None
+
+        snapshot = self._snapshots.get(facility_id)
+        if not self._is_fresh(snapshot):
+            with self._lock_for(facility_id):
+                snapshot = self._snapshots.get(facility_id)
+                if not self._is_fresh(snapshot):
+                    try:
+                        snapshot = self.load_facility(facility_id)
+                    except Exception as e:
+                        increment("batch_snapshot.load_errors")
+                        print(f"Unable to load batch snapshot for facility {facility_id}: {e}")
+                        return None
+
+        snapshot.last_access = time.monotonic()
+        batch = snapshot.batches.get(asset_id)
+        increment("batch_snapshot.hits" if batch is not None else "batch_snapshot.misses")
+        return batch
+
+    def invalidate(self, facility_id: Optional[str] = None):
+        if facility_id is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(facility_id, None)
+
+    async def refresh_once(self):
+        now = time.monotonic()
+        for facility_id, snapshot in list(self._snapshots.items()):
+            if now - snapshot.last_access > self.idle:
+                self._snapshots.pop(facility_id, None)
+                continue
+            try:
+                await asyncio.to_thread(self.load_facility, facility_id)
+            except Exception as e:
+                increment("batch_snapshot.load_errors")
+                print(f"Background refresh of batch snapshot for {facility_id} failed: {e}")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh_once()
+
+    def start(self):
+        if BATCH_SNAPSHOT_ENABLED and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            facility_id: {"batches": len(s.batches), "age_seconds": round(now - s.loaded_at, 1)}
+            for facility_id, s in list(self._snapshots.items())
+        }
+
+
+batch_snapshots = BatchSnapshotService()
+register_metrics_source("batch_snapshots", batch_snapshots.snapshot)
@@ -0,0 +1,259 @@
+"""Dọn dữ liệu của conversation đã xoá: message trong Mongo và ChatMemory trong Weaviate.
+
+Xoá conversation chỉ xoá document `conversations` rồi ghi một job vào `cleanup_jobs`; job chạy ở background:
+1. xoá message theo lô CLEANUP_BATCH_SIZE (tìm _id rồi delete_many theo _id, mỗi lô một lượt ghi nhỏ),
+2. xoá ChatMemory của conversation (lặp delete_many đến khi không còn object),
+giới hạn tốc độ CLEANUP_MAX_OPS_PER_SECOND để không tranh I/O với request.
+
+Job idempotent (xoá lại thứ đã xoá là no-op) và resumable: bước hiện tại và số đã xoá được lưu sau mỗi lô,
+worker nhận job bằng lease nên job của worker chết được nhận lại khi lease hết hạn. Lỗi thì thử lại với
+backoff, quá CLEANUP_MAX_ATTEMPTS lần thì để ở trạng thái `failed`.
+
+Dữ liệu mồ côi có từ trước (hoặc do tiến trình chết giữa lúc xoá conversation và ghi job) được dọn bằng
+`sweep_orphans`: python -m app.utils.sweep_orphans
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+from typing import Optional
+
+from bson import ObjectId
+
+from app.configurations.settings import get_env
+from app.repositories.cleanup_job_repository import CleanupJobRepository, STAGE_DONE, STAGE_MEMORIES, \
+    STAGE_MESSAGES
+from app.repositories.conversation_repository import ConversationRepository
+from app.repositories.message_repository import get_message_repository
+from app.services.weaviate_tenancy import iter_tenant_collections, multi_tenancy_enabled
+from app.utils.metrics import increment, register_metrics_source
+
+CLEANUP_ENABLED = get_env("CLEANUP_ENABLED", "true").lower() == "true"
+CLEANUP_POLL_SECONDS = float(get_env("CLEANUP_POLL_SECONDS", 10))
+CLEANUP_BATCH_SIZE = int(get_env("CLEANUP_BATCH_SIZE", 500))
+CLEANUP_MAX_OPS_PER_SECOND = float(get_env("CLEANUP_MAX_OPS_PER_SECOND", 20))
+CLEANUP_LEASE_SECONDS = float(get_env("CLEANUP_LEASE_SECONDS", 300))
+CLEANUP_MAX_ATTEMPTS = int(get_env("CLEANUP_MAX_ATTEMPTS", 5))
+
+MEMORY_COLLECTION = "ChatMemory"
+
+
+class RateLimiter:
+    """Giãn cách các thao tác để không vượt quá `ops_per_second` (<= 0: không giới hạn)."""
+
+    def __init__(self, ops_per_second: float):
+        self.interval = 1.0 / ops_per_second if ops_per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _default_db():
+    from app.configurations.mongo_config import get_db
+
+    return get_db()
+
+
+def _default_memory_service():
+    from app.services.memory_weaviate_service import WeaviateChatMemoryService
+
+    return WeaviateChatMemoryService()
+
+
+class ConversationCleanupService:
+    def __init__(self, db_factory=_default_db, memory_factory=_default_memory_service,
+                 batch_size: int = CLEANUP_BATCH_SIZE, max_ops_per_second: float = CLEANUP_MAX_OPS_PER_SECOND,
+                 lease_seconds: float = CLEANUP_LEASE_SECONDS, max_attempts: int = CLEANUP_MAX_ATTEMPTS,
+                 poll_interval: float = CLEANUP_POLL_SECONDS):
+        self._db_factory = db_factory
+        self._memory_factory = memory_factory
+        self._memory_service = None
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.rate_limiter = RateLimiter(max_ops_per_second)
+        self._stop_requested = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_run: dict = {}
+
+    def _jobs(self) -> CleanupJobRepository:
+        return CleanupJobRepository(self._db_factory())
+
+    def _memories(self):
+        if self._memory_service is None:
+            self._memory_service = self._memory_factory()
+        return self._memory_service
+
+    def enqueue(self, convo_id: ObjectId, email: Optional[str] = None, facility_id: Optional[str] = None) -> bool:
+        queued = self._jobs().enqueue(convo_id, email, facility_id, datetime.now(UTC))
+        if queued:
+            increment("cleanup.jobs_enqueued")
+        return queued
+
+    # ---- xử lý job ----------------------------------------------------------
+    def _delete_messages(self, jobs: CleanupJobRepository, job: dict):
+        messages = get_message_repository(self._db_factory())
+        while not self._stop_requested.is_set():
+            self.rate_limiter.wait()
+            deleted = messages.delete_batch_by_conversation(job["_id"], self.batch_size)
+            if not deleted:
+                return
+            jobs.record_progress(job["_id"], datetime.now(UTC), self.lease_seconds, messages_deleted=deleted)
+            increment("cleanup.messages_deleted", deleted)
+        raise InterruptedError("cleanup stopped")
+
+    def _delete_memories(self, jobs: CleanupJobRepository, job: dict):
+        if multi_tenancy_enabled() and not job.get("facilityID"):
+            # không biết tenant; memory mồ côi trong các tenant do sweep_orphans dọn
+            return
+        memories = self._memories()
+        while not self._stop_requested.is_set():
+            self.rate_limiter.wait()
+            deleted = memories.delete_memories_by_conversation(job.get("email"), str(job["_id"]), job.get("facilityID"))
+            if not deleted:
+                return
+            jobs.record_progress(job["_id"], datetime.now(UTC), self.lease_seconds, memories_deleted=deleted)
+            increment("cleanup.memories_deleted", deleted)
+        raise InterruptedError("cleanup stopped")
+
+    def _process(self, jobs: CleanupJobRepository, job: dict):
+        stage = job.get("stage") or STAGE_MESSAGES
+        if stage == STAGE_MESSAGES:
+            self._delete_messages(jobs, job)
+            jobs.set_stage(job["_id"], STAGE_MEMORIES, datetime.now(UTC))
+            stage = STAGE_MEMORIES
+        if stage == STAGE_MEMORIES:
+            self._delete_memories(jobs, job)
+        jobs.set_stage(job["_id"], STAGE_DONE, datetime.now(UTC))
+
+    def run_pending(self, max_jobs: Optional[int] = None) -> int:
+        """Xử lý các job đang chờ (hoặc có lease đã hết hạn); trả về số job hoàn tất."""
+        jobs = self._jobs()
+        completed = 0
+        while not self._stop_requested.is_set() and (max_jobs is None or completed < max_jobs):
+            now = datetime.now(UTC)
+            job = jobs.claim(now, self.lease_seconds)
+            if job is None:
+                break
+            try:
+                self._process(jobs, job)
+                completed += 1
+                increment("cleanup.jobs_completed")
+            except InterruptedError:
+                # tắt app giữa chừng: trả job về hàng đợi, lần chạy sau tiếp tục từ bước đã lưu
+                jobs.release_failed(job["_id"], "interrupted", now, give_up=False, now=now)
+                break
+            except Exception as e:
+                give_up = job.get("attempts", 1) >= self.max_attempts
+                retry_at = now + timedelta(seconds=min(self.poll_interval * 2 ** job.get("attempts", 1), 3600))
+                jobs.release_failed(job["_id"], str(e), retry_at, give_up=give_up, now=now)
+                increment("cleanup.jobs_failed")
+                print(f"Cleanup job for conversation {job['_id']} failed (attempt {job.get('attempts')}): {e}")
+        return completed
+
+    # ---- dọn dữ liệu mồ côi -------------------------------------------------
+    def _sweep_message_orphans(self, dry_run: bool) -> int:
+        db = self._db_factory()
+        conversations = ConversationRepository(db)
+        orphans = 0
+        for convo_ids in get_message_repository(db).iter_conversation_ids(self.batch_size):
+            self.rate_limiter.wait()
+            existing = conversations.existing_ids(convo_ids)
+            for convo_id in convo_ids:
+                if convo_id in existing:
+                    continue
+                orphans += 1
+                if not dry_run:
+                    self.enqueue(convo_id)
+        return orphans
+
+    def _sweep_memory_orphans(self, dry_run: bool) -> int:
+        from weaviate.classes.query import Filter
+
+        from app.configurations.weaviate_config import get_weaviate_client
+
+        client = get_weaviate_client()
+        if client is None:
+            print("Weaviate chưa sẵn sàng; bỏ qua dọn ChatMemory mồ côi.")
+            return 0
+        conversations = ConversationRepository(self._db_factory())
+        removed = 0
+        for collection in iter_tenant_collections(client, MEMORY_COLLECTION):
+            ids = {obj.properties.get("conversationID")
+                   for obj in collection.iterator(return_properties=["conversationID"])}
+            # chỉ xét id hợp lệ: memory có conversationID lạ không chắc là mồ côi
+            valid = sorted(i for i in ids if i and ObjectId.is_valid(i))
+            for start in range(0, len(valid), self.batch_size):
+                chunk = valid[start:start + self.batch_size]
+                self.rate_limiter.wait()
+                existing = {str(i) for i in conversations.existing_ids([ObjectId(i) for i in chunk])}
+                missing = [i for i in chunk if i not in existing]
+                if not missing:
+                    continue
+                where = Filter.by_property("conversationID").contains_any(missing)
+                if dry_run:
+                    removed += collection.aggregate.over_all(filters=where, total_count=True).total_count
+                    continue
+                while True:
+                    self.rate_limiter.wait()
+                    deleted = collection.data.delete_many(where=where).successful
+                    removed += deleted
+                    if not deleted:
+                        break
+        increment("cleanup.orphan_memories_deleted", 0 if dry_run else removed)
+        return removed
+
+    def sweep_orphans(self, dry_run: bool = False) -> dict:
+        """
+        Tìm conversation_id có message nhưng không còn conversation -> tạo job dọn (chạy bằng run_pending),
+        và xoá trực tiếp ChatMemory trỏ tới conversation không còn tồn tại, theo từng tenant.
+        """
+        result = {
+            "orphan_conversations": self._sweep_message_orphans(dry_run),
+            "orphan_memories": self._sweep_memory_orphans(dry_run),
+            "dry_run": dry_run,
+        }
+        print(f"Orphan sweep: {result}")
+        return result
+
+    # ---- background ---------------------------------------------------------
+    async def _loop(self):
+        while True:
+            try:
+                completed = await asyncio.to_thread(self.run_pending)
+                self._last_run = {"completed": completed, "at": datetime.now(UTC).isoformat()}
+            except Exception as e:
+                print(f"Cleanup loop error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if CLEANUP_ENABLED and (self._task is None or self._task.done()):
+            self._stop_requested.clear()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        self._stop_requested.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {"running": self._task is not None and not self._task.done(), "last_run": self._last_run}
+
+
+conversation_cleanup = ConversationCleanupService()
+register_metrics_source("cleanup", conversation_cleanup.snapshot)
@@ -1,5 +1,8 @@
 from app.repositories.conversation_repository import ConversationRepository
 from app.models.conversation import ConversationCreate, ConversationInDB
+from app.services.cleanup_service import conversation_cleanup
+from app.services.session_cache import session_cache
+from app.utils.http_cache import make_etag
 from bson import ObjectId
 from datetime import datetime, timezone
 
@@ -15,6 +18,17 @@ class ConversationService:
         """Return list of conversations for a user (optionally filtered by facilityID) with pagination."""
         return self.repo.list_by_user(email=email, facilityID=facilityID, limit=limit, offset=offset)
 
+    def list_conversations_raw(self, email: str, facilityID: str | None = None, limit: int = 50, offset: int = 0) -> list[dict]:
+        """Same as list_conversations_for_user but returns raw documents for the orjson response path."""
+        return self.repo.list_by_user_raw(email=email, facilityID=facilityID, limit=limit, offset=offset)
+
+    def list_etag(self, email: str, facilityID: str | None = None, limit: int = 50, offset: int = 0) -> str:
+        """ETag of a conversation list page, computed from a metadata-only read."""
+        versions = self.repo.list_versions(email=email, facilityID=facilityID, limit=limit, offset=offset)
+        return make_etag("conversations", email, facilityID, limit, offset,
+                         *((v["_id"], v.get("updated_at"), v.get("message_count"), v.get("last_message_at"))
+                           for v in versions))
+
     def update_title(self, convo_id: str, new_title: str) -> bool:
         try:
             obj_id = ObjectId(convo_id)
@@ -29,8 +43,17 @@ class ConversationService:
             {"_id": obj_id},
             {"$set": {"title": new_title, "updated_at": datetime.now(timezone.utc)}}
         )
+        session_cache.update_title(convo_id, new_title)
         return True
 
     def delete_conversation(self, convo_id: ObjectId) -> bool:
-        result = self.repo.collection.delete_one({"_id": convo_id})
-        return result.deleted_count > 0
\ No newline at end of file
+        deleted = self.repo.delete_and_get(convo_id)
+        session_cache.invalidate(str(convo_id))
+        if deleted is None:
+            return False
+        # message và memory được xoá ở background; nếu không ghi được job thì sweep_orphans sẽ dọn sau
+        try:
+            conversation_cleanup.enqueue(convo_id, deleted.get("email"), deleted.get("facilityID"))
+        except Exception as e:
+            print(f"Warning: failed to enqueue cleanup for conversation {convo_id}: {e}")
+        return True
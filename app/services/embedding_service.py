@@ -0,0 +1,250 @@
+"""Vector hoá văn bản ngay trong app thay vì để Weaviate gọi sang container t2v-transformers.
+
+EMBEDDING_MODE:
+- module (mặc định): Weaviate tự vector hoá qua text2vec-transformers (near_text / insert không vector).
+- local: app tự tính embedding theo batch bằng all-MiniLM-L6-v2 (ONNX, có thể quantized) trên CPU và
+  truyền vector trực tiếp (near_vector / insert kèm vector). Cùng model với container t2v-transformers
+  nên vector tương thích với dữ liệu đã có.
+- remote: app gọi thẳng container t2v-transformers (T2V_INFERENCE_URL) rồi truyền vector như mode local,
+  để mọi lượt vector hoá đều đi qua embedding cache.
+
+Ở mode local/remote, mọi đường vector hoá (insert memory, tìm tri thức, upload tri thức) tra
+EmbeddingCache theo hash nội dung trước; cache có thể lưu xuống đĩa bằng memmap (EMBEDDING_CACHE_DIR).
+
+Mode local cần `onnxruntime`, `tokenizers`, `numpy` và thư mục model LOCAL_EMBEDDING_MODEL_PATH chứa
+file ONNX và tokenizer.json (ví dụ bản export ONNX của sentence-transformers/all-MiniLM-L6-v2).
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import requests
+
+from app.configurations.settings import get_env
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.metrics import register_metrics_source
+
+EMBEDDING_MODE = get_env("EMBEDDING_MODE", "module").lower()
+LOCAL_EMBEDDING_MODEL_PATH = get_env("LOCAL_EMBEDDING_MODEL_PATH", "models/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_ONNX_FILE = get_env("LOCAL_EMBEDDING_ONNX_FILE", "model_quantized.onnx")
+EMBEDDING_BATCH_SIZE = int(get_env("EMBEDDING_BATCH_SIZE", 32))
+EMBEDDING_MAX_TOKENS = int(get_env("EMBEDDING_MAX_TOKENS", 256))
+EMBEDDING_CACHE_MAX_ITEMS = int(get_env("EMBEDDING_CACHE_MAX_ITEMS", 10000))
+# Thư mục lưu cache embedding trên đĩa (memmap); bỏ trống thì chỉ cache trong bộ nhớ.
+EMBEDDING_CACHE_DIR = get_env("EMBEDDING_CACHE_DIR")
+EMBEDDING_DISK_CACHE_MAX_ITEMS = int(get_env("EMBEDDING_DISK_CACHE_MAX_ITEMS", 100000))
+T2V_INFERENCE_URL = get_env("T2V_INFERENCE_URL", "http://localhost:8082")
+# số request /vectors song song cho một batch ở mode remote
+T2V_MAX_CONCURRENCY = int(get_env("T2V_MAX_CONCURRENCY", 4))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LocalEmbedder:
+    """Sentence embedding trên CPU bằng onnxruntime: mean pooling theo attention mask rồi chuẩn hoá L2."""
+
+    def __init__(self, model_dir: str = LOCAL_EMBEDDING_MODEL_PATH, onnx_file: str = LOCAL_EMBEDDING_ONNX_FILE,
+                 max_tokens: int = EMBEDDING_MAX_TOKENS):
+        # import lười: chỉ cần khi EMBEDDING_MODE=local
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self._np = np
+        model_file = os.path.join(model_dir, onnx_file)
+        if not os.path.exists(model_file):
+            model_file = os.path.join(model_dir, "model.onnx")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=max_tokens)
+        self._tokenizer.enable_padding()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        np = self._np
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        last_hidden = self._session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (last_hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32).tolist()
+
+
+class RemoteT2VEmbedder:
+    """
+    Gọi endpoint /vectors của container t2v-transformers (cùng API mà Weaviate dùng). Endpoint nhận một text mỗi
+    request, nên một batch được gửi song song (tối đa `max_concurrency` request, mỗi thread một Session).
+    """
+
+    def __init__(self, url: str = T2V_INFERENCE_URL, timeout: float = 10, max_concurrency: int = T2V_MAX_CONCURRENCY):
+        self._url = f"{url.rstrip('/')}/vectors"
+        self._timeout = timeout
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="t2v")
+
+    def _embed_one(self, text: str) -> List[float]:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        resp = session.post(self._url, json={"text": text}, timeout=self._timeout)
+        resp.raise_for_status()
+        return resp.json()["vector"]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 1:
+            return [self._embed_one(texts[0])]
+        return list(self._executor.map(self._embed_one, texts))
+
+
+class EmbeddingService:
+    """Embed theo batch, tra EmbeddingCache theo hash nội dung trước khi gọi model."""
+
+    def __init__(self, embedder, batch_size: int = EMBEDDING_BATCH_SIZE, cache: Optional[EmbeddingCache] = None):
+        self._embedder = embedder
+        self.batch_size = batch_size
+        self._cache = cache or EmbeddingCache(max_items=EMBEDDING_CACHE_MAX_ITEMS)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "cache_hits": 0, "embedded": 0, "embed_seconds": 0.0}
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_hash(t) for t in texts]
+        vectors: List[Optional[List[float]]] = [self._cache.get(k) for k in keys]
+
+        # các text chưa có trong cache (gộp trùng lặp trong cùng một lời gọi)
+        missing: dict[str, str] = {}
+        for key, text, vec in zip(keys, texts, vectors):
+            if vec is None:
+                missing.setdefault(key, text)
+
+        elapsed = 0.0
+        if missing:
+            start = time.perf_counter()
+            computed: dict[str, List[float]] = {}
+            miss_keys = list(missing)
+            for i in range(0, len(miss_keys), self.batch_size):
+                chunk = miss_keys[i:i + self.batch_size]
+                for key, vec in zip(chunk, self._embedder.embed_batch([missing[k] for k in chunk])):
+                    computed[key] = vec
+                    self._cache.put(key, vec)
+            elapsed = time.perf_counter() - start
+            vectors = [vec if vec is not None else computed[key] for key, vec in zip(keys, vectors)]
+
+        with self._lock:
+            self._stats["requests"] += len(texts)
+            self._stats["cache_hits"] += len(texts) - len(missing)
+            self._stats["embedded"] += len(missing)
+            self._stats["embed_seconds"] += elapsed
+        return vectors
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_texts([text])[0]
+
+    def warm_up(self):
+        """Chạy một lượt embed không qua cache để nạp model (ONNX/kết nối t2v) trước request đầu tiên."""
+        start = time.perf_counter()
+        self._embedder.embed_batch(["khởi động"])
+        print(f"Embedding model warmed up in {time.perf_counter() - start:.2f}s.")
+
+    def flush(self):
+        self._cache.flush()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = round(stats["cache_hits"] / stats["requests"], 4) if stats["requests"] else 0.0
+        # thời gian tiết kiệm ước lượng = số lần hit × thời gian embed trung bình mỗi text
+        avg_embed = stats["embed_seconds"] / stats["embedded"] if stats["embedded"] else 0.0
+        stats["estimated_seconds_saved"] = round(stats["cache_hits"] * avg_embed, 4)
+        stats["cache"] = self._cache.snapshot()
+        return stats
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+_cache_dir_lock_file = None
+
+
+def _claim_cache_dir(base_dir: str) -> Optional[str]:
+    """
+    Mỗi worker giữ flock trên một thư mục slot-N riêng để các process không ghi đè memmap của nhau;
+    số slot ổn định nên cache vẫn được dùng lại sau khi restart.
+    """
+    global _cache_dir_lock_file
+    import fcntl
+
+    for i in range(64):
+        path = os.path.join(base_dir, f"slot-{i}")
+        os.makedirs(path, exist_ok=True)
+        fh = open(os.path.join(path, ".lock"), "w")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            continue
+        _cache_dir_lock_file = fh
+        return path
+    print(f"No free embedding cache slot under {base_dir}; using in-memory cache only.")
+    return None
+
+
+def get_embedding_service() -> Optional[EmbeddingService]:
+    """
+    Trả về EmbeddingService của process khi EMBEDDING_MODE=local/remote, ngược lại None
+    (caller dùng near_text / insert không vector như trước).
+    """
+    global _service
+    if EMBEDDING_MODE not in ("local", "remote"):
+        return None
+    if _service is not None:
+        return _service
+    with _service_lock:
+        if _service is None:
+            embedder = LocalEmbedder() if EMBEDDING_MODE == "local" else RemoteT2VEmbedder()
+            persist_dir = _claim_cache_dir(EMBEDDING_CACHE_DIR) if EMBEDDING_CACHE_DIR else None
+            cache = EmbeddingCache(EMBEDDING_CACHE_MAX_ITEMS, persist_dir=persist_dir,
+                                   disk_capacity=EMBEDDING_DISK_CACHE_MAX_ITEMS)
+            _service = EmbeddingService(embedder, cache=cache)
+            register_metrics_source("embeddings", _service.snapshot)
+            print(f"Embedding service initialized (mode={EMBEDDING_MODE}).")
+    return _service
+
+
+def warm_embedding_service():
+    """Khởi tạo EmbeddingService và nạp model khi startup (mode local/remote); lỗi chỉ được log."""
+    try:
+        service = get_embedding_service()
+        if service is not None:
+            service.warm_up()
+    except Exception as e:
+        print(f"Embedding warm-up failed: {e}")
+
+
+def close_embedding_service():
+    """Ghi phần cache embedding còn dirty xuống đĩa (gọi khi shutdown)."""
+    if _service is not None:
+        _service.flush()
+
+
+def get_vectorizer_config():
+    """Vectorizer cho collection mới: none khi app tự tính vector, text2vec-transformers khi ở mode module."""
+    from weaviate.collections.classes.config import Configure
+
+    if EMBEDDING_MODE == "local":
+        return Configure.Vectorizer.none()
+    return Configure.Vectorizer.text2vec_transformers()
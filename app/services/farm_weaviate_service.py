@@ -1,5 +1,19 @@
-from weaviate.classes.query import Filter
+from app.configurations.settings import get_env
 from app.configurations.weaviate_config import get_weaviate_client
+from app.services.embedding_service import get_embedding_service
+from app.services.health_service import dependency_available
+from app.services.knowledge_reranker import knowledge_reranker
+from app.services.weaviate_tenancy import combine_filters, facility_filter, is_missing_tenant_error, tenant_collection
+from app.utils.cache_backend import get_cache
+from app.utils.circuit_breaker import CircuitOpenError, get_breaker
+from app.utils.metrics import increment
+
+# Kết quả tìm kiếm gần nhất được giữ lại để trả lời ở chế độ degraded khi Weaviate lỗi/chậm.
+KNOWLEDGE_FALLBACK_TTL_SECONDS = float(get_env("KNOWLEDGE_FALLBACK_TTL_SECONDS", 24 * 3600))
+# Số candidate lấy từ Weaviate để reranker chấm điểm (1 = giữ hành vi cũ, không rerank).
+KNOWLEDGE_CANDIDATE_LIMIT = int(get_env("KNOWLEDGE_CANDIDATE_LIMIT", 8))
+# false: không lọc cứng theo tuổi, để đặc trưng "age" của reranker quyết định.
+KNOWLEDGE_STRICT_AGE_FILTER = get_env("KNOWLEDGE_STRICT_AGE_FILTER", "true").lower() == "true"
 
 
 # helper to extract age in days from query
@@ -9,36 +23,109 @@ def extract_age_days(query: str) -> int | None:
     return int(match.group(1)) if match else None
 
 
-def search_knowledge_base(query: str, farm_id: str) -> dict | None:
-    print(query)
-    client = get_weaviate_client()
-    if client is None:
-        print("Weaviate client is not available. Skipping knowledge base search.")
-        return None
+def _fallback_keys(query: str, farm_id: str, age_days: int | None) -> list[str]:
+    keys = [f"{farm_id}:q:{' '.join(query.lower().split())}"]
+    if age_days is not None:
+        keys.append(f"{farm_id}:age:{age_days}")
+    return keys
 
-    try:
-        knowledge_collection = client.collections.get("FarmingKnowledge")
-        age_days = extract_age_days(query)
 
-        filters = Filter.by_property("facilityID").equal(farm_id)
+def _cached_knowledge(query: str, farm_id: str, age_days: int | None) -> dict | None:
+    cache = get_cache("knowledge_fallback")
+    for key in _fallback_keys(query, farm_id, age_days):
+        cached = cache.get(key)
+        if cached is not None:
+            increment("knowledge.fallback_hits")
+            print(f"Using cached knowledge for farm {farm_id} (degraded mode).")
+            return cached
+    increment("knowledge.fallback_misses")
+    return None
+
+
+def _query_knowledge(client, query: str, farm_id: str, age_days: int | None, vector: list[float] | None = None):
+    from weaviate.classes.query import Filter, MetadataQuery
+
+    # multi-tenant: truy vấn chỉ chạm index của facility, không cần lọc facilityID
+    knowledge_collection = tenant_collection(client, "FarmingKnowledge", farm_id)
+
+    filters = facility_filter(farm_id)
+
+    if age_days is not None and KNOWLEDGE_STRICT_AGE_FILTER:
+        filters = combine_filters(
+            filters,
+            Filter.by_property("min_age_days").less_or_equal(age_days),
+            Filter.by_property("max_age_days").greater_or_equal(age_days),
+        )
 
-        if age_days is not None:
-            filters = filters & Filter.by_property("min_age_days").less_or_equal(age_days)
-            filters = filters & Filter.by_property("max_age_days").greater_or_equal(age_days)
+    metadata = MetadataQuery(distance=True, creation_time=True)
+    try:
+        if vector is not None:
+            return knowledge_collection.query.near_vector(
+                near_vector=vector,
+                filters=filters,
+                limit=KNOWLEDGE_CANDIDATE_LIMIT,
+                return_metadata=metadata,
+            )
 
-        result_farm = knowledge_collection.query.near_text(
+        return knowledge_collection.query.near_text(
             query=query,
             filters=filters,
-            limit=1
+            limit=KNOWLEDGE_CANDIDATE_LIMIT,
+            return_metadata=metadata,
         )
+    except Exception as e:
+        # facility chưa có tenant = chưa có tri thức, không phải lỗi của Weaviate
+        if is_missing_tenant_error(e):
+            return None
+        raise
+
+
+def _to_candidate(obj) -> dict:
+    metadata = getattr(obj, "metadata", None)
+    created = getattr(metadata, "creation_time", None)
+    return {
+        "properties": dict(obj.properties),
+        "distance": getattr(metadata, "distance", None),
+        "created_at": created.timestamp() if created is not None else None,
+    }
+
+
+def search_knowledge_base(query: str, farm_id: str) -> dict | None:
+    print(query)
+    age_days = extract_age_days(query)
+
+    client = get_weaviate_client()
+    if client is None:
+        print("Weaviate client is not available. Skipping knowledge base search.")
+        return _cached_knowledge(query, farm_id, age_days)
+    if not dependency_available("weaviate"):
+        print("Weaviate is known to be down. Skipping knowledge base search.")
+        return _cached_knowledge(query, farm_id, age_days)
+
+    try:
+        # vector hoá trước khi vào breaker: lần đầu nạp model (hoặc t2v chậm) không bị tính là lỗi của Weaviate
+        embedder = get_embedding_service()
+        vector = embedder.embed_text(query) if embedder is not None else None
+        result_farm = get_breaker("weaviate").call(_query_knowledge, client, query, farm_id, age_days, vector)
 
-        if result_farm.objects:
+        if result_farm is not None and result_farm.objects:
             print(f"Found specific knowledge for farm: {farm_id}")
             print(len(result_farm.objects))
-            print(result_farm.objects[0].properties)
-            return result_farm.objects[0].properties
+            candidates = knowledge_reranker.rerank(
+                query, [_to_candidate(obj) for obj in result_farm.objects], facility_id=farm_id, age_days=age_days
+            )
+            properties = candidates[0]["properties"]
+            print(properties)
+            cache = get_cache("knowledge_fallback")
+            for key in _fallback_keys(query, farm_id, age_days):
+                cache.set(key, properties, ttl=KNOWLEDGE_FALLBACK_TTL_SECONDS)
+            return properties
 
+    except CircuitOpenError:
+        print("Weaviate circuit is open. Skipping knowledge base search.")
+        return _cached_knowledge(query, farm_id, age_days)
     except Exception as e:
         print(f"Error searching farm-specific knowledge: {e}")
+        return _cached_knowledge(query, farm_id, age_days)
 
     return None
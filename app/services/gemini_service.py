@@ -1,25 +1,60 @@
-import os
-import google.generativeai as genai
 import json
 import traceback
-from dotenv import load_dotenv
-from typing import List, Optional
-
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, List, Optional
+
+from app.configurations.settings import get_env
+from app.models.asset_timeline import AssetTimeline, parse_datetime
+from app.models.asset_trace import AssetTrace, parse_asset_trace
+from app.services.analytics_service import analytics_service
+from app.services.batch_snapshot_service import batch_snapshots
 from app.services.farm_weaviate_service import search_knowledge_base
 from app.services.get_asset_http_service import get_asset_trace
-
-load_dotenv()
+from app.services.health_service import dependency_available
+from app.services.prompt_budget import PROMPT_INTENT_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET, log_prompt_usage, plan_prompt
+from app.utils.cache_backend import LocalLRUCache
+from app.utils.circuit_breaker import CircuitOpenError, get_breaker
+from app.utils.metrics import increment
+
+DEFAULT_CONVERSATION_TITLE = "Cuộc trò chuyện mới"
+
+# Các câu trả lời mẫu/fallback của bot. Được gom lại đây để memory policy nhận diện và không lưu chúng làm memory.
+GENERATE_ANSWER_FALLBACK = "Xin lỗi, hiện tại không thể tạo câu trả lời tự động. Vui lòng thử lại sau."
+GENERAL_CHAT_FALLBACK = "Xin lỗi, tôi chưa được huấn luyện để trả lời câu hỏi này. Bạn có thể hỏi về thông tin đàn, thức ăn hoặc thuốc men nhé."
+ASK_FEED_BATCH_ID_MESSAGE = "Bạn muốn hỏi về đàn nào ạ? Vui lòng cung cấp mã đàn (ví dụ: ASSET_HEO_001)."
+ASK_MEDICATION_BATCH_ID_MESSAGE = "Bạn muốn hỏi về lịch tiêm của đàn nào ạ? Vui lòng cung cấp mã đàn."
+FEED_KNOWLEDGE_NOT_FOUND_MESSAGE = "Xin lỗi, tôi chưa tìm thấy hướng dẫn dinh dưỡng phù hợp trong cơ sở tri thức."
+MEDICATION_KNOWLEDGE_NOT_FOUND_MESSAGE = "Xin lỗi, tôi chưa tìm thấy hướng dẫn về thuốc/vắc-xin phù hợp trong cơ sở tri thức."
+TRACE_UNAVAILABLE_MESSAGE = "Hệ thống truy xuất đang tạm thời không khả dụng, chưa thể lấy thông tin cho đàn {asset_id}."
+FEEDS_NOT_FOUND_MESSAGE = "Không tìm thấy thông tin nuôi/feeds cho đàn {asset_id}."
+FEED_INFO_NOT_FOUND_MESSAGE = "Không tìm thấy thông tin thức ăn cho đàn {asset_id}."
+MEDICATION_INFO_NOT_FOUND_MESSAGE = "Không tìm thấy thông tin thuốc/vắc-xin cho đàn {asset_id}."
+ASK_HISTORY_BATCH_ID_MESSAGE = "Bạn muốn xem lịch sử của đàn nào ạ? Vui lòng cung cấp mã đàn."
+HISTORY_RANGE_NOT_FOUND_MESSAGE = "Không có sự kiện thức ăn/thuốc nào của đàn {asset_id} trong khoảng thời gian này."
+HISTORY_DAY_UNRESOLVED_MESSAGE = ("Không xác định được ngày {day} của đàn {asset_id} vì dữ liệu truy xuất chưa có ngày "
+                                  "bắt đầu nuôi. Bạn có thể hỏi theo ngày cụ thể (ví dụ: từ 2025-03-01 đến 2025-03-31).")
+ANALYTICS_UNAVAILABLE_MESSAGE = "Hiện chưa thể tổng hợp số liệu của trang trại. Vui lòng thử lại sau."
+
+# Mẫu có placeholder ({asset_id}, {day}) được so khớp như regex bởi memory policy.
+BOILERPLATE_MESSAGES = (
+    GENERATE_ANSWER_FALLBACK,
+    GENERAL_CHAT_FALLBACK,
+    ASK_FEED_BATCH_ID_MESSAGE,
+    ASK_MEDICATION_BATCH_ID_MESSAGE,
+    FEED_KNOWLEDGE_NOT_FOUND_MESSAGE,
+    MEDICATION_KNOWLEDGE_NOT_FOUND_MESSAGE,
+    TRACE_UNAVAILABLE_MESSAGE,
+    FEEDS_NOT_FOUND_MESSAGE,
+    FEED_INFO_NOT_FOUND_MESSAGE,
+    MEDICATION_INFO_NOT_FOUND_MESSAGE,
+    ASK_HISTORY_BATCH_ID_MESSAGE,
+    HISTORY_RANGE_NOT_FOUND_MESSAGE,
+    HISTORY_DAY_UNRESOLVED_MESSAGE,
+    ANALYTICS_UNAVAILABLE_MESSAGE,
+)
 
 # Read API key but don't raise on import; allow lazy initialization
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print(f"Successfully loaded GEMINI_API_KEY starting with: {GEMINI_API_KEY[:4]}...")
-    except Exception:
-        print("Warning: failed to configure genai with provided GEMINI_API_KEY")
-else:
-    print("Warning: GEMINI_API_KEY not found in environment; Gemini calls will be disabled until key is provided.")
+GEMINI_API_KEY = get_env("GEMINI_API_KEY")
 
 # Lazy model holder
 _MODEL = None
@@ -29,8 +64,13 @@ def get_model():
     if _MODEL is not None:
         return _MODEL
     if not GEMINI_API_KEY:
+        print("Warning: GEMINI_API_KEY not found in environment; Gemini calls are disabled.")
         return None
     try:
+        # import lười: google.generativeai nặng, chỉ nạp và configure ở lần gọi model đầu tiên
+        import google.generativeai as genai
+
+        genai.configure(api_key=GEMINI_API_KEY)
         _MODEL = genai.GenerativeModel('gemini-2.5-flash')
         print("Gemini model initialized lazily.")
         return _MODEL
@@ -39,24 +79,7 @@ def get_model():
         return None
 
 
-def detect_intent(user_question: str, memories: Optional[List[str]] = None) -> dict:
-    """
-    Phân tích ý định từ `user_question` và trả về JSON với key "intent" và "entities".
-    Nếu `memories` được cung cấp, chèn chúng vào prompt như một khối tham khảo mà không thay đ��i định dạng
-    hoặc mục đích của prompt (vẫn yêu cầu trả về JSON với key "intent").
-    """
-
-    # Build memories block (kept concise so model vẫn trả JSON giữ nguyên format)
-    memories_block = ""
-    if memories:
-        try:
-            mb_lines = [f"- {m}" for m in memories if m]
-            if mb_lines:
-                memories_block = "Các đoạn ghi nhớ liên quan (memories):\n" + "\n".join(mb_lines) + "\n\n"
-        except Exception:
-            memories_block = ""
-
-    prompt = f"""
+_INTENT_GUIDE = """
     Bạn là một trợ lý AI chuyên phân tích ý định của người dùng cho một chatbot quản lý trang trại chăn nuôi.
     Nhiệm vụ của bạn là đọc câu hỏi của người dùng và phân loại nó vào một trong các ý định (intent) sau đây,
     đồng thời trích xuất các thông tin quan trọng (entities) như mã đàn (batch_id), (species) là loại vật nuôi 
@@ -67,20 +90,46 @@ def detect_intent(user_question: str, memories: Optional[List[str]] = None) -> d
     - get_medication_info: Hỏi về thông tin thuốc men, lịch tiêm của một đàn cụ thể. (Ví dụ: "Đàn H001 đã tiêm vắc-xin gì?", "Lịch tiêm phòng của đàn G003?")
     - suggest_feed: Cần gợi ý, tư vấn loại thức ăn phù hợp với độ tuổi hoặc giai đoạn. (Ví dụ: "Heo 35 ngày tuổi nên ăn gì?", "Gà con mới nở cho ăn cám nào?")
     - suggest_medication: Cần gợi ý, tư vấn về thuốc hoặc lịch tiêm phòng. (Ví dụ: "Heo con mới nhập chuồng cần tiêm gì?", "Bò bị ho nên dùng thuốc nào?")
+    - get_history_range: Hỏi về lịch sử thức ăn hoặc thuốc/tiêm phòng của một đàn cụ thể trong một khoảng thời gian. (Ví dụ: "Đàn H001 ăn gì từ ngày 30 đến ngày 60?", "Các lần tiêm của đàn B012 trong tháng qua?")
+    - facility_summary: Hỏi thống kê trên toàn bộ các đàn của trang trại, không phải một đàn cụ thể. (Ví dụ: "Bao nhiêu đàn đang ăn Cám CP 201?", "Những đàn nào đến hạn tiêm trong tuần này?", "Tổng quan trang trại")
     - unknown: Các câu hỏi không liên quan, câu chào hỏi, hoặc không xác định được. (Ví dụ: "Chào bạn", "Thời tiết hôm nay thế nào?", "Cho xem hình ảnh")
 
     Yêu cầu đầu ra:
     - Trả về kết quả dưới dạng một chuỗi JSON hợp lệ.
     - JSON object phải có key "intent".
     - Nếu câu hỏi chứa mã đàn (ví dụ: H001, B012), hãy trích xuất nó vào key "entities" với key con là "batch_id". Nếu không có, entities là một object rỗng.
+    - Với get_history_range, thêm vào "entities" nếu có: "topic" ("feed", "medication" hoặc "all"); khoảng thời gian dạng
+      "from_day"/"to_day" (ngày thứ mấy của đàn), "from_date"/"to_date" (YYYY-MM-DD) hoặc "last_days" (số ngày gần nhất).
+    - Với facility_summary, thêm vào "entities" nếu có: "topic" ("feed_usage", "medications_due" hoặc "overview"),
+      "feed_name" (tên thức ăn được hỏi) và "days" (số ngày tới khi hỏi lịch tiêm đến hạn).
+
+"""
+
 
+def detect_intent(user_question: str, memories: Optional[List[str]] = None) -> dict:
     """
+    Phân tích ý định từ `user_question` và trả về JSON với key "intent" và "entities".
+    Nếu `memories` được cung cấp, chèn chúng vào prompt như một khối tham khảo mà không thay đ��i định dạng
+    hoặc mục đích của prompt (vẫn yêu cầu trả về JSON với key "intent").
+    """
+
+    question_block = f"\nDưới đây là câu hỏi của người dùng:\n\"{user_question}\"\n\nHãy phân tích và trả về kết quả dưới dạng JSON."
+    # memories chỉ lấy phần vừa ngân sách token (memory ít liên quan bị bỏ trước)
+    plan = plan_prompt(_INTENT_GUIDE + question_block, user_question, memories, budget=PROMPT_INTENT_TOKEN_BUDGET)
+
+    # Build memories block (kept concise so model vẫn trả JSON giữ nguyên format)
+    memories_block = ""
+    mb_lines = [f"- {m}" for m in plan.memories]
+    if mb_lines:
+        memories_block = "Các đoạn ghi nhớ liên quan (memories):\n" + "\n".join(mb_lines) + "\n\n"
+
+    prompt = _INTENT_GUIDE
 
     # Insert memories before the user question (do not change expected JSON output format)
     if memories_block:
         prompt = prompt + "\n" + memories_block
 
-    prompt = prompt + f"\nDưới đây là câu hỏi của người dùng:\n\"{user_question}\"\n\nHãy phân tích và trả về kết quả dưới dạng JSON."
+    prompt = prompt + question_block
 
     raw_text = None
     try:
@@ -88,8 +137,9 @@ def detect_intent(user_question: str, memories: Optional[List[str]] = None) -> d
         if model_obj is None:
             print("Gemini model not available; returning unknown intent.")
             return {"intent": "unknown", "entities": {}, "error": "Gemini model not initialized"}
+        log_prompt_usage("intent", prompt, plan, model_obj.count_tokens)
 
-        response = model_obj.generate_content(prompt)
+        response = get_breaker("gemini").call(model_obj.generate_content, prompt)
 
         raw_text = getattr(response, 'text', None) or str(response)
         print("==== GEMINI RAW RESPONSE ====")
@@ -101,6 +151,9 @@ def detect_intent(user_question: str, memories: Optional[List[str]] = None) -> d
         result = json.loads(cleaned_response_text)
         return result
 
+    except (CircuitOpenError, TimeoutError) as e:
+        print(f"Gemini unavailable in detect_intent: {e}")
+        return {"intent": "unknown", "entities": {}, "error": str(e)}
     except json.JSONDecodeError as e:
         print(f"JSON Decode Error: {e}")
         print(f"Model response was: {raw_text if raw_text is not None else '<<no response>>'}")
@@ -111,6 +164,78 @@ def detect_intent(user_question: str, memories: Optional[List[str]] = None) -> d
         return {"intent": "unknown", "entities": {}, "error": str(e)}
 
 
+# Giới hạn số câu hỏi trong một prompt phân loại gộp; batch lớn hơn được chia thành nhiều lượt gọi.
+INTENT_BATCH_MAX_QUESTIONS = int(get_env("INTENT_BATCH_MAX_QUESTIONS", 25))
+
+
+def detect_intents_batch(user_questions: List[str], memories: Optional[List[str]] = None) -> List[dict]:
+    """
+    Phân loại intent cho nhiều câu hỏi bằng một lượt gọi Gemini cho mỗi nhóm INTENT_BATCH_MAX_QUESTIONS câu.
+    Trả về list cùng thứ tự với `user_questions`; câu nào model không trả về hoặc lỗi thì là intent unknown.
+    """
+    results: List[dict] = []
+    for start in range(0, len(user_questions), INTENT_BATCH_MAX_QUESTIONS):
+        results.extend(_detect_intents_chunk(user_questions[start:start + INTENT_BATCH_MAX_QUESTIONS], memories))
+    return results
+
+
+def _detect_intents_chunk(user_questions: List[str], memories: Optional[List[str]]) -> List[dict]:
+    unknown = [{"intent": "unknown", "entities": {}} for _ in user_questions]
+    if not user_questions:
+        return unknown
+
+    numbered = "\n".join(f"{i}. \"{q}\"" for i, q in enumerate(user_questions))
+    questions_block = (
+        f"\nDưới đây là {len(user_questions)} câu hỏi của người dùng, mỗi câu có số thứ tự:\n{numbered}\n\n"
+        "Hãy phân tích từng câu và trả về một JSON array, mỗi phần tử là object có key \"index\" (số thứ tự câu hỏi), "
+        "\"intent\" và \"entities\" như mô tả ở trên."
+    )
+    plan = plan_prompt(_INTENT_GUIDE + questions_block, " ".join(user_questions), memories,
+                       budget=PROMPT_INTENT_TOKEN_BUDGET)
+
+    prompt = _INTENT_GUIDE
+    mb_lines = [f"- {m}" for m in plan.memories]
+    if mb_lines:
+        prompt += "\nCác đoạn ghi nhớ liên quan (memories):\n" + "\n".join(mb_lines) + "\n\n"
+    prompt += questions_block
+
+    raw_text = None
+    try:
+        model_obj = get_model()
+        if model_obj is None:
+            print("Gemini model not available; returning unknown intents.")
+            return unknown
+        log_prompt_usage("intent_batch", prompt, plan, model_obj.count_tokens)
+
+        response = get_breaker("gemini").call(model_obj.generate_content, prompt)
+        raw_text = getattr(response, 'text', None) or str(response)
+        cleaned_response_text = raw_text.strip().replace("```json", "").replace("```", "").strip()
+        parsed = json.loads(cleaned_response_text)
+        if not isinstance(parsed, list):
+            raise ValueError("expected a JSON array")
+
+        for position, item in enumerate(parsed):
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index", position)
+            if isinstance(index, int) and 0 <= index < len(user_questions):
+                unknown[index] = {"intent": item.get("intent", "unknown"), "entities": item.get("entities") or {}}
+        return unknown
+
+    except (CircuitOpenError, TimeoutError) as e:
+        print(f"Gemini unavailable in detect_intents_batch: {e}")
+        return unknown
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"Invalid batch intent response: {e}")
+        print(f"Model response was: {raw_text if raw_text is not None else '<<no response>>'}")
+        return unknown
+    except Exception as e:
+        print(f"An error occurred in detect_intents_batch: {e}")
+        traceback.print_exc()
+        return unknown
+
+
+
 def generate_answer(user_question: str, memories: Optional[List[str]] = None, assistant_context: Optional[str] = None) -> str:
     """Generate a helpful conversational answer using Gemini, incorporating conversation memories if provided.
 
@@ -118,38 +243,31 @@ def generate_answer(user_question: str, memories: Optional[List[str]] = None, as
     the intent-detection prompt format used elsewhere; it's intended to produce a natural-language reply.
     """
 
+    system_block = (
+        "Bạn là một trợ lý AI cho hệ thống quản lý trang trại chăn nuôi. Hãy trả lời câu hỏi của người dùng một cách rõ ràng, ngắn gọn "
+        "và dựa trên dữ liệu có sẵn. Nếu không có dữ liệu tồn tại thì không suy đoán mà hãy nói rõ rằng bạn không có thông tin đó. VD: "
+        "'Tôi xin lỗi', 'tôi không có thông tin về điều đó tại thời điểm này.'"
+    )
+    question_block = f"Người dùng hỏi: \"{user_question}\"\nHãy trả lời bằng tiếng Việt, trực tiếp, cụ thể và nếu cần đề xuất bước tiếp theo."
+
+    # Chia ngân sách token: dữ liệu hệ thống (tool) và memories chỉ lấy phần vừa, memory ít giá trị bị bỏ/rút gọn trước
+    ctx = str(assistant_context).strip() if assistant_context else ""
+    plan = plan_prompt(system_block + "\n\n" + question_block, user_question, memories, tool_data=ctx or None,
+                       budget=PROMPT_TOKEN_BUDGET)
+
     # Build memories block (short, readable list)
     memories_block = ""
-    if memories:
-        try:
-            # truncate each memory to a safe length to avoid overly long prompts
-            MAX_MEM_CHARS = 800
-            mb_lines = []
-            for m in memories:
-                if not m:
-                    continue
-                text = str(m)
-                if len(text) > MAX_MEM_CHARS:
-                    text = text[:MAX_MEM_CHARS].rstrip() + "..."
-                mb_lines.append(f"- {text}")
-            if mb_lines:
-                memories_block = "Các đoạn ghi nhớ liên quan (memories):\n" + "\n".join(mb_lines)
-        except Exception:
-            memories_block = ""
+    mb_lines = [f"- {m}" for m in plan.memories]
+    if mb_lines:
+        memories_block = "Các đoạn ghi nhớ liên quan (memories):\n" + "\n".join(mb_lines)
 
     # Optionally include previous assistant context
     context_block = ""
-    if assistant_context:
-        ctx = str(assistant_context).strip()
-        if ctx:
-            context_block = f"Gợi ý trước đó từ hệ thống: {ctx}"
+    if plan.tool_data:
+        context_block = f"Gợi ý trước đó từ hệ thống: {plan.tool_data}"
 
     # Compose final prompt for a conversational answer
-    prompt_parts = [
-        "Bạn là một trợ lý AI cho hệ thống quản lý trang trại chăn nuôi. Hãy trả lời câu hỏi của người dùng một cách rõ ràng, ngắn gọn "
-        "và dựa trên dữ liệu có sẵn. Nếu không có dữ liệu tồn tại thì không suy đoán mà hãy nói rõ rằng bạn không có thông tin đó. VD: "
-        "'Tôi xin lỗi', 'tôi không có thông tin về điều đó tại thời điểm này.'"
-    ]
+    prompt_parts = [system_block]
 
     if memories_block:
         prompt_parts.append(memories_block)
@@ -157,7 +275,7 @@ def generate_answer(user_question: str, memories: Optional[List[str]] = None, as
     if context_block:
         prompt_parts.append(context_block)
 
-    prompt_parts.append(f"Người dùng hỏi: \"{user_question}\"\nHãy trả lời bằng tiếng Việt, trực tiếp, cụ thể và nếu cần đề xuất bước tiếp theo.")
+    prompt_parts.append(question_block)
 
     final_prompt = "\n\n".join(prompt_parts)
 
@@ -166,17 +284,33 @@ def generate_answer(user_question: str, memories: Optional[List[str]] = None, as
         model_obj = get_model()
         if model_obj is None:
             print("Gemini model not available; cannot generate answer.")
-            return "Xin lỗi, hiện tại không thể tạo câu trả lời tự động. Vui lòng thử lại sau."
+            return GENERATE_ANSWER_FALLBACK
+        log_prompt_usage("answer", final_prompt, plan, model_obj.count_tokens)
 
-        response = model_obj.generate_content(final_prompt)
+        response = get_breaker("gemini").call(model_obj.generate_content, final_prompt)
         raw_text = getattr(response, 'text', None) or str(response)
         # Clean code fences and return text
         cleaned = raw_text.strip().replace("```", "").strip()
         return cleaned
+    except (CircuitOpenError, TimeoutError) as e:
+        print(f"Gemini unavailable in generate_answer: {e}")
+        return GENERATE_ANSWER_FALLBACK
     except Exception as e:
         print(f"Error generating answer from Gemini: {e}")
         traceback.print_exc()
-        return "Xin lỗi, hiện tại không thể tạo câu trả lời tự động. Vui lòng thử lại sau."
+        return GENERATE_ANSWER_FALLBACK
+
+def make_placeholder_title(user_question: str, max_words: int = 6, max_chars: int = 60) -> str:
+    """Tiêu đề tạm, cắt cục bộ từ câu hỏi (không gọi Gemini) để dùng ngay khi tạo conversation."""
+    words = (user_question or "").split()
+    if not words:
+        return DEFAULT_CONVERSATION_TITLE
+    full = " ".join(words)
+    title = " ".join(words[:max_words])[:max_chars].rstrip()
+    if title != full:
+        title = title.rstrip(" ,.;:?!") + "..."
+    return title
+
 
 def generate_short_conversation_title(user_question: str) -> str:
     """Generate a short conversation title based on the user's initial question."""
@@ -198,9 +332,9 @@ def generate_short_conversation_title(user_question: str) -> str:
         model_obj = get_model()
         if model_obj is None:
             print("Gemini model not available; cannot generate title.")
-            return "Cuộc trò chuyện mới"
+            return DEFAULT_CONVERSATION_TITLE
 
-        response = model_obj.generate_content(prompt)
+        response = get_breaker("gemini").call(model_obj.generate_content, prompt)
         raw_text = getattr(response, 'text', None) or str(response)
         cleaned = raw_text.strip().replace("```", "").strip()
 
@@ -210,117 +344,241 @@ def generate_short_conversation_title(user_question: str) -> str:
             cleaned = " ".join(words[:6])
 
         return cleaned
+    except (CircuitOpenError, TimeoutError) as e:
+        print(f"Gemini unavailable in generate_short_conversation_title: {e}")
+        return DEFAULT_CONVERSATION_TITLE
     except Exception as e:
         print(f"Error generating conversation title from Gemini: {e}")
         traceback.print_exc()
-        return "Cuộc trò chuyện mới"
+        return DEFAULT_CONVERSATION_TITLE
+
+# Trace đã parse được giữ ngắn hạn trong process (cùng payload gốc) để câu hỏi lặp lại về cùng đàn
+# không phải gọi lại trace API và duyệt lại JSON; 0 = tắt.
+ASSET_TRACE_CACHE_TTL_SECONDS = float(get_env("ASSET_TRACE_CACHE_TTL_SECONDS", 60))
+_parsed_traces = LocalLRUCache(max_items=int(get_env("ASSET_TRACE_CACHE_MAX_ITEMS", 1000)))
+
+
+def _fetch_trace_entry(asset_id: str) -> dict:
+    cached = _parsed_traces.get(asset_id) if ASSET_TRACE_CACHE_TTL_SECONDS > 0 else None
+    if cached is not None:
+        increment("asset_trace.cache_hits")
+        return cached
 
-def handle_get_feed_info(entities: dict) -> str:
+    payload = get_breaker("trace_api").call(get_asset_trace, asset_id)
+    entry = {"payload": payload, "parsed": parse_asset_trace(payload, asset_id)}
+    if ASSET_TRACE_CACHE_TTL_SECONDS > 0:
+        _parsed_traces.set(asset_id, entry, ttl=ASSET_TRACE_CACHE_TTL_SECONDS)
+    return entry
+
+
+def _fetch_trace(asset_id: str) -> AssetTrace:
+    return _fetch_trace_entry(asset_id)["parsed"]
+
+
+def _fetch_timeline(asset_id: str) -> AssetTimeline:
+    """Timeline dựng lười từ payload đã cache, dùng lại cho các câu hỏi lịch sử sau đó."""
+    entry = _fetch_trace_entry(asset_id)
+    timeline = entry.get("timeline")
+    if timeline is None:
+        timeline = entry["timeline"] = AssetTimeline.from_payload(entry["payload"], asset_id)
+    return timeline
+
+
+def _from_trace_api(asset_id: str, loader: Callable[[str], Any]) -> tuple[Optional[Any], Optional[str]]:
+    """Gọi `loader` qua trace API; trả về (kết quả, None) hoặc (None, câu trả lời báo lỗi)."""
+    if not dependency_available("trace_api"):
+        return None, TRACE_UNAVAILABLE_MESSAGE.format(asset_id=asset_id)
+
+    try:
+        return loader(asset_id), None
+    except (CircuitOpenError, TimeoutError):
+        return None, TRACE_UNAVAILABLE_MESSAGE.format(asset_id=asset_id)
+    except Exception as e:
+        print(f"Error fetching asset trace for {asset_id}: {e}")
+        return None, f"Không thể lấy thông tin cho đàn {asset_id}: {str(e)}"
+
+
+def _load_asset(asset_id: str, facility_id: Optional[str]) -> tuple[Optional[AssetTrace], Optional[str]]:
+    """
+    Lấy dữ liệu đàn đã chuẩn hoá: ưu tiên snapshot trong bộ nhớ của facility (đủ tươi), không có thì
+    gọi trace API. Trả về (trace, None) hoặc (None, câu trả lời báo lỗi).
+    """
+    snapshot = batch_snapshots.get(asset_id, facility_id) if facility_id else None
+    if snapshot is not None:
+        return parse_asset_trace(snapshot.as_trace(), asset_id), None
+    return _from_trace_api(asset_id, _fetch_trace)
+
+
+TRACE_SOURCE_SNAPSHOT = "snapshot"
+TRACE_SOURCE_API = "trace_api"
+
+
+def prefetch_asset(asset_id: str, facility_id: Optional[str]) -> Optional[str]:
+    """
+    Nạp trước dữ liệu đàn cho handler sắp chạy như _load_asset (snapshot của facility, không có thì trace vào cache
+    ở trên). Trả về nguồn đã dùng (TRACE_SOURCE_SNAPSHOT / TRACE_SOURCE_API), None nếu không lấy được.
+    Chỉ TRACE_SOURCE_API làm đầy cache mà handle_get_history_range đọc; cần ASSET_TRACE_CACHE_TTL_SECONDS > 0.
+    """
+    if facility_id and batch_snapshots.get(asset_id, facility_id) is not None:
+        return TRACE_SOURCE_SNAPSHOT
+    trace, _ = _from_trace_api(asset_id, _fetch_trace)
+    return TRACE_SOURCE_API if trace is not None else None
+
+
+def handle_get_feed_info(entities: dict, facility_id: Optional[str] = None) -> str:
     """
     Xử lý intent lấy thông tin thức ăn của đàn.
     """
     asset_id = entities.get("batch_id")
     if not asset_id:
-        return "Bạn muốn hỏi về đàn nào ạ? Vui lòng cung cấp mã đàn (ví dụ: ASSET_HEO_001)."
+        return ASK_FEED_BATCH_ID_MESSAGE
 
-    try:
-        asset = get_asset_trace(asset_id)
-    except Exception as e:
-        print(f"Error fetching asset trace for {asset_id}: {e}")
-        return f"Không thể lấy thông tin cho đàn {asset_id}: {str(e)}"
-
-    full_history = asset.get("fullHistory", []) or asset.get("history", [])
-    latest_details = {}
-    if full_history:
-        latest = full_history[-1]
-        latest_details = latest.get("details", {}) if isinstance(latest, dict) else {}
-
-    if not latest_details:
-        return f"Không tìm thấy thông tin nuôi/feeds cho đàn {asset_id}."
-
-    feeds = latest_details.get("feeds") or latest_details.get("feed") or []
-    if isinstance(feeds, list) and feeds:
-        if all(isinstance(f, dict) for f in feeds):
-            parts = []
-            for f in feeds:
-                name = f.get("name") or f.get("feedName") or "(không tên)"
-                dosage = f.get("dosageKg")
-                start = f.get("startDate")
-                end = f.get("endDate")
-                note = f.get("notes")
-                seg = f"{name}"
-                if dosage is not None:
-                    seg += f" — liều {dosage} kg/con/ngày"
-                if start or end:
-                    seg += f" (từ {start or '??'} đến {end or '??'})"
-                if note:
-                    seg += f"; Ghi chú: {note}"
-                parts.append(seg)
-            return f"Đàn {asset_id} hiện dùng các loại thức ăn: " + ", ".join(parts)
-        else:
-            return f"Đàn {asset_id} hiện dùng các loại thức ăn: " + ", ".join(str(x) for x in feeds)
-    else:
-        feed_simple = latest_details.get("feed") or asset.get("feed") or asset.get("feeds")
-        if feed_simple:
-            return f"Đàn {asset_id} hiện dùng các loại thức ăn: " + ", ".join(str(x) for x in feed_simple)
-        else:
-            return f"Không tìm thấy thông tin thức ăn cho đàn {asset_id}."
+    trace, error_message = _load_asset(asset_id, facility_id)
+    if trace is None:
+        return error_message
 
-def handle_get_medication_info(entities: dict) -> str:
+    if not trace.has_latest_details:
+        return FEEDS_NOT_FOUND_MESSAGE.format(asset_id=asset_id)
+    if trace.feed_summary:
+        return f"Đàn {asset_id} hiện dùng các loại thức ăn: " + trace.feed_summary
+    return FEED_INFO_NOT_FOUND_MESSAGE.format(asset_id=asset_id)
+
+def handle_get_medication_info(entities: dict, facility_id: Optional[str] = None) -> str:
     """
     Xử lý intent lấy thông tin thuốc/vắc-xin của đàn.
     """
     asset_id = entities.get("batch_id")
     if not asset_id:
-        return "Bạn muốn hỏi về lịch tiêm của đàn nào ạ? Vui lòng cung cấp mã đàn."
+        return ASK_MEDICATION_BATCH_ID_MESSAGE
+
+    trace, error_message = _load_asset(asset_id, facility_id)
+    if trace is None:
+        return error_message
+
+    if trace.medication_summary:
+        return f"Thông tin thuốc/vắc-xin cho đàn {asset_id}: " + trace.medication_summary
+    return MEDICATION_INFO_NOT_FOUND_MESSAGE.format(asset_id=asset_id)
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _UnresolvedDay(ValueError):
+    """from_day/to_day được hỏi nhưng timeline không có ngày bắt đầu để quy đổi."""
+
+    def __init__(self, day: float):
+        super().__init__(f"cannot resolve day {day:g}")
+        self.day = day
+
+
+def _history_range(timeline: AssetTimeline, entities: dict,
+                   now: Optional[datetime] = None) -> tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Khoảng thời gian từ entities: last_days, from_day/to_day (tính từ ngày đầu của đàn) hoặc from_date/to_date.
+    Raise _UnresolvedDay khi hỏi theo ngày tuổi mà timeline không có `origin`.
+    """
+    last_days = _to_float(entities.get("last_days"))
+    if last_days is not None:
+        now = now or datetime.now(UTC)
+        return now - timedelta(days=last_days), now
+
+    from_day, to_day = _to_float(entities.get("from_day")), _to_float(entities.get("to_day"))
+    if from_day is not None or to_day is not None:
+        if timeline.origin is None:
+            raise _UnresolvedDay(from_day if from_day is not None else to_day)
+        start = timeline.day(from_day) if from_day is not None else None
+        # "đến ngày 60" tính trọn ngày 60
+        end = timeline.day(to_day + 1) - timedelta(microseconds=1) if to_day is not None else None
+        return start, end
+
+    start = parse_datetime(entities.get("from_date"))
+    end = parse_datetime(entities.get("to_date"))
+    if end is not None and end.hour == end.minute == end.second == 0:
+        end = end + timedelta(days=1) - timedelta(microseconds=1)
+    return start, end
+
+
+def handle_get_history_range(entities: dict, now: Optional[datetime] = None) -> str:
+    """
+    Xử lý intent hỏi lịch sử thức ăn/thuốc của đàn trong một khoảng thời gian (timeline dựng từ toàn bộ history).
+    """
+    asset_id = entities.get("batch_id")
+    if not asset_id:
+        return ASK_HISTORY_BATCH_ID_MESSAGE
+
+    timeline, error_message = _from_trace_api(asset_id, _fetch_timeline)
+    if timeline is None:
+        return error_message
 
     try:
-        asset = get_asset_trace(asset_id)
+        start, end = _history_range(timeline, entities, now)
+    except _UnresolvedDay as e:
+        # không quy đổi được thì báo rõ, không trả toàn bộ lịch sử như thể "từ đầu đến nay"
+        return HISTORY_DAY_UNRESOLVED_MESSAGE.format(day=f"{e.day:g}", asset_id=asset_id)
+    topic = (entities.get("topic") or "all").lower()
+
+    lines = []
+    if topic in ("feed", "all"):
+        for period in timeline.feeds_between(start, end):
+            lines.append(f"- Thức ăn từ {period.start.date()} đến {period.end.date()}: {period.feed.describe()}")
+    if topic in ("medication", "all"):
+        for event in timeline.medications_between(start, end):
+            lines.append(f"- Thuốc/vắc-xin ngày {event.at.date()}: {event.medication.describe()}")
+
+    if not lines:
+        return HISTORY_RANGE_NOT_FOUND_MESSAGE.format(asset_id=asset_id)
+    range_label = f" từ {start.date() if start else 'đầu'} đến {end.date() if end else 'nay'}"
+    return f"Lịch sử của đàn {asset_id}{range_label}:\n" + "\n".join(lines)
+
+
+
+def handle_facility_summary(entities: dict, facility_id: str) -> str:
+    """
+    Xử lý intent thống kê toàn facility từ số liệu aggregation đã cache (không gọi trace API theo từng đàn).
+    """
+    topic = (entities.get("topic") or "overview").lower()
+    days = int(_to_float(entities.get("days")) or 7)
+    try:
+        if topic == "feed_usage":
+            usage = analytics_service.feed_usage(facility_id, entities.get("feed_name"))
+            if not usage:
+                return f"Không có đàn nào đang dùng {entities.get('feed_name') or 'thức ăn được ghi nhận'}."
+            return "Số đàn theo loại thức ăn hiện tại:\n" + "\n".join(
+                f"- {u['feed']}: {u['batches']} đàn ({', '.join(u['asset_ids'][:10])}"
+                f"{', ...' if len(u['asset_ids']) > 10 else ''})" for u in usage
+            )
+
+        if topic == "medications_due":
+            due = analytics_service.medications_due(facility_id, end=datetime.now(UTC).date() + timedelta(days=days))
+            if not due:
+                return f"Không có đàn nào đến hạn dùng thuốc/tiêm phòng trong {days} ngày tới."
+            return f"Lịch thuốc/tiêm phòng đến hạn trong {days} ngày tới:\n" + "\n".join(
+                f"- {d['next_due_date']}: đàn {d['asset_id']} — {d['medication']}" for d in due
+            )
+
+        summary = analytics_service.summary(facility_id, days)
+        top_feeds = ", ".join(f"{f['feed']} ({f['batches']} đàn)" for f in summary["top_feeds"]) or "chưa có dữ liệu"
+        return (
+            f"Trang trại có {summary['batches']} đàn. Thức ăn dùng nhiều nhất: {top_feeds}. "
+            f"Có {len(summary['medications_due'])} lịch thuốc/tiêm phòng đến hạn trong {days} ngày tới."
+        )
     except Exception as e:
-        print(f"Error fetching asset trace for {asset_id}: {e}")
-        return f"Không thể lấy thông tin cho đàn {asset_id}: {str(e)}"
-
-    full_history = asset.get("fullHistory", []) or asset.get("history", [])
-    latest_details = {}
-    if full_history:
-        latest = full_history[-1]
-        latest_details = latest.get("details", {}) if isinstance(latest, dict) else {}
-
-    meds = []
-    if latest_details:
-        meds_field = latest_details.get("medications") or latest_details.get("medication")
-        if isinstance(meds_field, list) and meds_field:
-            if all(isinstance(m, dict) for m in meds_field):
-                for m in meds_field:
-                    name = m.get("name") or m.get("medicationName") or "(không tên)"
-                    dose = m.get("dose")
-                    date_applied = m.get("dateApplied") or m.get("appliedDate")
-                    next_due = m.get("nextDueDate")
-                    seg = name
-                    if dose:
-                        seg += f" — liều: {dose}"
-                    if date_applied:
-                        seg += f"; đã áp dụng: {date_applied}"
-                    if next_due:
-                        seg += f"; hạn tiếp theo: {next_due}"
-                    meds.append(seg)
-            else:
-                meds = [str(x) for x in meds_field]
-
-    if meds:
-        return f"Thông tin thuốc/vắc-xin cho đàn {asset_id}: " + ", ".join(meds)
-    else:
-        top_meds = asset.get("medications") or asset.get("medication")
-        if top_meds:
-            return f"Thông tin thuốc/vắc-xin cho đàn {asset_id}: " + ", ".join(str(x) for x in top_meds)
-        else:
-            return f"Không tìm thấy thông tin thuốc/vắc-xin cho đàn {asset_id}."
+        print(f"Error computing facility analytics for {facility_id}: {e}")
+        return ANALYTICS_UNAVAILABLE_MESSAGE
+
 
 def handle_suggest_feed(question: str, facility_id: str) -> str:
     """
     Xử lý intent gợi ý thức ăn từ cơ sở tri thức.
     """
-    knowledge = search_knowledge_base(question, facility_id)
+    return format_feed_suggestion(search_knowledge_base(question, facility_id))
+
+
+def format_feed_suggestion(knowledge: Optional[dict]) -> str:
     if knowledge:
         return (
             f"Với vật nuôi giai đoạn '{knowledge['stage']}' từ ({knowledge['min_age_days']} - {knowledge['max_age_days']}), "
@@ -329,13 +587,16 @@ def handle_suggest_feed(question: str, facility_id: str) -> str:
             f"Lưu ý: {knowledge['notes']}"
         )
     else:
-        return "Xin lỗi, tôi chưa tìm thấy hướng dẫn dinh dưỡng phù hợp trong cơ sở tri thức."
+        return FEED_KNOWLEDGE_NOT_FOUND_MESSAGE
 
 def handle_suggest_medication(question: str, facility_id: str) -> str:
     """
     Xử lý intent gợi ý thuốc/vắc-xin từ cơ sở tri thức.
     """
-    knowledge = search_knowledge_base(question, facility_id)
+    return format_medication_suggestion(search_knowledge_base(question, facility_id))
+
+
+def format_medication_suggestion(knowledge: Optional[dict]) -> str:
     if knowledge:
         return (
             f"Với vật nuôi giai đoạn '{knowledge['stage']}' từ ({knowledge['min_age_days']} - {knowledge['max_age_days']}), "
@@ -343,7 +604,7 @@ def handle_suggest_medication(question: str, facility_id: str) -> str:
             f"Lưu ý thêm: {knowledge['notes']}. Bạn nên tham khảo ý kiến của bác sĩ thú y để có liều lượng chính xác."
         )
     else:
-        return "Xin lỗi, tôi chưa tìm thấy hướng dẫn về thuốc/vắc-xin phù hợp trong cơ sở tri thức."
+        return MEDICATION_KNOWLEDGE_NOT_FOUND_MESSAGE
 
 
 def handle_general_chat(question: str, memories: list) -> tuple[str, bool]:
@@ -358,5 +619,5 @@ def handle_general_chat(question: str, memories: list) -> tuple[str, bool]:
     except Exception as e:
         print(f"Warning: generate_answer for general chat failed: {e}")
 
-    fallback_answer = "Xin lỗi, tôi chưa được huấn luyện để trả lời câu hỏi này. Bạn có thể hỏi về thông tin đàn, thức ăn hoặc thuốc men nhé."
+    fallback_answer = GENERAL_CHAT_FALLBACK
     return fallback_answer, False
@@ -1,14 +1,11 @@
 import requests
-from dotenv import load_dotenv
-import os
 
-# Load env variables from .env file if needed
-load_dotenv()
+from app.configurations.settings import get_env
 
-FARM_EMAIL = os.getenv("FARM_EMAIL")
-FARM_PASSWORD = os.getenv("FARM_PASSWORD")
+FARM_EMAIL = get_env("FARM_EMAIL")
+FARM_PASSWORD = get_env("FARM_PASSWORD")
 
-BASE_URL = os.getenv("BASE_URL")
+BASE_URL = get_env("BASE_URL")
 
 def login_and_get_token(email, password):
     resp = requests.post(f"{BASE_URL}/auth/login", json={
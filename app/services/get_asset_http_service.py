@@ -1,13 +1,9 @@
 from typing import Dict, Any
 import requests
 
-from dotenv import load_dotenv
-import os
+from app.configurations.settings import get_env
 
-# Load env variables from .env file if needed
-load_dotenv()
-
-BASE_URL = os.getenv("BASE_URL")
+BASE_URL = get_env("BASE_URL")
 
 
 def get_asset_trace(asset_id: str,
@@ -0,0 +1,168 @@
+"""Theo dõi sức khoẻ các dependency bên ngoài bằng một prober chạy nền.
+
+Prober định kỳ kiểm tra Mongo, Weaviate, t2v-transformers, trace API và Gemini (metadata của model),
+rồi cache kết quả. `/healthz`, `/readyz` và chat pipeline chỉ đọc kết quả đã cache nên không tốn
+thêm round trip nào cho mỗi request.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, UTC
+from typing import Callable, Dict, Optional
+
+import requests
+
+from app.configurations.mongo_config import ping_mongo
+from app.configurations.settings import get_env
+from app.configurations.weaviate_config import get_weaviate_client, init_weaviate_client
+from app.utils.circuit_breaker import DEFAULT_BREAKER_CONFIG, get_breaker
+
+HEALTH_PROBE_INTERVAL_SECONDS = float(get_env("HEALTH_PROBE_INTERVAL_SECONDS", 15))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(get_env("HEALTH_PROBE_TIMEOUT_SECONDS", 3))
+# URL của container t2v-transformers (ví dụ http://t2v-transformers:8080); bỏ trống thì không probe.
+T2V_INFERENCE_URL = get_env("T2V_INFERENCE_URL")
+BASE_URL = get_env("BASE_URL")
+GEMINI_API_KEY = get_env("GEMINI_API_KEY")
+
+# Dependency bắt buộc để app được coi là "ready"; các dependency khác chỉ làm giảm chất lượng trả lời.
+REQUIRED_DEPENDENCIES = ("mongo",)
+
+
+@dataclass
+class DependencyStatus:
+    name: str
+    # None = chưa cấu hình / chưa probe lần nào
+    up: Optional[bool] = None
+    checked_at: Optional[str] = None
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+    consecutive_failures: int = 0
+
+
+def _check_mongo() -> Optional[bool]:
+    return ping_mongo()
+
+
+def _check_weaviate() -> Optional[bool]:
+    client = get_weaviate_client()
+    if client is None:
+        # thử kết nối lại để app tự hồi phục khi Weaviate lên sau app; lượt kết nối trước còn chạy (probe trước
+        # timeout nhưng thread vẫn chờ) thì không xếp hàng thêm thread nào sau lock
+        client = init_weaviate_client(blocking=False)
+    return client is not None and client.is_ready()
+
+
+def _check_t2v_transformers() -> Optional[bool]:
+    if not T2V_INFERENCE_URL:
+        return None
+    resp = requests.get(f"{T2V_INFERENCE_URL.rstrip('/')}/.well-known/ready", timeout=HEALTH_PROBE_TIMEOUT_SECONDS)
+    return resp.status_code < 300
+
+
+def _check_trace_api() -> Optional[bool]:
+    if not BASE_URL:
+        return None
+    # chỉ cần server trả lời (kể cả 401/404) là coi như đang sống
+    resp = requests.get(BASE_URL, timeout=HEALTH_PROBE_TIMEOUT_SECONDS)
+    return resp.status_code < 500
+
+
+def _check_gemini() -> Optional[bool]:
+    if not GEMINI_API_KEY:
+        return None
+    # import lười: gemini_service import module này (dependency_available)
+    from app.services.gemini_service import get_model
+    model = get_model()
+    if model is None:
+        return False
+    import google.generativeai as genai
+    # đọc metadata của model: gọi API thật (không tốn token) để probe không đóng mạch gemini khi API đang lỗi
+    genai.get_model(model.model_name, request_options={"timeout": HEALTH_PROBE_TIMEOUT_SECONDS})
+    return True
+
+
+class HealthProber:
+    """Chạy các check theo chu kỳ trong thread và giữ kết quả gần nhất cho mỗi dependency."""
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL_SECONDS, timeout: float = HEALTH_PROBE_TIMEOUT_SECONDS):
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Callable[[], Optional[bool]]] = {
+            "mongo": _check_mongo,
+            "weaviate": _check_weaviate,
+            "t2v_transformers": _check_t2v_transformers,
+            "trace_api": _check_trace_api,
+            "gemini": _check_gemini,
+        }
+        self._status: Dict[str, DependencyStatus] = {name: DependencyStatus(name=name) for name in self._checks}
+        self._task: Optional[asyncio.Task] = None
+        self.last_probe_at: Optional[str] = None
+
+    async def _run_check(self, name: str, check: Callable[[], Optional[bool]]):
+        start = time.perf_counter()
+        error = None
+        try:
+            up = await asyncio.wait_for(asyncio.to_thread(check), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            up, error = False, f"timed out after {self.timeout}s"
+        except Exception as e:
+            up, error = False, str(e)
+
+        if up is not None and name in DEFAULT_BREAKER_CONFIG:
+            get_breaker(name).record_probe(up)
+
+        previous = self._status[name]
+        self._status[name] = DependencyStatus(
+            name=name,
+            up=up,
+            checked_at=datetime.now(UTC).isoformat(),
+            latency_ms=round((time.perf_counter() - start) * 1000, 1),
+            error=error,
+            consecutive_failures=previous.consecutive_failures + 1 if up is False else 0,
+        )
+
+    async def probe_once(self):
+        await asyncio.gather(*(self._run_check(name, check) for name, check in self._checks.items()))
+        self.last_probe_at = datetime.now(UTC).isoformat()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                print(f"Health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_available(self, name: str) -> bool:
+        """False chỉ khi lần probe gần nhất xác nhận dependency đang chết; chưa biết thì coi là sống."""
+        status = self._status.get(name)
+        return status is None or status.up is not False
+
+    def is_ready(self) -> bool:
+        return self.last_probe_at is not None and all(self._status[name].up for name in REQUIRED_DEPENDENCIES)
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: asdict(status) for name, status in self._status.items()}
+
+
+health_prober = HealthProber()
+
+
+def dependency_available(name: str) -> bool:
+    """Chat pipeline dùng hàm này để bỏ qua ngay các dependency đã biết là chết (probe lỗi hoặc mạch đang mở)."""
+    if name in DEFAULT_BREAKER_CONFIG and get_breaker(name).is_open():
+        return False
+    return health_prober.is_available(name)
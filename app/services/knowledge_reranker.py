@@ -0,0 +1,186 @@
+"""Xếp hạng lại các candidate tri thức trả về từ Weaviate bằng NumPy.
+
+Mỗi candidate có 5 đặc trưng, tất cả trong [0, 1]:
+    vector   1 - khoảng cách vector (cosine distance) tới câu hỏi
+    bm25     điểm BM25 của câu hỏi trên nội dung candidate (tính trên tập candidate, chuẩn hoá theo max)
+    age      độ khớp giữa tuổi trong câu hỏi ("35 ngày") và khoảng [min_age_days, max_age_days]
+    species  loài trong câu hỏi có khớp `species` của candidate
+    recency  độ mới của object (theo thời điểm tạo, bán rã KNOWLEDGE_RECENCY_HALF_LIFE_DAYS)
+
+Điểm = ma trận đặc trưng @ vector trọng số; trọng số có thể cấu hình theo facility bằng
+KNOWLEDGE_RERANK_WEIGHTS (JSON, ví dụ {"farm-a": {"vector": 0.5, "age": 0.3}}).
+`score_batch` chấm nhiều câu hỏi cùng lúc (Q, N, F) để tune trọng số offline.
+"""
+import json
+import math
+import re
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.configurations.settings import get_env
+
+FEATURES = ("vector", "bm25", "age", "species", "recency")
+KNOWLEDGE_RECENCY_HALF_LIFE_DAYS = float(get_env("KNOWLEDGE_RECENCY_HALF_LIFE_DAYS", 365))
+# khoảng lệch tuổi (ngày) mà độ khớp tuổi giảm còn ~37%
+AGE_GAP_SCALE_DAYS = 30.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_SPECIES_ALIASES = {
+    "heo": "heo", "lợn": "heo",
+    "gà": "gà",
+    "bò": "bò",
+    "vịt": "vịt",
+    "dê": "dê",
+    "cừu": "cừu",
+}
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass(frozen=True)
+class RerankWeights:
+    vector: float = 0.45
+    bm25: float = 0.2
+    age: float = 0.2
+    species: float = 0.1
+    recency: float = 0.05
+
+    def as_array(self) -> np.ndarray:
+        return np.array([getattr(self, f) for f in FEATURES], dtype=np.float32)
+
+
+def _load_facility_weights() -> Dict[str, RerankWeights]:
+    raw = get_env("KNOWLEDGE_RERANK_WEIGHTS")
+    if not raw:
+        return {}
+    try:
+        allowed = {f.name for f in fields(RerankWeights)}
+        return {
+            facility: RerankWeights(**{k: float(v) for k, v in overrides.items() if k in allowed})
+            for facility, overrides in json.loads(raw).items()
+        }
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"Invalid KNOWLEDGE_RERANK_WEIGHTS, using defaults: {e}")
+        return {}
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(unicodedata.normalize("NFC", text or "").lower())
+
+
+def extract_species(text: str) -> Optional[str]:
+    for token in tokenize(text):
+        if token in _SPECIES_ALIASES:
+            return _SPECIES_ALIASES[token]
+    return None
+
+
+def bm25_scores(query_tokens: Sequence[str], docs_tokens: Sequence[Sequence[str]]) -> np.ndarray:
+    """BM25 của một câu hỏi trên tập candidate (IDF tính trên chính tập này)."""
+    n = len(docs_tokens)
+    terms = list(dict.fromkeys(query_tokens))
+    if n == 0 or not terms:
+        return np.zeros(n, dtype=np.float32)
+
+    counters = [Counter(doc) for doc in docs_tokens]
+    tf = np.array([[c[t] for c in counters] for t in terms], dtype=np.float32)  # (T, N)
+    doc_len = np.array([len(doc) for doc in docs_tokens], dtype=np.float32)
+    avg_len = max(float(doc_len.mean()), 1.0)
+
+    df = (tf > 0).sum(axis=1)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+    denom = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)
+    return (idf[:, None] * tf * (BM25_K1 + 1) / denom).sum(axis=0)
+
+
+class KnowledgeReranker:
+    def __init__(self, default_weights: RerankWeights = RerankWeights(),
+                 facility_weights: Optional[Dict[str, RerankWeights]] = None):
+        self.default_weights = default_weights
+        self.facility_weights = facility_weights if facility_weights is not None else _load_facility_weights()
+
+    def weights_for(self, facility_id: Optional[str]) -> np.ndarray:
+        return self.facility_weights.get(facility_id, self.default_weights).as_array()
+
+    def features(self, query: str, candidates: List[Dict[str, Any]], age_days: Optional[int] = None,
+                 now: Optional[float] = None) -> np.ndarray:
+        """
+        Ma trận đặc trưng (N, 5) cho các candidate dạng
+        {"properties": {...}, "distance": float | None, "created_at": epoch seconds | None}.
+        """
+        n = len(candidates)
+        if n == 0:
+            return np.zeros((0, len(FEATURES)), dtype=np.float32)
+        now = now or time.time()
+        props = [c.get("properties") or {} for c in candidates]
+
+        distance = np.array([c.get("distance") if c.get("distance") is not None else 1.0 for c in candidates],
+                            dtype=np.float32)
+        vector = np.clip(1.0 - distance, 0.0, 1.0)
+
+        bm25 = bm25_scores(tokenize(query), [tokenize(p.get("content") or "") for p in props])
+        if bm25.max() > 0:
+            bm25 = bm25 / bm25.max()
+
+        if age_days is None:
+            age = np.full(n, 0.5, dtype=np.float32)
+        else:
+            min_age = np.array([p.get("min_age_days") if p.get("min_age_days") is not None else -np.inf for p in props],
+                               dtype=np.float32)
+            max_age = np.array([p.get("max_age_days") if p.get("max_age_days") is not None else np.inf for p in props],
+                               dtype=np.float32)
+            gap = np.maximum(np.maximum(min_age - age_days, age_days - max_age), 0.0)
+            age = np.exp(-gap / AGE_GAP_SCALE_DAYS)
+
+        query_species = extract_species(query)
+        if query_species is None:
+            species = np.full(n, 0.5, dtype=np.float32)
+        else:
+            species = np.array([1.0 if extract_species(p.get("species") or "") == query_species else 0.0 for p in props],
+                               dtype=np.float32)
+
+        created = np.array([c.get("created_at") if c.get("created_at") is not None else np.nan for c in candidates],
+                           dtype=np.float64)
+        age_in_days = np.maximum(now - created, 0.0) / 86400.0
+        recency = np.where(np.isnan(created), 0.5,
+                           np.exp(-math.log(2) * age_in_days / KNOWLEDGE_RECENCY_HALF_LIFE_DAYS))
+
+        return np.stack([vector, bm25, age, species, recency.astype(np.float32)], axis=1).astype(np.float32)
+
+    @staticmethod
+    def score(features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """(N, F) @ (F,) -> (N,)"""
+        return features @ weights
+
+    @staticmethod
+    def score_batch(features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """
+        Chấm nhiều câu hỏi một lượt: features (Q, N, F), weights (F,) dùng chung hoặc (Q, F) theo từng câu hỏi.
+        Trả về (Q, N).
+        """
+        if weights.ndim == 1:
+            return features @ weights
+        return np.einsum("qnf,qf->qn", features, weights)
+
+    @staticmethod
+    def top_k_batch(scores: np.ndarray, k: int) -> np.ndarray:
+        """Chỉ số top-k (giảm dần) cho từng hàng của ma trận điểm (Q, N)."""
+        k = min(k, scores.shape[1])
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+        return np.take_along_axis(part, order, axis=1)
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], facility_id: Optional[str] = None,
+               age_days: Optional[int] = None) -> List[Dict[str, Any]]:
+        if len(candidates) <= 1:
+            return list(candidates)
+        scores = self.score(self.features(query, candidates, age_days), self.weights_for(facility_id))
+        return [candidates[i] for i in np.argsort(-scores, kind="stable")]
+
+
+knowledge_reranker = KnowledgeReranker()
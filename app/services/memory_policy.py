@@ -0,0 +1,146 @@
+"""Chính sách ghi memory vào ChatMemory: lọc câu mẫu, chống trùng lặp, chấm điểm importance và TTL.
+
+Trước đây mọi tin nhắn (kể cả fallback của bot và câu trả lời lặp lại) đều được lưu với importance 0.5,
+làm index vector và số candidate khi truy vấn phình dần theo thời gian.
+"""
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Optional
+
+from app.configurations.settings import get_env
+from app.services.gemini_service import BOILERPLATE_MESSAGES
+from app.utils.cache_backend import get_cache
+from app.utils.metrics import increment
+
+MEMORY_TTL_DAYS = int(get_env("MEMORY_TTL_DAYS", 180))
+MEMORY_LOW_IMPORTANCE_TTL_DAYS = int(get_env("MEMORY_LOW_IMPORTANCE_TTL_DAYS", 14))
+MEMORY_LOW_IMPORTANCE_THRESHOLD = float(get_env("MEMORY_LOW_IMPORTANCE_THRESHOLD", 0.3))
+MEMORY_MIN_IMPORTANCE = float(get_env("MEMORY_MIN_IMPORTANCE", 0.15))
+# thời gian nhớ hash đã thấy trong process (chống trùng không cần round trip tới Weaviate)
+MEMORY_DEDUP_CACHE_TTL_SECONDS = float(get_env("MEMORY_DEDUP_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+_BATCH_CODE_RE = re.compile(r"\b[A-Z]{1,10}(?:[-_][A-Z0-9]+)*[-_]?\d{2,}[A-Z0-9-]*\b")
+_NUMBER_RE = re.compile(r"\d")
+_DATA_UNIT_RE = re.compile(r"\b(kg|g|ml|liều|ngày|tuần|tháng|con)\b", re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r"\{\w+\}")
+_GREETING_RE = re.compile(r"^(xin chào|chào|hi|hello|cảm ơn|cám ơn|thanks|ok|oke|vâng|dạ)\b", re.IGNORECASE)
+
+
+def normalize_content(text: str) -> str:
+    """NFC, chữ thường, gộp khoảng trắng và bỏ dấu câu ở hai đầu để so khớp trùng lặp."""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    return " ".join(text.split()).strip(" .,!?;:…\"'")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+
+
+def _compile_boilerplate(messages) -> list[re.Pattern]:
+    patterns = []
+    for message in messages:
+        parts = _PLACEHOLDER_RE.split(normalize_content(message))
+        patterns.append(re.compile("^" + r".+?".join(re.escape(p) for p in parts) + "$"))
+    return patterns
+
+
+_BOILERPLATE_PATTERNS = _compile_boilerplate(BOILERPLATE_MESSAGES)
+
+
+def is_boilerplate(text: str) -> bool:
+    normalized = normalize_content(text)
+    return any(p.match(normalized) for p in _BOILERPLATE_PATTERNS)
+
+
+def score_importance(content: str, sender_type: str) -> float:
+    """Heuristic rẻ: ưu tiên nội dung có mã đàn, số liệu, đơn vị; hạ điểm câu chào/ngắn."""
+    text = (content or "").strip()
+    words = text.split()
+    if not words:
+        return 0.0
+    if _GREETING_RE.match(text) and len(words) <= 6:
+        return 0.1
+
+    score = 0.4
+    if _BATCH_CODE_RE.search(text):
+        score += 0.25
+    if _NUMBER_RE.search(text):
+        score += 0.1
+    if _DATA_UNIT_RE.search(text):
+        score += 0.1
+    if len(words) < 4:
+        score -= 0.15
+    elif len(words) > 40:
+        score += 0.05
+    if sender_type == "user" and "?" in text:
+        # câu hỏi của user phản ánh nhu cầu, hữu ích cho lượt sau
+        score += 0.05
+    return round(min(max(score, 0.0), 1.0), 2)
+
+
+def _seen_key(conversation_id: str, digest: str) -> str:
+    return f"{conversation_id}:{digest}"
+
+
+@dataclass
+class MemoryDecision:
+    store: bool
+    reason: str
+    importance: float = 0.0
+    content_hash: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
+
+class MemoryIngestionPolicy:
+    def __init__(self, ttl_days: int = MEMORY_TTL_DAYS, low_importance_ttl_days: int = MEMORY_LOW_IMPORTANCE_TTL_DAYS,
+                 min_importance: float = MEMORY_MIN_IMPORTANCE):
+        self.ttl_days = ttl_days
+        self.low_importance_ttl_days = low_importance_ttl_days
+        self.min_importance = min_importance
+
+    def evaluate(self, conversation_id: str, content: str, sender_type: str,
+                 now: Optional[datetime] = None) -> MemoryDecision:
+        now = now or datetime.now(UTC)
+        if not normalize_content(content):
+            return self._skip("empty")
+        if sender_type == "bot" and is_boilerplate(content):
+            return self._skip("boilerplate")
+
+        digest = content_hash(content)
+        if get_cache("memory_dedup").get(_seen_key(conversation_id, digest)) is not None:
+            return self._skip("duplicate", digest)
+
+        importance = score_importance(content, sender_type)
+        if importance < self.min_importance:
+            return self._skip("low_importance", digest)
+
+        ttl_days = self.low_importance_ttl_days if importance < MEMORY_LOW_IMPORTANCE_THRESHOLD else self.ttl_days
+        return MemoryDecision(
+            store=True,
+            reason="stored",
+            importance=importance,
+            content_hash=digest,
+            expires_at=now + timedelta(days=ttl_days),
+        )
+
+    @staticmethod
+    def mark_stored(conversation_id: str, digest: Optional[str]):
+        """
+        Gọi sau khi memory đã được ghi vào Weaviate. Chỉ khi đó hash mới được nhớ để chống trùng: lần ghi lỗi
+        (breaker mở, thiếu tenant...) không làm nội dung bị bỏ qua suốt MEMORY_DEDUP_CACHE_TTL_SECONDS.
+        """
+        if digest is None:
+            return
+        get_cache("memory_dedup").set(_seen_key(conversation_id, digest), 1, ttl=MEMORY_DEDUP_CACHE_TTL_SECONDS)
+        increment("memory_policy.stored")
+
+    @staticmethod
+    def _skip(reason: str, digest: Optional[str] = None) -> MemoryDecision:
+        increment(f"memory_policy.skipped.{reason}")
+        return MemoryDecision(store=False, reason=reason, content_hash=digest)
+
+
+memory_policy = MemoryIngestionPolicy()
@@ -1,9 +1,10 @@
 from datetime import datetime, UTC
-from typing import Any
-
-from weaviate.classes.query import Filter, Sort
+from typing import Any, Optional
 
 from app.configurations.weaviate_config import get_weaviate_client, close_weaviate_client
+from app.services.embedding_service import get_embedding_service
+from app.services.weaviate_tenancy import is_missing_tenant_error, tenant_collection, TenantRequiredError
+from app.utils.circuit_breaker import CircuitOpenError, get_breaker
 
 COLLECTION_NAME = "ChatMemory"
 
@@ -25,7 +26,12 @@ class WeaviateChatMemoryService:
             )
         return self.client.collections.get(COLLECTION_NAME)
 
-    def save_memory(self, email: str, conversation_id: str, memory_json: dict):
+    def _collection_for(self, facility_id: Optional[str]):
+        """Collection dùng chung, hoặc tenant của facility khi bật WEAVIATE_MULTI_TENANCY."""
+        return tenant_collection(self.client, COLLECTION_NAME, facility_id)
+
+    @staticmethod
+    def _build_object(email: str, conversation_id: str, memory_json: dict):
         created_at = memory_json.get(
             "createdAt", datetime.now(UTC).isoformat().replace("+00:00", "Z")
         )
@@ -41,17 +47,87 @@ class WeaviateChatMemoryService:
                 "sourceMessageID": memory_json.get("sourceMessageID", ""),
             },
         }
+        if memory_json.get("contentHash"):
+            data["contentHash"] = memory_json["contentHash"]
+        if memory_json.get("expiresAt"):
+            data["expiresAt"] = memory_json["expiresAt"]
+
+        # UUID xác định theo (email, conversation, contentHash): insert trùng sẽ bị Weaviate từ chối
+        # thay vì tạo thêm một object trong index.
+        object_uuid = None
+        if data.get("contentHash"):
+            from weaviate.util import generate_uuid5
+
+            object_uuid = generate_uuid5(f"{email}:{conversation_id}:{data['contentHash']}")
+        return data, object_uuid
+
+    def save_memory(self, email: str, conversation_id: str, memory_json: dict, facility_id: Optional[str] = None) -> bool:
+        """Lưu một memory; trả về True nếu object mới được ghi vào Weaviate."""
+        data, object_uuid = self._build_object(email, conversation_id, memory_json)
+
+        def _insert(vector) -> bool:
+            try:
+                self._collection_for(facility_id).data.insert(properties=data, vector=vector, uuid=object_uuid)
+                return True
+            except Exception as e:
+                # object trùng không phải lỗi của dependency, không tính vào circuit breaker
+                if "already exists" in str(e):
+                    return False
+                raise
 
         try:
-            self.collection.data.insert(properties=data)
-            print(f"Đã lưu memory cho {email} ({conversation_id})")
+            # EMBEDDING_MODE=local: tự tính vector, Weaviate không phải gọi sang t2v-transformers
+            embedder = get_embedding_service()
+            vector = embedder.embed_text(data["content"]) if embedder is not None and data["content"] else None
+            if get_breaker("weaviate").call(_insert, vector):
+                print(f"Đã lưu memory cho {email} ({conversation_id})")
+                return True
+            print(f"Memory trùng lặp đã tồn tại cho {email} ({conversation_id}); bỏ qua.")
+        except CircuitOpenError:
+            print(f"Weaviate circuit is open; bỏ qua lưu memory cho {email} ({conversation_id})")
+        except TenantRequiredError as e:
+            print(f"Bỏ qua lưu memory cho {email} ({conversation_id}): {e}")
         except Exception as e:
             print(f"Lỗi khi lưu memory: {e}")
+        return False
+
+    def save_memories(self, email: str, items: list[tuple[str, dict]], facility_id: Optional[str] = None) -> list[int]:
+        """
+        Lưu nhiều memory (conversation_id, memory_json) bằng một lượt insert_many và một lượt embed.
+        Trả về vị trí (trong `items`) của các memory đã được ghi.
+        """
+        if not items:
+            return []
+        from weaviate.classes.data import DataObject
+
+        built = [self._build_object(email, conversation_id, memory_json) for conversation_id, memory_json in items]
+        try:
+            collection = self._collection_for(facility_id)
+            embedder = get_embedding_service()
+            vectors = embedder.embed_texts([data["content"] for data, _ in built]) if embedder is not None \
+                else [None] * len(built)
+            objects = [DataObject(properties=data, uuid=object_uuid, vector=vector)
+                       for (data, object_uuid), vector in zip(built, vectors)]
+            result = get_breaker("weaviate").call(collection.data.insert_many, objects)
+            # object trùng (uuid đã tồn tại) nằm trong result.errors, không phải lỗi của dependency
+            errors = getattr(result, "errors", None) or {}
+            stored = [i for i in range(len(objects)) if i not in errors]
+            print(f"Đã lưu {len(stored)}/{len(objects)} memory cho {email}")
+            return stored
+        except CircuitOpenError:
+            print(f"Weaviate circuit is open; bỏ qua lưu {len(items)} memory cho {email}")
+        except TenantRequiredError as e:
+            print(f"Bỏ qua lưu {len(items)} memory cho {email}: {e}")
+        except Exception as e:
+            print(f"Lỗi khi lưu memory theo lô: {e}")
+        return []
+
+    def get_memories_by_email(self, email: str, limit: int = 10, facility_id: Optional[str] = None) -> list[dict]:
+        from weaviate.classes.query import Filter
 
-    def get_memories_by_email(self, email: str, limit: int = 10) -> list[dict]:
         try:
             filter_expr = Filter.by_property("email").equal(email)
-            result = self.collection.query.fetch_objects(
+            result = self._collection_for(facility_id).query.fetch_objects(
                 filters=filter_expr,
                 limit=limit,
             )
@@ -61,34 +137,59 @@ class WeaviateChatMemoryService:
             return []
 
     def get_memories_by_email_and_conversation(
-            self, email: str, conversation_id: str, limit: int = 10
+            self, email: str, conversation_id: str, limit: int = 10, facility_id: Optional[str] = None
     ) -> list[dict]:
+        from weaviate.classes.query import Filter, Sort
+
+        def _fetch(**kwargs):
+            try:
+                return self._collection_for(facility_id).query.fetch_objects(**kwargs)
+            except Exception as e:
+                # facility chưa từng lưu memory nên chưa có tenant: không phải lỗi của dependency
+                if is_missing_tenant_error(e):
+                    return None
+                raise
+
         try:
             filters = (
                     Filter.by_property("email").equal(email)
                     & Filter.by_property("conversationID").equal(conversation_id)
             )
             sort = Sort.by_property("createdAt", ascending=False)
-            result = self.collection.query.fetch_objects(
-                filters=filters,
-                limit=limit,
-                sort=sort,
-            )
-            return [obj.properties for obj in result.objects]
+            result = get_breaker("weaviate").call(_fetch, filters=filters, limit=limit, sort=sort)
+            return [obj.properties for obj in result.objects] if result is not None else []
+        except CircuitOpenError:
+            print("Weaviate circuit is open; trả về danh sách memory rỗng.")
+            return []
         except Exception as e:
             print(f"Lỗi khi truy vấn theo email + conversation: {e}")
             return []
 
-    def delete_memories_by_conversation(self, email: str, conversation_id: str):
-        try:
-            filter_expr = (
-                Filter.by_property("email").equal(email)
-                & Filter.by_property("conversationID").equal(conversation_id)
-            )
-            result = self.collection.data.delete_many(where=filter_expr)
-            print(f"Đã xoá {result['matches']} memory trong {conversation_id}")
-        except Exception as e:
-            print(f"Lỗi khi xoá memory: {e}")
+    def delete_memories_by_conversation(self, email: Optional[str], conversation_id: str,
+                                        facility_id: Optional[str] = None) -> int:
+        """
+        Xoá memory của conversation (lọc thêm theo email nếu có); trả về số object đã xoá.
+        Một lượt delete_many bị giới hạn bởi QUERY_MAXIMUM_RESULTS của Weaviate nên caller gọi lặp
+        đến khi trả về 0. Lỗi được ném ra để job dọn dẹp có thể thử lại.
+        """
+        from weaviate.classes.query import Filter
+
+        filters = Filter.by_property("conversationID").equal(conversation_id)
+        if email:
+            filters = Filter.by_property("email").equal(email) & filters
+
+        def _delete() -> int:
+            try:
+                return self._collection_for(facility_id).data.delete_many(where=filters).successful
+            except Exception as e:
+                if is_missing_tenant_error(e):
+                    return 0
+                raise
+
+        deleted = get_breaker("weaviate").call(_delete)
+        if deleted:
+            print(f"Đã xoá {deleted} memory trong {conversation_id}")
+        return deleted
 
     def close(self):
         # delegate to central close function
@@ -0,0 +1,112 @@
+"""Lưu trữ lạnh message cũ: chuyển message cũ hơn MESSAGE_RETENTION_DAYS từ `messages` sang `messages_archive`.
+
+`messages` (và index của nó) chỉ còn giữ phần đang được dùng; message cũ được gom thành bucket tối đa
+MESSAGE_ARCHIVE_BUCKET_SIZE message, nén zlib. MessageRepository đọc trong suốt qua cả hai tầng.
+Với MESSAGE_STORAGE=buckets, các bucket đã đầy và cũ được nén tại chỗ trong `message_buckets`.
+
+Mỗi lượt chạy xử lý tối đa MESSAGE_RETENTION_MAX_CONVERSATIONS conversation và giới hạn tốc độ ghi
+(CLEANUP_MAX_OPS_PER_SECOND) nên bộ nhớ và I/O của một lượt có giới hạn. Lượt sau tiếp tục phần còn lại.
+
+Chạy định kỳ trong app khi MESSAGE_RETENTION_ENABLED=true (nên bật trên một worker/instance), hoặc bằng cron:
+    python -m app.utils.archive_messages
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, UTC
+from typing import Optional
+
+from app.configurations.settings import get_env
+from app.repositories.message_repository import get_message_repository
+from app.services.cleanup_service import CLEANUP_MAX_OPS_PER_SECOND, RateLimiter
+from app.utils.metrics import increment, register_metrics_source
+
+MESSAGE_RETENTION_ENABLED = get_env("MESSAGE_RETENTION_ENABLED", "false").lower() == "true"
+# tuổi tối thiểu (ngày) để message được chuyển sang tầng lạnh; 0 = tắt
+MESSAGE_RETENTION_DAYS = int(get_env("MESSAGE_RETENTION_DAYS", 90))
+MESSAGE_ARCHIVE_BUCKET_SIZE = int(get_env("MESSAGE_ARCHIVE_BUCKET_SIZE", 200))
+MESSAGE_RETENTION_MAX_CONVERSATIONS = int(get_env("MESSAGE_RETENTION_MAX_CONVERSATIONS", 500))
+MESSAGE_RETENTION_INTERVAL_SECONDS = float(get_env("MESSAGE_RETENTION_INTERVAL_SECONDS", 3600))
+
+
+def _default_repo():
+    from app.configurations.mongo_config import get_db
+
+    return get_message_repository(get_db())
+
+
+class MessageRetentionService:
+    def __init__(self, repo_factory=_default_repo, retention_days: int = MESSAGE_RETENTION_DAYS,
+                 bucket_size: int = MESSAGE_ARCHIVE_BUCKET_SIZE,
+                 max_conversations: int = MESSAGE_RETENTION_MAX_CONVERSATIONS,
+                 max_ops_per_second: float = CLEANUP_MAX_OPS_PER_SECOND,
+                 interval: float = MESSAGE_RETENTION_INTERVAL_SECONDS):
+        self._repo_factory = repo_factory
+        self.retention_days = retention_days
+        self.bucket_size = bucket_size
+        self.max_conversations = max_conversations
+        self.interval = interval
+        self.rate_limiter = RateLimiter(max_ops_per_second)
+        self._task: Optional[asyncio.Task] = None
+        self._last_run: dict = {}
+
+    def run_once(self, now: Optional[datetime] = None, dry_run: bool = False) -> dict:
+        """Chuyển message cũ của tối đa `max_conversations` conversation sang tầng lạnh; trả về thống kê."""
+        stats = {"conversations": 0, "messages": 0, "buckets": 0, "raw_bytes": 0, "stored_bytes": 0}
+        if self.retention_days <= 0:
+            return stats
+        start = time.perf_counter()
+        repo = self._repo_factory()
+        cutoff = (now or datetime.now(UTC)) - timedelta(days=self.retention_days)
+
+        for convo_id in repo.conversations_with_messages_before(cutoff, self.max_conversations):
+            stats["conversations"] += 1
+            if dry_run:
+                stats["messages"] += repo.count_before(convo_id, cutoff)
+                continue
+            while True:
+                self.rate_limiter.wait()
+                docs = repo.find_before(convo_id, cutoff, self.bucket_size)
+                if not docs:
+                    break
+                bucket = repo.archive_batch(convo_id, docs)
+                stats["buckets"] += 1
+                for key in ("messages", "raw_bytes", "stored_bytes"):
+                    stats[key] += bucket[key]
+
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        stats["dry_run"] = dry_run
+        if not dry_run:
+            increment("retention.messages_archived", stats["messages"])
+            increment("retention.bytes_saved", stats["raw_bytes"] - stats["stored_bytes"])
+        self._last_run = {**stats, "at": datetime.now(UTC).isoformat()}
+        print(f"Message retention: {stats}")
+        return stats
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"Message retention failed: {e}")
+
+    def start(self):
+        if MESSAGE_RETENTION_ENABLED and self.retention_days > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {"enabled": MESSAGE_RETENTION_ENABLED, "retention_days": self.retention_days,
+                "last_run": self._last_run}
+
+
+message_retention = MessageRetentionService()
+register_metrics_source("message_retention", message_retention.snapshot)
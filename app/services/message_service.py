@@ -3,8 +3,10 @@ from app.repositories.conversation_repository import ConversationRepository
 from app.models.message import MessageCreate, MessageInDB
 from app.models.conversation import ConversationCreate
 from app.services.memory_weaviate_service import WeaviateChatMemoryService
+from app.services.memory_policy import memory_policy
+from app.services.session_cache import session_cache
 from app.configurations.weaviate_config import get_weaviate_client
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from bson import ObjectId
 from datetime import datetime, UTC
 from fastapi import HTTPException
@@ -33,19 +35,54 @@ class MessageService:
             print(f"Warning: failed to initialize memory service lazily: {e}")
             self.memory_service = None
 
+    @staticmethod
+    def _memory_json(msg: MessageCreate, decision, message_id, now: datetime) -> dict:
+        return {
+            "content": msg.content,
+            "memoryType": "FACT",
+            "importanceScore": decision.importance,
+            "sourceMessageID": str(message_id),
+            "createdAt": now.isoformat().replace("+00:00", "Z"),
+            "contentHash": decision.content_hash,
+            "expiresAt": decision.expires_at.isoformat().replace("+00:00", "Z"),
+        }
+
     def get_messages_for_conversation(self, convo_id: ObjectId) -> List[MessageInDB]:
         return self.message_repo.get_by_conversation_id(convo_id)
 
+    def _get_conversation(self, convo_id: ObjectId):
+        """Conversation qua session cache: lượt chat tiếp theo của conversation đang hoạt động không đọc Mongo."""
+        return session_cache.conversation(str(convo_id), lambda: self.convo_repo.get_by_id(convo_id))
+
+    def _ensure_exists(self, convo_id: ObjectId):
+        """
+        Session cache chỉ trong process: conversation có thể đã bị xoá ở worker khác, nên kiểm tra lại trong
+        Mongo trước khi ghi message (như save_messages_bulk); không còn thì bỏ phiên trong cache và trả 404.
+        """
+        if not self.convo_repo.existing_ids([convo_id]):
+            session_cache.invalidate(str(convo_id))
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+    def _record_message(self, convo_id: ObjectId, msg: MessageCreate, now: datetime):
+        """
+        Cập nhật tóm tắt conversation sau khi message đã được ghi: ETag của lịch sử tính từ message_count /
+        last_message_at, nên chỉ đổi khi message mới đã đọc được (và insert lỗi thì không làm lệch số đếm).
+        """
+        if not self.convo_repo.record_messages(convo_id, 1, now, msg.content, msg.sender_type):
+            # bị xoá ngay giữa lúc kiểm tra và ghi
+            session_cache.invalidate(str(convo_id))
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        session_cache.record_message(str(convo_id), msg.content, msg.sender_type, now)
+
     def create_message(self, convo_id: ObjectId, msg: MessageCreate) -> MessageInDB:
-        conversation = self.convo_repo.get_by_id(convo_id)
+        conversation = self._get_conversation(convo_id)
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
+        self._ensure_exists(convo_id)
 
         now = datetime.now(UTC)
         new_message = self.message_repo.create(convo_id, msg, now)
-
-        self.convo_repo.update_timestamp(convo_id, now)
-
+        self._record_message(convo_id, msg, now)
         return new_message
 
     def save_new_message(self,
@@ -58,11 +95,12 @@ class MessageService:
         if conversation_id:
             try:
                 convo_obj_id = ObjectId(conversation_id)
-                conversation = self.convo_repo.get_by_id(convo_obj_id)
+                conversation = self._get_conversation(convo_obj_id)
                 if not conversation:
                     raise HTTPException(status_code=404, detail="Conversation not found")
             except Exception:
                 raise HTTPException(status_code=400, detail="Invalid conversation ID format")
+            self._ensure_exists(convo_obj_id)
         else:
             convo_create = ConversationCreate(
                 email=email,
@@ -71,30 +109,84 @@ class MessageService:
             )
             conversation = self.convo_repo.create(convo_create)
             convo_obj_id = conversation.id
+            session_cache.put_conversation(conversation, new=True)
 
         now = datetime.now(UTC)
         new_message = self.message_repo.create(convo_obj_id, msg, now)
+        self._record_message(convo_obj_id, msg, now)
 
-        self.convo_repo.update_timestamp(convo_obj_id, now)
+        # Chỉ ghi memory có giá trị: bỏ câu mẫu/fallback, nội dung trùng trong conversation, chấm importance + TTL
+        decision = memory_policy.evaluate(str(convo_obj_id), msg.content, msg.sender_type, now=now)
+        if not decision.store:
+            print(f"Bỏ qua lưu memory ({decision.reason}) cho message {new_message.id}")
+            return new_message
 
-        memory_json = {
-            "content": msg.content,
-            "memoryType": "FACT",
-            "importanceScore": 0.5,
-            "sourceMessageID": str(new_message.id),
-            "createdAt": now.isoformat().replace("+00:00", "Z")
-        }
+        memory_json = self._memory_json(msg, decision, new_message.id, now)
 
         # Try to lazily initialize memory service, then save if available
         self._ensure_memory_service()
         if self.memory_service is not None:
             try:
-                self.memory_service.save_memory(
+                saved = self.memory_service.save_memory(
                     email=email,
                     conversation_id=str(convo_obj_id),
-                    memory_json=memory_json
+                    memory_json=memory_json,
+                    facility_id=facility_id,
                 )
+                if saved:
+                    memory_policy.mark_stored(str(convo_obj_id), decision.content_hash)
+                    session_cache.record_memory(str(convo_obj_id), memory_json)
             except Exception as e:
                 print(f"Lỗi khi lưu memory vào Weaviate: {e}")
 
         return new_message
+
+    def save_messages_bulk(self, email: str,
+                           entries: List[Tuple[ObjectId, MessageCreate, datetime]],
+                           facility_id: Optional[str] = None) -> List[MessageInDB]:
+        """
+        Ghi nhiều message vào các conversation đã tồn tại: một insert_many cho Mongo, một cập nhật
+        tóm tắt (số message, message cuối) cho mỗi conversation và một insert_many cho các memory
+        qua được memory policy. Conversation nào đã bị xoá (kể cả ở worker khác) thì không ghi gì và trả 404.
+        """
+        convo_ids = list(dict.fromkeys(convo_id for convo_id, _, _ in entries))
+        missing = set(convo_ids) - self.convo_repo.existing_ids(convo_ids)
+        if missing:
+            for convo_id in missing:
+                session_cache.invalidate(str(convo_id))
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        new_messages = self.message_repo.create_many(entries)
+
+        counts: dict[ObjectId, int] = {}
+        latest: dict[ObjectId, Tuple[datetime, MessageCreate]] = {}
+        for convo_id, msg, timestamp in entries:
+            counts[convo_id] = counts.get(convo_id, 0) + 1
+            if convo_id not in latest or timestamp >= latest[convo_id][0]:
+                latest[convo_id] = (timestamp, msg)
+        for convo_id, (timestamp, msg) in latest.items():
+            self.convo_repo.record_messages(convo_id, counts[convo_id], timestamp, msg.content, msg.sender_type)
+        for convo_id, msg, timestamp in entries:
+            session_cache.record_message(str(convo_id), msg.content, msg.sender_type, timestamp)
+
+        memories = []
+        digests = []
+        for (convo_id, msg, timestamp), new_message in zip(entries, new_messages):
+            decision = memory_policy.evaluate(str(convo_id), msg.content, msg.sender_type, now=timestamp)
+            if decision.store:
+                memories.append((str(convo_id), self._memory_json(msg, decision, new_message.id, timestamp)))
+                digests.append(decision.content_hash)
+
+        self._ensure_memory_service()
+        if self.memory_service is not None and memories:
+            # insert_many không cho biết object nào được ghi: lượt sau đọc lại memory từ Weaviate
+            for convo_id in {convo_id for convo_id, _ in memories}:
+                session_cache.forget_memories(convo_id)
+            try:
+                stored = self.memory_service.save_memories(email=email, items=memories, facility_id=facility_id)
+                for i in stored or []:
+                    memory_policy.mark_stored(memories[i][0], digests[i])
+            except Exception as e:
+                print(f"Lỗi khi lưu memory vào Weaviate: {e}")
+
+        return new_messages
@@ -0,0 +1,224 @@
+"""Lắp prompt theo ngân sách token: đếm token (ước lượng cục bộ đã hiệu chỉnh), chia ngân sách cho các phần.
+
+Tiếng Việt có dấu bị tách token khác hẳn số ký tự, nên cắt theo ký tự (MAX_MEM_CHARS) làm kích thước prompt
+dao động mạnh. Ở đây:
+- `estimate_tokens`: ước lượng cục bộ theo từng mảnh (âm tiết có dấu, từ ASCII, chữ số, dấu câu), cache theo
+  nội dung, nhân với hệ số hiệu chỉnh. Hệ số được học từ `count_tokens` của Gemini trên một mẫu prompt
+  (PROMPT_TOKEN_CALIBRATION_SAMPLE_RATE), gọi ở thread nền nên không thêm độ trễ cho request; lượt gọi này có
+  timeout riêng và không tính vào circuit breaker của gemini.
+- `plan_prompt`: phần hệ thống và câu hỏi luôn giữ nguyên; dữ liệu tool được tối đa PROMPT_TOOL_MAX_SHARE phần ngân
+  sách còn lại (cắt bớt nếu dài); memory dùng phần còn lại, memory ít giá trị nhất (ít liên quan tới câu hỏi,
+  cũ hơn) bị bỏ trước, memory cuối cùng còn vừa một phần thì được rút gọn.
+- `log_prompt_usage`: in và cộng metrics số token của từng prompt (prompt.tokens.<kind>).
+"""
+import hashlib
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from app.configurations.settings import get_env
+from app.utils.cache_backend import LocalLRUCache
+from app.utils.circuit_breaker import get_breaker
+from app.utils.metrics import increment, register_metrics_source
+
+# ngân sách token cho prompt sinh câu trả lời (generate_answer) và prompt phân loại intent
+PROMPT_TOKEN_BUDGET = int(get_env("PROMPT_TOKEN_BUDGET", 3000))
+PROMPT_INTENT_TOKEN_BUDGET = int(get_env("PROMPT_INTENT_TOKEN_BUDGET", 2000))
+# phần tối đa của ngân sách (sau phần hệ thống và câu hỏi) dành cho dữ liệu tool/gợi ý của hệ thống
+PROMPT_TOOL_MAX_SHARE = float(get_env("PROMPT_TOOL_MAX_SHARE", 0.6))
+# memory bị rút gọn chỉ khi còn ít nhất chừng này token; ít hơn thì bỏ hẳn
+PROMPT_MIN_MEMORY_TOKENS = int(get_env("PROMPT_MIN_MEMORY_TOKENS", 24))
+PROMPT_TOKEN_CALIBRATION_SAMPLE_RATE = float(get_env("PROMPT_TOKEN_CALIBRATION_SAMPLE_RATE", 0.02))
+PROMPT_TOKEN_CALIBRATION_FACTOR = float(get_env("PROMPT_TOKEN_CALIBRATION_FACTOR", 1.0))
+# timeout riêng cho count_tokens khi hiệu chỉnh (không đi qua circuit breaker của gemini)
+PROMPT_TOKEN_CALIBRATION_TIMEOUT = float(get_env("PROMPT_TOKEN_CALIBRATION_TIMEOUT", 5))
+
+_PIECE = re.compile(r"\d|[^\W\d_]+|[^\w\s]")
+_WORD = re.compile(r"[^\W_]+")
+_estimates = LocalLRUCache(max_items=int(get_env("PROMPT_TOKEN_CACHE_ITEMS", 4096)))
+_calibration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="token-calibration")
+
+
+def _raw_estimate(text: str) -> int:
+    tokens = 0
+    for piece in _PIECE.findall(text):
+        if piece.isdigit() or not piece[0].isalnum():
+            tokens += 1
+        elif piece.isascii():
+            tokens += max(1, math.ceil(len(piece) / 4))
+        else:
+            # âm tiết có dấu thường bị tách thành nhiều token
+            tokens += 1 + len(piece) // 3
+    return tokens
+
+
+class TokenCalibration:
+    """Hệ số (token thật / ước lượng thô) học dần bằng trung bình trượt từ count_tokens của Gemini."""
+
+    def __init__(self, factor: float = PROMPT_TOKEN_CALIBRATION_FACTOR, sample_rate: float = PROMPT_TOKEN_CALIBRATION_SAMPLE_RATE,
+                 alpha: float = 0.2):
+        self.factor = factor
+        self.sample_rate = sample_rate
+        self.alpha = alpha
+        self.samples = 0
+        self.last_error: Optional[float] = None
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def should_sample(self) -> bool:
+        if self.sample_rate <= 0:
+            return False
+        with self._lock:
+            self._seen += 1
+            # lấy mẫu đều (không random): prompt đầu tiên luôn được đo để hiệu chỉnh sớm
+            return (self._seen - 1) % max(1, round(1 / self.sample_rate)) == 0
+
+    def update(self, raw_estimate: int, actual: int):
+        if raw_estimate <= 0 or actual <= 0:
+            return
+        ratio = min(max(actual / raw_estimate, 0.25), 4.0)
+        with self._lock:
+            estimated = raw_estimate * self.factor
+            self.last_error = round((estimated - actual) / actual, 4)
+            self.factor = ratio if self.samples == 0 else (1 - self.alpha) * self.factor + self.alpha * ratio
+            self.samples += 1
+
+    def snapshot(self) -> dict:
+        return {"factor": round(self.factor, 4), "samples": self.samples, "last_relative_error": self.last_error}
+
+
+calibration = TokenCalibration()
+
+
+def _raw_cached(text: str) -> int:
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    cached = _estimates.get(key)
+    if cached is None:
+        cached = _raw_estimate(text)
+        _estimates.set(key, cached)
+    return cached
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    return math.ceil(_raw_cached(text) * calibration.factor)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cắt `text` (theo ranh giới từ) để ước lượng không vượt `max_tokens`, thêm "..." nếu có cắt."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(" ".join(words[:mid]) + "...") <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low]).rstrip() + "..." if low else ""
+
+
+@dataclass
+class PromptPlan:
+    memories: List[str]
+    tool_data: Optional[str]
+    budget: int
+    tokens: dict = field(default_factory=dict)
+    dropped_memories: int = 0
+    compressed_memories: int = 0
+
+
+def _memory_value(memory: str, question_words: set, position: int, count: int) -> float:
+    # liên quan tới câu hỏi (tỉ lệ từ chung) là chính, độ mới (memory mới nhất đứng đầu) để phân định
+    words = {w.lower() for w in _WORD.findall(memory)}
+    overlap = len(words & question_words) / len(question_words) if question_words else 0.0
+    recency = 1 - position / count
+    return overlap + 0.25 * recency
+
+
+def plan_prompt(fixed_text: str, question: str, memories: Optional[List[str]] = None,
+                tool_data: Optional[str] = None, budget: int = PROMPT_TOKEN_BUDGET,
+                tool_max_share: float = PROMPT_TOOL_MAX_SHARE) -> PromptPlan:
+    """
+    Chia `budget` token: `fixed_text` (hướng dẫn hệ thống + khối câu hỏi, luôn giữ nguyên); `tool_data` tối đa
+    `tool_max_share` phần còn lại; memory lấp phần cuối theo giá trị giảm dần (độ liên quan tới `question`),
+    giữ thứ tự ban đầu.
+    """
+    memories = [str(m) for m in memories or [] if m]
+    fixed_tokens = estimate_tokens(fixed_text)
+    remaining = max(0, budget - fixed_tokens)
+
+    tool_tokens = 0
+    if tool_data:
+        tool_data = truncate_to_tokens(str(tool_data).strip(), int(remaining * tool_max_share)) \
+            if memories else truncate_to_tokens(str(tool_data).strip(), remaining)
+        tool_tokens = estimate_tokens(tool_data)
+        remaining -= tool_tokens
+
+    question_words = {w.lower() for w in _WORD.findall(question)}
+    ranked = sorted(range(len(memories)),
+                    key=lambda i: _memory_value(memories[i], question_words, i, len(memories)), reverse=True)
+    chosen: dict[int, str] = {}
+    compressed = 0
+    for i in ranked:
+        # mỗi memory là một dòng "- ..." trong prompt
+        cost = estimate_tokens(memories[i]) + 2
+        if cost <= remaining:
+            chosen[i] = memories[i]
+            remaining -= cost
+        elif remaining - 2 >= PROMPT_MIN_MEMORY_TOKENS:
+            shortened = truncate_to_tokens(memories[i], remaining - 2)
+            if shortened:
+                chosen[i] = shortened
+                remaining -= estimate_tokens(shortened) + 2
+                compressed += 1
+
+    kept = [chosen[i] for i in sorted(chosen)]
+    return PromptPlan(
+        memories=kept,
+        tool_data=tool_data or None,
+        budget=budget,
+        tokens={"fixed": fixed_tokens, "tool": tool_tokens, "memories": sum(estimate_tokens(m) + 2 for m in kept)},
+        dropped_memories=len(memories) - len(kept),
+        compressed_memories=compressed,
+    )
+
+
+def _calibrate(count_tokens: Callable[..., object], prompt: str, raw: int):
+    # gọi thẳng, không qua breaker: lỗi hiệu chỉnh không được tính vào việc ngắt mạch gemini
+    # và không chiếm slot của pool gemini (đã chạy trên thread hiệu chỉnh riêng)
+    if get_breaker("gemini").is_open():
+        return
+    try:
+        result = count_tokens(prompt, request_options={"timeout": PROMPT_TOKEN_CALIBRATION_TIMEOUT})
+        calibration.update(raw, int(getattr(result, "total_tokens", 0) or 0))
+    except Exception as e:
+        print(f"Token calibration skipped: {e}")
+
+
+def log_prompt_usage(kind: str, prompt: str, plan: Optional[PromptPlan] = None,
+                     count_tokens: Optional[Callable[[str], object]] = None) -> int:
+    """Ghi log + metrics số token (ước lượng) của prompt; đôi khi gửi count_tokens ở nền để hiệu chỉnh."""
+    raw = _raw_estimate(prompt)
+    tokens = math.ceil(raw * calibration.factor)
+    increment(f"prompt.count.{kind}")
+    increment(f"prompt.tokens.{kind}", tokens)
+    details = ""
+    if plan is not None:
+        increment("prompt.memories_dropped", plan.dropped_memories)
+        increment("prompt.memories_compressed", plan.compressed_memories)
+        details = (f" (budget={plan.budget}, fixed={plan.tokens.get('fixed')}, tool={plan.tokens.get('tool')}, "
+                   f"memories={plan.tokens.get('memories')}, dropped={plan.dropped_memories}, "
+                   f"compressed={plan.compressed_memories})")
+    print(f"Prompt tokens [{kind}]: ~{tokens}{details}")
+    if count_tokens is not None and calibration.should_sample():
+        _calibration_executor.submit(_calibrate, count_tokens, prompt, raw)
+    return tokens
+
+
+register_metrics_source("prompt_tokens", calibration.snapshot)
@@ -0,0 +1,204 @@
+"""Cache phiên chat trong process: giữ conversation, các lượt gần nhất và memory của conversation đang chat.
+
+Trong một cuộc chat, mỗi lượt đọc lại conversation từ Mongo (hai lần: message user và message bot) và 5 memory
+gần nhất từ Weaviate trước khi gọi detect_intent. Cache này giữ các thứ đó theo conversation và được cập nhật
+ngay khi ghi (message mới, memory mới, đổi tiêu đề), nên từ lượt thứ hai không còn lượt đọc nào trước detect_intent.
+
+- Hết hạn sau SESSION_CACHE_TTL_SECONDS không hoạt động (mỗi lần dùng gia hạn lại), LRU tối đa
+  SESSION_CACHE_MAX_SESSIONS phiên, mỗi phiên giữ tối đa SESSION_CACHE_MAX_TURNS lượt.
+- Chỉ trong process: worker khác ghi (xoá conversation, đổi tiêu đề, memory từ /chat/batch) thì phiên ở đây
+  cũ tối đa một TTL. Xoá/đổi tiêu đề qua process này thì cache được cập nhật ngay. Đường ghi không tin cache:
+  MessageService kiểm tra conversation còn tồn tại trong Mongo trước khi ghi và bỏ phiên nếu đã bị xoá.
+- Memory đọc được rỗng không được cache (Weaviate lỗi cũng trả rỗng), trừ conversation vừa tạo trong process.
+
+Metrics (`session_cache` trong /metrics): hit/miss, hit rate, thời gian trung bình một lượt đọc khi miss
+và thời gian ước tính đã tiết kiệm, theo từng loại (conversation, memories).
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+from typing import Callable, Deque, Dict, List, Optional
+
+from app.configurations.settings import get_env
+from app.models.conversation import ConversationInDB
+from app.repositories.conversation_repository import message_preview
+from app.utils.cache_backend import LocalLRUCache
+from app.utils.metrics import register_metrics_source
+
+SESSION_CACHE_ENABLED = get_env("SESSION_CACHE_ENABLED", "true").lower() == "true"
+SESSION_CACHE_MAX_SESSIONS = int(get_env("SESSION_CACHE_MAX_SESSIONS", 1000))
+SESSION_CACHE_TTL_SECONDS = float(get_env("SESSION_CACHE_TTL_SECONDS", 600))
+SESSION_CACHE_MAX_TURNS = int(get_env("SESSION_CACHE_MAX_TURNS", 20))
+
+
+@dataclass
+class ChatSession:
+    conversation: ConversationInDB
+    recent_turns: Deque[dict] = field(default_factory=lambda: deque(maxlen=SESSION_CACHE_MAX_TURNS))
+    # memory mới nhất trước; None = chưa biết (phải đọc Weaviate)
+    memories: Optional[List[dict]] = None
+    memory_owner: Optional[tuple] = None
+    memory_limit: int = 0
+
+
+class _KindStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "avg_miss_ms": round(avg_miss * 1000, 2),
+            "saved_ms": round(self.hits * avg_miss * 1000, 1),
+        }
+
+
+class ConversationSessionCache:
+    def __init__(self, max_sessions: int = SESSION_CACHE_MAX_SESSIONS, ttl_seconds: float = SESSION_CACHE_TTL_SECONDS,
+                 enabled: bool = SESSION_CACHE_ENABLED):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self._sessions = LocalLRUCache(max_items=max_sessions)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _KindStats] = {"conversation": _KindStats(), "memories": _KindStats()}
+
+    def _get(self, convo_id: str) -> Optional[ChatSession]:
+        session = self._sessions.get(convo_id)
+        if session is not None:
+            # hết hạn theo thời gian không hoạt động: mỗi lần dùng gia hạn TTL
+            self._sessions.set(convo_id, session, ttl=self.ttl_seconds)
+        return session
+
+    def _timed_load(self, kind: str, loader: Callable):
+        start = time.perf_counter()
+        try:
+            return loader()
+        finally:
+            with self._lock:
+                stats = self._stats[kind]
+                stats.misses += 1
+                stats.miss_seconds += time.perf_counter() - start
+
+    def _hit(self, kind: str):
+        with self._lock:
+            self._stats[kind].hits += 1
+
+    # ---- đọc -----------------------------------------------------------------
+    def conversation(self, convo_id: str, loader: Callable[[], Optional[ConversationInDB]]) -> Optional[ConversationInDB]:
+        """Conversation từ cache, không có thì gọi `loader` (đọc Mongo) và giữ lại kết quả."""
+        if not self.enabled:
+            return loader()
+        session = self._get(convo_id)
+        if session is not None:
+            self._hit("conversation")
+            return session.conversation
+        conversation = self._timed_load("conversation", loader)
+        if conversation is not None:
+            self.put_conversation(conversation)
+        return conversation
+
+    def memories(self, convo_id: str, email: str, facility_id: Optional[str], limit: int,
+                 loader: Callable[[], List[dict]]) -> List[dict]:
+        """`limit` memory mới nhất của conversation, không có trong cache thì gọi `loader` (đọc Weaviate)."""
+        if not self.enabled:
+            return loader()
+        owner = (email, facility_id)
+        session = self._get(convo_id)
+        if session is not None:
+            with self._lock:
+                cached = session.memories if session.memory_owner == owner and session.memory_limit >= limit \
+                    else None
+            if cached is not None:
+                self._hit("memories")
+                return cached[:limit]
+        memories = self._timed_load("memories", loader)
+        # rỗng có thể là Weaviate lỗi: không cache để lượt sau đọc lại
+        if session is not None and memories:
+            with self._lock:
+                session.memories = list(memories)
+                session.memory_owner = owner
+                session.memory_limit = limit
+        return memories
+
+    def recent_turns(self, convo_id: str) -> List[dict]:
+        session = self._sessions.get(convo_id) if self.enabled else None
+        if session is None:
+            return []
+        with self._lock:
+            return list(session.recent_turns)
+
+    # ---- cập nhật khi ghi ------------------------------------------------------
+    def put_conversation(self, conversation: ConversationInDB, new: bool = False):
+        if not self.enabled:
+            return
+        session = ChatSession(conversation=conversation)
+        if new:
+            # conversation vừa tạo chưa có memory nào
+            session.memories = []
+            session.memory_owner = (conversation.email, conversation.facilityID)
+            session.memory_limit = SESSION_CACHE_MAX_TURNS
+        self._sessions.set(str(conversation.id), session, ttl=self.ttl_seconds)
+
+    def record_message(self, convo_id: str, content: str, sender_type: str, timestamp: datetime):
+        """Cập nhật tóm tắt conversation trong cache giống ConversationRepository.record_messages."""
+        session = self._sessions.get(convo_id) if self.enabled else None
+        if session is None:
+            return
+        with self._lock:
+            convo = session.conversation
+            if convo.message_count is not None:
+                convo.message_count += 1
+            convo.updated_at = max(_aware(convo.updated_at), _aware(timestamp))
+            if convo.last_message_at is None or _aware(timestamp) >= _aware(convo.last_message_at):
+                convo.last_message_at = timestamp
+                convo.last_message_preview = message_preview(content)
+                convo.last_sender = sender_type
+            session.recent_turns.append({"sender_type": sender_type, "content": content,
+                                         "timestamp": timestamp})
+
+    def record_memory(self, convo_id: str, memory: dict):
+        """Memory vừa ghi vào Weaviate: thêm lên đầu danh sách đã cache (nếu danh sách đang được cache)."""
+        session = self._sessions.get(convo_id) if self.enabled else None
+        if session is None:
+            return
+        with self._lock:
+            if session.memories is not None:
+                session.memories = ([memory] + session.memories)[:session.memory_limit]
+
+    def forget_memories(self, convo_id: str):
+        """Memory được ghi theo đường không theo dõi được từng object (lô): lượt sau đọc lại từ Weaviate."""
+        session = self._sessions.get(convo_id) if self.enabled else None
+        if session is not None:
+            with self._lock:
+                session.memories = None
+
+    def update_title(self, convo_id: str, title: str):
+        session = self._sessions.get(convo_id) if self.enabled else None
+        if session is not None:
+            with self._lock:
+                session.conversation.title = title
+
+    def invalidate(self, convo_id: str):
+        self._sessions.delete(convo_id)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            kinds = {kind: stats.snapshot() for kind, stats in self._stats.items()}
+        return {"enabled": self.enabled, "sessions": len(self._sessions), "ttl_seconds": self.ttl_seconds, **kinds}
+
+
+def _aware(value: datetime) -> datetime:
+    # Mongo trả datetime naive (UTC), còn timestamp mới ghi là aware
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value
+
+
+session_cache = ConversationSessionCache()
+register_metrics_source("session_cache", session_cache.snapshot)
@@ -0,0 +1,242 @@
+"""Tra cứu đón đầu trong lúc chờ detect_intent: trace của đàn và tri thức chạy song song với lượt gọi LLM.
+
+Câu hỏi thường đã lộ mã đàn (H001, ASSET_HEO_001) hoặc tuổi ("35 ngày"). Trước khi gọi detect_intent,
+`speculative_prefetch.start` trích các ứng viên đó bằng regex và chạy trước ở thread pool:
+- trace: `prefetch_asset` (snapshot của facility hoặc trace API vào cache trace đã parse), cho tối đa
+  SPECULATIVE_MAX_BATCH_CANDIDATES mã đàn; cần ASSET_TRACE_CACHE_TTL_SECONDS > 0 để handler dùng lại kết quả.
+- knowledge: `search_knowledge_base(question, facility)` khi câu hỏi có tuổi "N ngày".
+Khi có intent, `resolve` giữ đúng kết quả khớp (chờ nốt nếu còn đang chạy, để handler không gọi lại),
+huỷ phần chưa chạy và tính phần còn lại là lãng phí. Trace chỉ được tính là đã dùng khi handler sẽ đọc đúng thứ
+đã nạp: get_history_range luôn đọc cache của trace API, nên trace lấy từ snapshot (hoặc lỗi) là lãng phí.
+
+Giới hạn lãng phí:
+- tối đa SPECULATIVE_MAX_INFLIGHT tác vụ đón đầu cùng lúc trong process (quá thì bỏ qua, không xếp hàng);
+- mỗi loại giữ cửa sổ SPECULATIVE_WINDOW kết quả gần nhất; tỉ lệ lãng phí vượt SPECULATIVE_MAX_WASTE_RATIO
+  thì chỉ đón đầu một trên SPECULATIVE_PROBE_EVERY câu hỏi (để tỉ lệ có thể phục hồi).
+
+Metrics (`speculative_prefetch` trong /metrics): started/used/wasted/cancelled/skipped theo loại, tỉ lệ lãng phí,
+thời gian đã tiết kiệm (phần tác vụ chạy xong trước khi có intent) và thời gian tác vụ lãng phí.
+"""
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.configurations.settings import get_env
+from app.services.farm_weaviate_service import extract_age_days, search_knowledge_base
+from app.services.gemini_service import ASSET_TRACE_CACHE_TTL_SECONDS, TRACE_SOURCE_API, prefetch_asset
+from app.utils.metrics import increment, register_metrics_source
+
+SPECULATIVE_PREFETCH_ENABLED = get_env("SPECULATIVE_PREFETCH_ENABLED", "true").lower() == "true"
+SPECULATIVE_MAX_INFLIGHT = int(get_env("SPECULATIVE_MAX_INFLIGHT", 8))
+SPECULATIVE_MAX_BATCH_CANDIDATES = int(get_env("SPECULATIVE_MAX_BATCH_CANDIDATES", 2))
+SPECULATIVE_MAX_WASTE_RATIO = float(get_env("SPECULATIVE_MAX_WASTE_RATIO", 0.5))
+SPECULATIVE_WINDOW = int(get_env("SPECULATIVE_WINDOW", 200))
+SPECULATIVE_PROBE_EVERY = int(get_env("SPECULATIVE_PROBE_EVERY", 10))
+
+KIND_TRACE = "trace"
+KIND_KNOWLEDGE = "knowledge"
+TRACE_INTENTS = ("get_feed_info", "get_medication_info", "get_history_range")
+KNOWLEDGE_INTENTS = ("suggest_feed", "suggest_medication")
+
+# mã đàn: bắt đầu bằng chữ, có ít nhất một chữ số (H001, B012, ASSET_HEO_001)
+_BATCH_ID = re.compile(r"\b[A-Za-z][A-Za-z_-]*\d[A-Za-z0-9_-]*\b")
+
+
+def extract_batch_candidates(question: str, limit: int = SPECULATIVE_MAX_BATCH_CANDIDATES) -> List[str]:
+    return list(dict.fromkeys(_BATCH_ID.findall(question)))[:limit]
+
+
+class _Task:
+    def __init__(self, kind: str, key: str, future: Optional[Future]):
+        self.kind = kind
+        self.key = key
+        self.future = future
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+
+class _KindStats:
+    def __init__(self):
+        self.outcomes: deque = deque(maxlen=SPECULATIVE_WINDOW)
+        self.requests = 0
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.saved_seconds = 0.0
+        self.wasted_seconds = 0.0
+
+    def waste_ratio(self) -> Optional[float]:
+        if len(self.outcomes) < 20:
+            return None
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def snapshot(self) -> dict:
+        ratio = self.waste_ratio()
+        return {
+            "started": self.started, "used": self.used, "wasted": self.wasted, "cancelled": self.cancelled,
+            "skipped": self.skipped,
+            "waste_ratio": round(ratio, 4) if ratio is not None else None,
+            "saved_ms": round(self.saved_seconds * 1000, 1),
+            "wasted_ms": round(self.wasted_seconds * 1000, 1),
+        }
+
+
+class Speculation:
+    """Các tác vụ đón đầu của một câu hỏi; gọi `resolve` đúng một lần khi đã có intent."""
+
+    def __init__(self, owner: "SpeculativePrefetcher", question: str, facility_id: str, tasks: List[_Task]):
+        self._owner = owner
+        self.question = question
+        self.facility_id = facility_id
+        self.tasks = tasks
+        self._resolved = False
+
+    async def resolve(self, intent_data: dict) -> Optional[Callable[[str], Optional[dict]]]:
+        """
+        Giữ kết quả khớp với intent, bỏ phần còn lại. Trả về `knowledge_lookup` cho answer_for_intent
+        nếu tra cứu tri thức đón đầu khớp, ngược lại None.
+        """
+        if self._resolved:
+            return None
+        self._resolved = True
+        resolved_at = time.perf_counter()
+        intent = intent_data.get("intent", "unknown")
+        batch_id = (intent_data.get("entities") or {}).get("batch_id")
+        knowledge_lookup = None
+        for task in self.tasks:
+            matched = (task.kind == KIND_TRACE and intent in TRACE_INTENTS and task.key == batch_id) or \
+                      (task.kind == KIND_KNOWLEDGE and intent in KNOWLEDGE_INTENTS)
+            if not matched:
+                self._owner._discard(task)
+                continue
+            if task.kind == KIND_KNOWLEDGE:
+                self._owner._use(task, resolved_at)
+                knowledge_lookup = self._knowledge_lookup(task.future)
+                continue
+            # trace đang tải: chờ nốt (không chặn event loop) để handler lấy từ cache thay vì gọi trace API lần nữa
+            try:
+                source = await asyncio.wrap_future(task.future)
+            except Exception as e:
+                print(f"Speculative trace prefetch for {task.key} failed: {e}")
+                source = None
+            if source is None or (intent == "get_history_range" and source != TRACE_SOURCE_API):
+                # handler sẽ tự gọi trace API: kết quả đón đầu không được dùng
+                self._owner._discard(task)
+            else:
+                self._owner._use(task, resolved_at)
+        return knowledge_lookup
+
+    def discard(self):
+        """Bỏ toàn bộ (request lỗi trước khi có intent)."""
+        if not self._resolved:
+            self._resolved = True
+            for task in self.tasks:
+                self._owner._discard(task)
+
+    def _knowledge_lookup(self, future: Future) -> Callable[[str], Optional[dict]]:
+        facility_id = self.facility_id
+
+        def lookup(question: str) -> Optional[dict]:
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"Speculative knowledge search failed, searching again: {e}")
+                return search_knowledge_base(question, facility_id)
+
+        return lookup
+
+
+class SpeculativePrefetcher:
+    def __init__(self, enabled: bool = SPECULATIVE_PREFETCH_ENABLED, max_inflight: int = SPECULATIVE_MAX_INFLIGHT,
+                 max_waste_ratio: float = SPECULATIVE_MAX_WASTE_RATIO, probe_every: int = SPECULATIVE_PROBE_EVERY):
+        self.enabled = enabled and max_inflight > 0
+        self.max_inflight = max_inflight
+        self.max_waste_ratio = max_waste_ratio
+        self.probe_every = max(1, probe_every)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_inflight), thread_name_prefix="speculative")
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _KindStats] = {KIND_TRACE: _KindStats(), KIND_KNOWLEDGE: _KindStats()}
+
+    def _allowed(self, kind: str) -> bool:
+        with self._lock:
+            stats = self._stats[kind]
+            stats.requests += 1
+            ratio = stats.waste_ratio()
+            # lãng phí quá ngưỡng: chỉ thử một trên probe_every câu hỏi
+            if ratio is not None and ratio > self.max_waste_ratio and stats.requests % self.probe_every:
+                stats.skipped += 1
+                return False
+            if self._inflight >= self.max_inflight:
+                stats.skipped += 1
+                return False
+            self._inflight += 1
+            stats.started += 1
+            return True
+
+    def _submit(self, kind: str, key: str, fn: Callable, *args) -> _Task:
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                task.finished = time.perf_counter()
+                with self._lock:
+                    self._inflight -= 1
+
+        task = _Task(kind, key, None)
+        task.future = self._executor.submit(run)
+        increment(f"speculative.{kind}.started")
+        return task
+
+    def start(self, question: str, facility_id: Optional[str]) -> Speculation:
+        tasks: List[_Task] = []
+        if self.enabled and facility_id:
+            if ASSET_TRACE_CACHE_TTL_SECONDS > 0:
+                for batch_id in extract_batch_candidates(question):
+                    if self._allowed(KIND_TRACE):
+                        tasks.append(self._submit(KIND_TRACE, batch_id, prefetch_asset, batch_id, facility_id))
+            if extract_age_days(question) is not None and self._allowed(KIND_KNOWLEDGE):
+                tasks.append(self._submit(KIND_KNOWLEDGE, question, search_knowledge_base, question, facility_id))
+        return Speculation(self, question, facility_id, tasks)
+
+    def _use(self, task: _Task, resolved_at: float):
+        with self._lock:
+            stats = self._stats[task.kind]
+            stats.used += 1
+            stats.outcomes.append(1)
+            # phần tác vụ đã chạy trước khi có intent là thời gian tiết kiệm được
+            stats.saved_seconds += min(task.finished or resolved_at, resolved_at) - task.started
+        increment(f"speculative.{task.kind}.used")
+
+    def _discard(self, task: _Task):
+        cancelled = task.future.cancel()
+        with self._lock:
+            stats = self._stats[task.kind]
+            if cancelled:
+                # chưa chạy: không tốn gì, không tính vào tỉ lệ lãng phí
+                stats.cancelled += 1
+                self._inflight -= 1
+            else:
+                # đã chạy (hoặc đang chạy, không huỷ được): tính là lãng phí; kết quả vẫn vào cache
+                stats.outcomes.append(0)
+                stats.wasted += 1
+                stats.wasted_seconds += (task.finished or time.perf_counter()) - task.started
+        increment(f"speculative.{task.kind}.{'cancelled' if cancelled else 'wasted'}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, "inflight": self._inflight,
+                    **{kind: stats.snapshot() for kind, stats in self._stats.items()}}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+speculative_prefetch = SpeculativePrefetcher()
+register_metrics_source("speculative_prefetch", speculative_prefetch.snapshot)
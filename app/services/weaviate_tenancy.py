@@ -0,0 +1,126 @@
+"""Định tuyến truy vấn Weaviate theo tenant (một tenant cho mỗi facility) khi bật WEAVIATE_MULTI_TENANCY.
+
+Mặc định (false) mọi facility dùng chung một collection và lọc bằng `facilityID` / `email` như trước.
+Khi bật, FarmingKnowledge và ChatMemory được tạo với multi-tenancy: mỗi facility có HNSW index riêng
+nên truy vấn không phải duyệt đồ thị chung rồi lọc lại, và tenant của facility không hoạt động có thể
+chuyển sang INACTIVE/OFFLOADED để giải phóng bộ nhớ (auto activation bật lại khi được truy cập).
+
+Chuyển dữ liệu cũ sang schema multi-tenant bằng `python -m app.utils.migrate_weaviate_tenancy`.
+"""
+import hashlib
+import re
+from typing import Iterator, Optional
+
+from app.configurations.settings import get_env
+from app.utils.metrics import increment
+
+WEAVIATE_MULTI_TENANCY = get_env("WEAVIATE_MULTI_TENANCY", "false").lower() == "true"
+
+_TENANT_INVALID_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+_TENANT_MAX_LENGTH = 64
+
+
+class TenantRequiredError(ValueError):
+    """Collection đang ở chế độ multi-tenant nhưng caller không cung cấp facility."""
+
+
+def multi_tenancy_enabled() -> bool:
+    return WEAVIATE_MULTI_TENANCY
+
+
+def tenant_name(facility_id: str) -> str:
+    """Tên tenant hợp lệ (A-Z, a-z, 0-9, _, -; tối đa 64 ký tự) và ổn định cho một facilityID."""
+    name = _TENANT_INVALID_CHARS.sub("_", facility_id.strip())
+    if len(name) > _TENANT_MAX_LENGTH or name != facility_id:
+        # thêm hash ngắn để hai facilityID khác nhau không trùng tên sau khi thay ký tự
+        digest = hashlib.sha1(facility_id.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:_TENANT_MAX_LENGTH - 9]}-{digest}"
+    return name
+
+
+def get_multi_tenancy_config():
+    """Cấu hình multi-tenancy khi tạo collection; None = collection dùng chung như trước."""
+    if not WEAVIATE_MULTI_TENANCY:
+        return None
+    from weaviate.classes.config import Configure
+
+    return Configure.multi_tenancy(enabled=True, auto_tenant_creation=True, auto_tenant_activation=True)
+
+
+def tenant_collection(client, collection_name: str, facility_id: Optional[str]):
+    """Collection đã gắn tenant của facility (multi-tenant) hoặc collection dùng chung."""
+    collection = client.collections.get(collection_name)
+    if not WEAVIATE_MULTI_TENANCY:
+        return collection
+    if not facility_id:
+        raise TenantRequiredError(f"Collection '{collection_name}' is multi-tenant; a facility is required.")
+    return collection.with_tenant(tenant_name(facility_id))
+
+
+def facility_filter(facility_id: str):
+    """Filter theo facilityID cho collection dùng chung; None khi đã định tuyến theo tenant."""
+    if WEAVIATE_MULTI_TENANCY:
+        return None
+    from weaviate.classes.query import Filter
+
+    return Filter.by_property("facilityID").equal(facility_id)
+
+
+def is_missing_tenant_error(error: Exception) -> bool:
+    """Truy vấn vào tenant chưa tồn tại (facility chưa có dữ liệu) — caller coi như kết quả rỗng."""
+    message = str(error).lower()
+    return WEAVIATE_MULTI_TENANCY and "tenant" in message and ("not found" in message or "does not exist" in message)
+
+
+def combine_filters(*filters):
+    combined = None
+    for f in filters:
+        if f is None:
+            continue
+        combined = f if combined is None else combined & f
+    return combined
+
+
+def iter_tenant_collections(client, collection_name: str) -> Iterator:
+    """
+    Duyệt mọi phần dữ liệu của collection: từng tenant đang ACTIVE, hoặc chính collection nếu dùng chung.
+    Tenant INACTIVE/OFFLOADED bị bỏ qua (duyệt sẽ phải nạp lại chúng vào bộ nhớ); số tenant bị bỏ được log
+    và cộng vào metrics `weaviate.tenants_skipped_inactive`.
+    """
+    collection = client.collections.get(collection_name)
+    if not WEAVIATE_MULTI_TENANCY:
+        yield collection
+        return
+    from weaviate.classes.tenants import TenantActivityStatus
+
+    skipped = 0
+    for name, tenant in collection.tenants.get().items():
+        if tenant.activity_status == TenantActivityStatus.ACTIVE:
+            yield collection.with_tenant(name)
+        else:
+            skipped += 1
+    if skipped:
+        increment("weaviate.tenants_skipped_inactive", skipped)
+        print(f"{collection_name}: bỏ qua {skipped} tenant không ACTIVE (chưa được compaction/dọn dẹp).")
+
+
+def ensure_tenants(collection, facility_ids) -> list[str]:
+    """Tạo các tenant còn thiếu cho danh sách facility; trả về tên tenant vừa tạo."""
+    from weaviate.classes.tenants import Tenant
+
+    existing = set(collection.tenants.get())
+    missing = sorted({tenant_name(f) for f in facility_ids if f} - existing)
+    if missing:
+        collection.tenants.create([Tenant(name=name) for name in missing])
+    return missing
+
+
+def set_tenant_activity(collection, facility_ids, status) -> list[str]:
+    """Đổi trạng thái (ACTIVE / INACTIVE / OFFLOADED) cho tenant của các facility đã tồn tại."""
+    from weaviate.classes.tenants import Tenant
+
+    existing = set(collection.tenants.get())
+    names = sorted({tenant_name(f) for f in facility_ids if f} & existing)
+    if names:
+        collection.tenants.update([Tenant(name=name, activity_status=status) for name in names])
+    return names
@@ -0,0 +1,33 @@
+"""Chuyển message cũ sang tầng lưu trữ lạnh (`messages_archive`), dùng cho cron.
+
+    python -m app.utils.archive_messages --dry-run
+    python -m app.utils.archive_messages --days 90 --max-conversations 2000
+    python -m app.utils.archive_messages --stats
+"""
+from app.configurations.mongo_config import init_mongo_client, get_db, close_mongo_client
+from app.repositories.message_archive_repository import MessageArchiveRepository
+from app.services.message_retention_service import MESSAGE_ARCHIVE_BUCKET_SIZE, MESSAGE_RETENTION_DAYS, \
+    MESSAGE_RETENTION_MAX_CONVERSATIONS, MessageRetentionService
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Lưu trữ lạnh message cũ")
+    parser.add_argument("--days", type=int, default=MESSAGE_RETENTION_DAYS)
+    parser.add_argument("--bucket-size", type=int, default=MESSAGE_ARCHIVE_BUCKET_SIZE)
+    parser.add_argument("--max-conversations", type=int, default=MESSAGE_RETENTION_MAX_CONVERSATIONS)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--stats", action="store_true", help="Chỉ in dung lượng của tầng lưu trữ")
+    args = parser.parse_args()
+
+    init_mongo_client()
+    try:
+        if not args.stats:
+            MessageRetentionService(retention_days=args.days, bucket_size=args.bucket_size,
+                                    max_conversations=args.max_conversations).run_once(dry_run=args.dry_run)
+        stats = MessageArchiveRepository(get_db()).stats()
+        ratio = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        print(f"messages_archive: {stats} (nén {ratio:.1f}x)")
+    finally:
+        close_mongo_client()
+        print("Đã đóng kết nối.")
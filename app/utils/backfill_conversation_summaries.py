@@ -0,0 +1,70 @@
+"""Tính message_count / last_message_preview / last_sender cho các conversation có từ trước khi có tóm tắt.
+
+    python -m app.utils.backfill_conversation_summaries --dry-run
+    python -m app.utils.backfill_conversation_summaries --max-ops-per-second 50
+    python -m app.utils.backfill_conversation_summaries --recount   # tính lại cả conversation đã có tóm tắt
+
+Mặc định chỉ ghi vào conversation chưa có `message_count` (điều kiện nằm trong lệnh update), nên chạy lại
+an toàn và không đè số đếm do record_messages đang duy trì. Đọc qua get_message_repository nên đếm được
+cả tầng lưu trữ lạnh lẫn layout bucket.
+"""
+from app.configurations.mongo_config import init_mongo_client, get_db, close_mongo_client
+from app.repositories.conversation_repository import ConversationRepository
+from app.repositories.message_repository import get_message_repository
+from app.services.cleanup_service import CLEANUP_MAX_OPS_PER_SECOND, RateLimiter
+
+
+def backfill(recount: bool = False, dry_run: bool = False, batch_size: int = 500,
+             max_ops_per_second: float = CLEANUP_MAX_OPS_PER_SECOND) -> dict:
+    db = get_db()
+    conversations = ConversationRepository(db)
+    messages = get_message_repository(db)
+    limiter = RateLimiter(max_ops_per_second)
+    query = {} if recount else {"message_count": {"$exists": False}}
+    stats = {"scanned": 0, "updated": 0, "messages": 0}
+
+    last_id = None
+    while True:
+        page_query = dict(query)
+        if last_id is not None:
+            page_query["_id"] = {"$gt": last_id}
+        ids = [doc["_id"] for doc in conversations.collection.find(page_query, {"_id": 1}).sort("_id", 1)
+               .limit(batch_size)]
+        if not ids:
+            break
+        last_id = ids[-1]
+        for convo_id in ids:
+            limiter.wait()
+            stats["scanned"] += 1
+            _, total = messages.get_page_by_conversation(convo_id, 0, 0)
+            last_page, _ = messages.get_page_by_conversation(convo_id, total - 1, 1) if total else ([], 0)
+            last = last_page[0] if last_page else None
+            stats["messages"] += total
+            if dry_run:
+                continue
+            summary = {"timestamp": last.timestamp, "content": last.content,
+                       "sender_type": last.sender_type} if last else None
+            if conversations.set_summary(convo_id, total, summary, only_missing=not recount):
+                stats["updated"] += 1
+
+    print(f"Backfill conversation summaries{' (dry run)' if dry_run else ''}: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill tóm tắt conversation")
+    parser.add_argument("--recount", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-ops-per-second", type=float, default=CLEANUP_MAX_OPS_PER_SECOND)
+    args = parser.parse_args()
+
+    init_mongo_client()
+    try:
+        backfill(recount=args.recount, dry_run=args.dry_run, batch_size=args.batch_size,
+                 max_ops_per_second=args.max_ops_per_second)
+    finally:
+        close_mongo_client()
+        print("Đã đóng kết nối.")
@@ -0,0 +1,178 @@
+"""Cache backend có thể thay thế: LRU trong process hoặc store tương thích Redis dùng chung giữa các worker.
+
+Chọn backend bằng biến môi trường:
+- CACHE_BACKEND=local (mặc định): LRU trong bộ nhớ của từng process.
+- CACHE_BACKEND=redis: dùng CACHE_REDIS_URL (Redis, Valkey, KeyDB... hoặc một stand-in cục bộ nói giao thức Redis).
+
+Giá trị được lưu phải serialize được bằng orjson khi dùng backend redis.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
+
+from app.configurations.settings import get_env
+
+CACHE_BACKEND = get_env("CACHE_BACKEND", "local").lower()
+CACHE_REDIS_URL = get_env("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_DEFAULT_MAX_ITEMS = int(get_env("CACHE_DEFAULT_MAX_ITEMS", 1024))
+
+
+class CacheBackend(ABC):
+    """Interface chung cho các cache backend."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class LocalLRUCache(CacheBackend):
+    """LRU thread-safe trong process, hỗ trợ TTL theo từng key."""
+
+    def __init__(self, max_items: int = CACHE_DEFAULT_MAX_ITEMS):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache dùng chung giữa các worker qua một store tương thích Redis.
+    Lỗi kết nối khi đọc/ghi được log và coi như miss/no-op: cache không bao giờ làm hỏng request.
+    """
+
+    def __init__(self, url: str = CACHE_REDIS_URL, namespace: str = "default"):
+        # import lười: redis là dependency tuỳ chọn, chỉ cần khi CACHE_BACKEND=redis
+        import redis
+
+        self._errors = redis.RedisError
+        self._client = redis.Redis.from_url(url)
+        # from_url kết nối lười: ping ngay để get_cache fallback về LRU khi store không tới được
+        self._client.ping()
+        self._namespace = namespace
+        self._prefix = f"meatscm:{namespace}:"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._client.get(self._prefix + key)
+        except self._errors as e:
+            print(f"Redis cache '{self._namespace}' get failed, treating as miss: {e}")
+            return None
+        if raw is None:
+            return None
+        return orjson.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        payload = orjson.dumps(value)
+        try:
+            if ttl:
+                self._client.set(self._prefix + key, payload, px=int(ttl * 1000))
+            else:
+                self._client.set(self._prefix + key, payload)
+        except self._errors as e:
+            print(f"Redis cache '{self._namespace}' set failed, skipping: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self._client.delete(self._prefix + key)
+        except self._errors as e:
+            print(f"Redis cache '{self._namespace}' delete failed, skipping: {e}")
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=self._prefix + "*"):
+            self._client.delete(key)
+
+    def close(self) -> None:
+        try:
+            self._client.close()
+        except Exception as e:
+            print(f"Error closing Redis cache client: {e}")
+
+
+# Các cache theo namespace của process hiện tại, tạo lười để không mở kết nối trước khi fork.
+_caches: Dict[str, CacheBackend] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace: str, max_items: int = CACHE_DEFAULT_MAX_ITEMS) -> CacheBackend:
+    """
+    Trả về cache cho `namespace` theo backend đã cấu hình. An toàn để gọi nhiều lần.
+    Nếu không kết nối được Redis thì fallback về LRU trong process.
+    """
+    cache = _caches.get(namespace)
+    if cache is not None:
+        return cache
+
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is not None:
+            return cache
+
+        if CACHE_BACKEND == "redis":
+            try:
+                cache = RedisCache(CACHE_REDIS_URL, namespace=namespace)
+            except Exception as e:
+                print(f"Could not init Redis cache '{namespace}', falling back to local LRU: {e}")
+                cache = None
+        if cache is None:
+            cache = LocalLRUCache(max_items=max_items)
+
+        _caches[namespace] = cache
+        return cache
+
+
+def close_caches():
+    """Đóng và bỏ toàn bộ cache của process hiện tại (gọi khi shutdown)."""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
@@ -0,0 +1,214 @@
+"""Circuit breaker cho từng dependency bên ngoài (Weaviate, trace API, Gemini).
+
+- CLOSED: gọi bình thường; đủ `failure_threshold` lỗi liên tiếp (kể cả timeout) thì chuyển OPEN.
+- OPEN: từ chối ngay bằng `CircuitOpenError` (tốn vài micro giây thay vì chờ timeout).
+- HALF_OPEN: sau `reset_timeout` giây cho đúng một lời gọi thử; thành công thì CLOSED, lỗi thì OPEN lại.
+
+Mỗi breaker có pool riêng tối đa `max_workers` thread: dependency chậm chỉ chiếm pool của chính nó. Khi pool
+đã đầy (kể cả bởi thread đã timeout nhưng vẫn chạy nốt), lời gọi mới bị từ chối ngay thay vì xếp hàng, nên thời
+gian chờ không bị tính vào `call_timeout`.
+
+Cấu hình theo dependency qua biến môi trường, ví dụ BREAKER_TRACE_API_CALL_TIMEOUT=4.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from app.configurations.settings import get_env
+from app.utils.metrics import register_metrics_source
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# call_timeout tính cho cả lời gọi (bao gồm retry bên trong): get_asset_trace thử tối đa 3 lần × 5 s
+DEFAULT_BREAKER_CONFIG: Dict[str, Dict[str, float]] = {
+    "weaviate": {"failure_threshold": 3, "reset_timeout": 15, "call_timeout": 3, "max_workers": 16},
+    "trace_api": {"failure_threshold": 2, "reset_timeout": 30, "call_timeout": 16, "max_workers": 8},
+    "gemini": {"failure_threshold": 3, "reset_timeout": 20, "call_timeout": 30, "max_workers": 16},
+}
+# số thread tối đa cho breaker không có cấu hình riêng
+BREAKER_MAX_WORKERS = int(get_env("BREAKER_MAX_WORKERS", 8))
+
+
+class CircuitOpenError(Exception):
+    """Dependency đang bị ngắt mạch; caller nên trả lời ở chế độ degraded."""
+
+
+class CircuitSaturatedError(CircuitOpenError):
+    """Pool của breaker đã đầy; từ chối ngay, không tính là lỗi của dependency."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30,
+                 call_timeout: Optional[float] = None, max_workers: int = BREAKER_MAX_WORKERS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.max_workers = max_workers
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        # chỉ lời gọi thử (trial) tự xoá cờ này khi kết thúc, để không bao giờ có hai lời gọi thử cùng lúc
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0, "rejected": 0, "saturated": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        """True khi lời gọi tiếp theo chắc chắn bị từ chối."""
+        return self.state == OPEN
+
+    def _allow_request(self) -> Optional[bool]:
+        """None nếu bị từ chối; ngược lại True khi lời gọi này là lời gọi thử của HALF_OPEN."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._stats["rejected"] += 1
+            return None
+
+    def _end_trial(self, trial: bool):
+        if trial:
+            with self._lock:
+                self._trial_in_flight = False
+
+    def record_success(self, trial: bool = False):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            self._state = CLOSED
+            if trial:
+                self._trial_in_flight = False
+
+    def record_failure(self, timed_out: bool = False, trial: bool = False):
+        with self._lock:
+            self._stats["failures"] += 1
+            if timed_out:
+                self._stats["timeouts"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"Circuit '{self.name}' opened after {self._failures} failure(s).")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            if trial:
+                self._trial_in_flight = False
+
+    def record_probe(self, up: bool):
+        """
+        Kết quả từ health prober: probe lỗi thì mở mạch ngay, probe ổn thì cho phép gọi thử.
+        Không đụng tới lời gọi thử đang chạy (nếu có): nó tự kết thúc trạng thái HALF_OPEN.
+        """
+        with self._lock:
+            if not up and self._state != OPEN:
+                print(f"Circuit '{self.name}' opened by health probe.")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            elif up and self._state == OPEN:
+                self._state = HALF_OPEN
+
+    def _submit(self, fn: Callable[..., Any], *args, **kwargs):
+        # slot được trả khi thread chạy xong (không phải khi timeout): pool đầy thì từ chối ngay
+        if not self._slots.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._slots.release()
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f"breaker-{self.name}")
+            executor = self._executor
+        try:
+            return executor.submit(run)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        trial = self._allow_request()
+        if trial is None:
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+        try:
+            future = self._submit(fn, *args, **kwargs) if self.call_timeout else None
+        except Exception:
+            self._end_trial(trial)
+            raise
+        if self.call_timeout and future is None:
+            self._end_trial(trial)
+            with self._lock:
+                self._stats["saturated"] += 1
+            raise CircuitSaturatedError(f"Circuit '{self.name}' has no free worker ({self.max_workers} busy)")
+
+        with self._lock:
+            self._stats["calls"] += 1
+        try:
+            result = future.result(timeout=self.call_timeout) if future is not None else fn(*args, **kwargs)
+        except FutureTimeoutError:
+            self.record_failure(timed_out=True, trial=trial)
+            raise TimeoutError(f"{self.name} call timed out after {self.call_timeout}s")
+        except Exception:
+            self.record_failure(trial=trial)
+            raise
+        self.record_success(trial=trial)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, **self._stats}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _config_for(name: str) -> Dict[str, float]:
+    config = dict(DEFAULT_BREAKER_CONFIG.get(name, {}))
+    prefix = f"BREAKER_{name.upper()}_"
+    for key in ("failure_threshold", "reset_timeout", "call_timeout", "max_workers"):
+        value = get_env(prefix + key.upper())
+        if value is not None:
+            config[key] = float(value)
+    for key in ("failure_threshold", "max_workers"):
+        if key in config:
+            config[key] = int(config[key])
+    return config
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **_config_for(name))
+                _breakers[name] = breaker
+    return breaker
+
+
+def breakers_snapshot() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+register_metrics_source("circuit_breakers", breakers_snapshot)
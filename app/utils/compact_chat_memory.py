@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, UTC
+
+from weaviate.classes.query import Filter
+
+from app.configurations.weaviate_config import init_weaviate_client, close_weaviate_client
+from app.services.memory_policy import MEMORY_TTL_DAYS, content_hash, is_boilerplate
+from app.services.weaviate_tenancy import iter_tenant_collections
+
+collection_name = "ChatMemory"
+
+
+def _count(collection) -> int:
+    return collection.aggregate.over_all(total_count=True).total_count
+
+
+def _delete_ids(collection, ids: list, dry_run: bool) -> int:
+    if not ids or dry_run:
+        return len(ids)
+    result = collection.data.delete_many(where=Filter.by_id().contains_any(ids))
+    return result.successful
+
+
+def _compact_collection(collection, now: datetime, dry_run: bool, batch_size: int, ttl_days: int):
+    tenant = getattr(collection, "tenant", None)
+    label = f"{collection_name}[{tenant}]" if tenant else collection_name
+    before = _count(collection)
+
+    expired = collection.data.delete_many(
+        where=Filter.by_property("expiresAt").less_than(now),
+        dry_run=dry_run,
+    )
+    print(f"{label} - memory hết hạn: {expired.matches}")
+
+    legacy_cutoff = now - timedelta(days=ttl_days)
+    seen = set()
+    pending = []
+    removed = {"boilerplate": 0, "duplicate": 0, "legacy_expired": 0}
+    deleted = 0
+
+    for obj in collection.iterator(
+        return_properties=["email", "conversationID", "content", "createdAt", "contentHash", "expiresAt"]
+    ):
+        props = obj.properties
+        content = props.get("content") or ""
+        key = (props.get("email"), props.get("conversationID"), props.get("contentHash") or content_hash(content))
+        created_at = props.get("createdAt")
+
+        if is_boilerplate(content):
+            removed["boilerplate"] += 1
+        elif key in seen:
+            removed["duplicate"] += 1
+        elif props.get("expiresAt") is None and created_at is not None and created_at < legacy_cutoff:
+            removed["legacy_expired"] += 1
+        else:
+            seen.add(key)
+            continue
+
+        pending.append(obj.uuid)
+        if len(pending) >= batch_size:
+            deleted += _delete_ids(collection, pending, dry_run)
+            pending = []
+
+    deleted += _delete_ids(collection, pending, dry_run)
+    after = before if dry_run else _count(collection)
+    print(f"Đã xoá {deleted} memory cũ: {removed}")
+    print(f"Kích thước {label}: {before} -> {after}{' (dry run)' if dry_run else ''}")
+
+
+def compact_chat_memory(dry_run: bool = False, batch_size: int = 500, ttl_days: int = MEMORY_TTL_DAYS):
+    """
+    Dọn ChatMemory:
+    1. Xoá memory đã quá `expiresAt`.
+    2. Với dữ liệu cũ (trước khi có memory policy): xoá câu mẫu/fallback, bản trùng lặp theo
+       (email, conversationID, contentHash) và memory không có `expiresAt` nhưng cũ hơn `ttl_days`.
+    """
+    client = init_weaviate_client()
+    if client is None:
+        print("Không thể kết nối tới Weaviate. Bỏ qua compaction.")
+        return
+
+    # multi-tenant: compaction từng tenant đang ACTIVE (tenant INACTIVE/OFFLOADED giữ nguyên đến khi được bật lại)
+    for collection in iter_tenant_collections(client, collection_name):
+        _compact_collection(collection, now=datetime.now(UTC), dry_run=dry_run, batch_size=batch_size,
+                            ttl_days=ttl_days)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compaction cho collection ChatMemory")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    try:
+        compact_chat_memory(dry_run=args.dry_run, batch_size=args.batch_size)
+    finally:
+        close_weaviate_client()
+        print("Đã đóng kết nối.")
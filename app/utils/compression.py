@@ -0,0 +1,148 @@
+"""Nén response (brotli nếu có, không thì gzip) cho các endpoint trả một body JSON, như lịch sử chat.
+
+Chỉ nén response một khối (không `more_body`) đủ lớn; response streaming (/chat/batch ndjson) đi nguyên để
+client nhận từng dòng ngay. 304/204 và response đã có Content-Encoding cũng đi nguyên.
+
+Cấu hình:
+- COMPRESSION_ENABLED (true)
+- COMPRESSION_MIN_BYTES (500): body nhỏ hơn không đáng nén
+- COMPRESSION_GZIP_LEVEL (6), COMPRESSION_BROTLI_QUALITY (4)
+brotli là dependency tuỳ chọn, không có trong requirements.txt: chỉ dùng khi môi trường đã có sẵn, thiếu thì
+chỉ dùng gzip.
+
+Metrics: http.compression.responses, bytes_in, bytes_out (byte thực gửi), seconds (CPU nén).
+"""
+import gzip
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.configurations.settings import get_env
+from app.utils.http_cache import matching_tag
+from app.utils.metrics import increment
+
+COMPRESSION_ENABLED = get_env("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(get_env("COMPRESSION_MIN_BYTES", 500))
+COMPRESSION_GZIP_LEVEL = int(get_env("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(get_env("COMPRESSION_BROTLI_QUALITY", 4))
+
+_EXCLUDED_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+_brotli = None
+_brotli_checked = False
+
+
+def _brotli_module():
+    global _brotli, _brotli_checked
+    if not _brotli_checked:
+        try:
+            # import lười: brotli là dependency tuỳ chọn
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = None
+        _brotli_checked = True
+    return _brotli
+
+
+def _accepted(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    if "br" in accepted and _brotli_module() is not None:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return _brotli_module().compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+def _tag_encoding(headers: MutableHeaders, encoding: str):
+    # ETag mạnh gắn với từng representation: bản nén có tag riêng (http_cache bỏ hậu tố khi so khớp)
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/") and etag.endswith('"'):
+        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+        headers.add_vary_header("Accept-Encoding")
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            # body đầu tiên: quyết định nén hay không
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            if start_message["status"] == 304:
+                # 304 mang ETag của representation mà client đã giữ: bản nén, hoặc bản gốc nếu body lúc đó
+                # nhỏ hơn minimum_size nên không được nén. Lấy đúng tag client gửi trong If-None-Match.
+                held = matching_tag(request_headers.get("if-none-match"), headers.get("etag", ""))
+                if held and headers.get("etag"):
+                    headers["ETag"] = held
+                    headers.add_vary_header("Accept-Encoding")
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or start_message["status"] in (204, 304) or "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(_EXCLUDED_CONTENT_TYPES)):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            started = time.perf_counter()
+            compressed = compress(body, encoding)
+            increment("http.compression.seconds", time.perf_counter() - started)
+            increment("http.compression.responses")
+            increment("http.compression.bytes_in", len(body))
+            increment("http.compression.bytes_out", len(compressed))
+
+            _tag_encoding(headers, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
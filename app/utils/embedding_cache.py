@@ -0,0 +1,154 @@
+"""Cache embedding theo địa chỉ nội dung (SHA-256 của text).
+
+Hai tầng:
+- hot: LRU trong bộ nhớ, giới hạn số vector.
+- disk (tuỳ chọn, khi có `persist_dir`): ring buffer cố định trên đĩa dùng numpy memmap
+  (`vectors.f32` shape (capacity, dim) và `keys.u8` chứa digest 32 byte của từng slot),
+  nên vector sống qua restart mà RAM không phải giữ toàn bộ; OS tự page-in khi đọc.
+"""
+import json
+import os
+import threading
+from typing import List, Optional
+
+from app.utils.cache_backend import LocalLRUCache
+
+_FLUSH_EVERY = 256
+
+
+class EmbeddingCache:
+    def __init__(self, max_items: int, persist_dir: Optional[str] = None, disk_capacity: int = 100_000):
+        self._hot = LocalLRUCache(max_items=max_items)
+        self._lock = threading.Lock()
+        self.persist_dir = persist_dir
+        self.disk_capacity = disk_capacity
+        self._dim: Optional[int] = None
+        self._vectors = None
+        self._keys = None
+        self._slots: dict[str, int] = {}
+        self._next_slot = 0
+        self._dirty = 0
+        self.stats = {"hot_hits": 0, "disk_hits": 0, "misses": 0}
+
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+            meta = self._read_meta()
+            if meta and self._disk_files_match(meta):
+                self._open_disk(meta["dim"], meta["capacity"], create=False)
+                self._next_slot = meta.get("next_slot", 0) % self.disk_capacity
+            elif meta:
+                # meta.json còn nhưng file dữ liệu thiếu/bị cắt (crash, xoá tay): tạo lại cache rỗng thay vì
+                # để memmap "r+" lỗi và làm hỏng embedding service
+                print(f"Embedding disk cache in {persist_dir} does not match meta.json; rebuilding it empty.")
+                self._open_disk(meta["dim"], meta["capacity"], create=True)
+                self._write_meta()
+
+    # ---- disk tier -------------------------------------------------------
+    def _meta_path(self) -> str:
+        return os.path.join(self.persist_dir, "meta.json")
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not isinstance(meta, dict) or not isinstance(meta.get("dim"), int) or \
+                not isinstance(meta.get("capacity"), int) or meta["dim"] <= 0 or meta["capacity"] <= 0:
+            return None
+        return meta
+
+    def _disk_files_match(self, meta: dict) -> bool:
+        """File vectors.f32 / keys.u8 tồn tại và đúng kích thước mà meta.json mô tả."""
+        expected = {
+            "vectors.f32": meta["capacity"] * meta["dim"] * 4,
+            "keys.u8": meta["capacity"] * 32,
+        }
+        for name, size in expected.items():
+            try:
+                if os.path.getsize(os.path.join(self.persist_dir, name)) != size:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _open_disk(self, dim: int, capacity: int, create: bool):
+        import numpy as np
+
+        mode = "w+" if create else "r+"
+        self._dim = dim
+        self.disk_capacity = capacity
+        self._vectors = np.memmap(os.path.join(self.persist_dir, "vectors.f32"), dtype=np.float32, mode=mode,
+                                  shape=(capacity, dim))
+        self._keys = np.memmap(os.path.join(self.persist_dir, "keys.u8"), dtype=np.uint8, mode=mode,
+                               shape=(capacity, 32))
+        if not create:
+            used = np.nonzero(self._keys.any(axis=1))[0]
+            self._slots = {self._keys[slot].tobytes().hex(): int(slot) for slot in used}
+
+    def _write_meta(self):
+        with open(self._meta_path(), "w", encoding="utf-8") as f:
+            json.dump({"dim": self._dim, "capacity": self.disk_capacity, "next_slot": self._next_slot}, f)
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        return self._vectors[slot].tolist()
+
+    def _disk_put(self, key: str, vector: List[float]):
+        if self._vectors is None:
+            self._open_disk(len(vector), self.disk_capacity, create=True)
+        if len(vector) != self._dim or key in self._slots:
+            return
+        import numpy as np
+
+        slot = self._next_slot
+        if self._keys[slot].any():
+            self._slots.pop(self._keys[slot].tobytes().hex(), None)
+        self._vectors[slot] = vector
+        self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+        self._slots[key] = slot
+        self._next_slot = (slot + 1) % self.disk_capacity
+        self._dirty += 1
+        if self._dirty >= _FLUSH_EVERY:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._vectors is None:
+            return
+        self._vectors.flush()
+        self._keys.flush()
+        self._write_meta()
+        self._dirty = 0
+
+    # ---- public API ------------------------------------------------------
+    def get(self, key: str) -> Optional[List[float]]:
+        vector = self._hot.get(key)
+        if vector is not None:
+            with self._lock:
+                self.stats["hot_hits"] += 1
+            return vector
+
+        with self._lock:
+            vector = self._disk_get(key) if self.persist_dir else None
+            if vector is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+        self._hot.set(key, vector)
+        return vector
+
+    def put(self, key: str, vector: List[float]):
+        self._hot.set(key, vector)
+        if self.persist_dir:
+            with self._lock:
+                self._disk_put(key, vector)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "hot_items": len(self._hot), "disk_items": len(self._slots)}
@@ -0,0 +1,42 @@
+"""Serialize response JSON bằng orjson, nhận thẳng document BSON (ObjectId, datetime) không qua Pydantic.
+
+Các endpoint danh sách (message của conversation, danh sách conversation) đọc dict thô từ repository rồi trả
+FastJSONResponse: không dựng model Pydantic cho từng phần tử, không validate lại theo response_model.
+
+Chọn response class bằng JSON_RESPONSE_CLASS:
+- orjson (mặc định): đường nhanh ở trên.
+- default: đường cũ (model Pydantic + JSONResponse của Starlette), để so sánh hoặc khi cần tắt.
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from app.configurations.settings import get_env
+
+JSON_RESPONSE_CLASS = get_env("JSON_RESPONSE_CLASS", "orjson").lower()
+
+
+def fast_json_enabled() -> bool:
+    return JSON_RESPONSE_CLASS == "orjson"
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """datetime ra ISO 8601 giống `datetime.isoformat()`, ObjectId ra chuỗi hex."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,70 @@
+"""ETag và conditional GET (If-None-Match -> 304) cho các endpoint lịch sử chat.
+
+Route tính ETag từ metadata rẻ (updated_at, message_count, last_message_at của conversation) trước khi đọc
+dữ liệu đầy đủ; khớp với If-None-Match thì trả 304 không body. ETag là hash của các thành phần đó cộng
+tham số truy vấn, nên đổi trang/limit hay có message mới đều ra tag mới.
+
+Metrics: http.etag.not_modified (304), http.etag.full (trả body đầy đủ).
+"""
+import hashlib
+from typing import Any, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.utils.metrics import increment
+
+# client chỉ dùng bản lưu sau khi hỏi lại server (có ETag nên thường nhận 304)
+CACHE_CONTROL = "private, no-cache"
+_ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.blake2b("\x1f".join(str(p) for p in parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    # CompressionMiddleware thêm hậu tố encoding vào tag của bản nén
+    for suffix in _ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+def matching_tag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """Tag trong If-None-Match khớp (yếu) với `etag`, giữ nguyên hậu tố encoding của bản client đang giữ."""
+    if not if_none_match:
+        return None
+    wanted = _opaque(etag)
+    for tag in if_none_match.split(","):
+        if _opaque(tag) == wanted:
+            return tag.strip()
+    return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """So khớp yếu theo RFC 9110 cho If-None-Match (bỏ W/ và hậu tố encoding)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return matching_tag(header, etag) is not None
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    increment("http.etag.not_modified")
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def record_full_response():
+    increment("http.etag.full")
@@ -1,14 +1,11 @@
-import os
-
-import weaviate
-from dotenv import load_dotenv
 from weaviate.classes.config import Property, DataType
-from weaviate.collections.classes.config import Configure
 
 from app.configurations.weaviate_config import (
     init_weaviate_client,
     close_weaviate_client,
 )
+from app.services.embedding_service import get_vectorizer_config
+from app.services.weaviate_tenancy import get_multi_tenancy_config
 
 
 memory_properties = [
@@ -44,6 +41,19 @@ memory_properties = [
         skip_vectorization=True,
     ),
 
+    # hash nội dung đã chuẩn hoá, dùng để chống trùng lặp và cho job compaction
+    Property(
+        name="contentHash",
+        data_type=DataType.TEXT,
+        skip_vectorization=True,
+    ),
+    # thời điểm hết hạn theo TTL của memory policy; job compaction xoá các memory đã hết hạn
+    Property(
+        name="expiresAt",
+        data_type=DataType.DATE,
+        skip_vectorization=True,
+    ),
+
     # metadata vẫn giữ lại để chứa các thông tin phụ như sourceMessageID
     Property(
         name="metadata",
@@ -75,7 +85,9 @@ def init_chat_memory_collection():
         client.collections.create(
             name=collection_name,
             properties=memory_properties,
-            vectorizer_config=Configure.Vectorizer.text2vec_transformers()
+            vectorizer_config=get_vectorizer_config(),
+            # WEAVIATE_MULTI_TENANCY=true: mỗi facility một tenant, tenant được tạo ở lần ghi memory đầu tiên
+            multi_tenancy_config=get_multi_tenancy_config(),
         )
 
         print(f"Collection '{collection_name}' đã được tạo thành công với Gemini.")
@@ -1,8 +1,11 @@
 from weaviate.classes.config import Property, DataType
-from weaviate.collections.classes.config import Configure, Tokenization, InvertedIndexConfig, BM25Config, \
+from weaviate.collections.classes.config import Tokenization, InvertedIndexConfig, BM25Config, \
     StopwordsConfig
 
 from app.configurations.weaviate_config import init_weaviate_client, close_weaviate_client
+from app.services.embedding_service import get_embedding_service, get_vectorizer_config
+from app.services.weaviate_tenancy import ensure_tenants, get_multi_tenancy_config, multi_tenancy_enabled, \
+    tenant_collection
 
 knowledge_data = [
     {
@@ -55,6 +58,93 @@ knowledge_data = [
 class_name = "FarmingKnowledge"
 
 
+def knowledge_properties() -> list:
+    """Schema của FarmingKnowledge (dùng chung cho nạp dữ liệu và công cụ chuyển sang multi-tenancy)."""
+    stopwords_cfg = StopwordsConfig(
+        preset="en",
+        additions=[],
+        removals=[]
+    )
+
+    inverted_cfg = InvertedIndexConfig(
+        bm25=BM25Config(k1=1.2, b=0.75),
+        cleanup_interval_seconds=60,
+        index_null_state=True,
+        index_property_length=True,
+        index_timestamps=True,
+        stopwords=stopwords_cfg,
+    )
+
+    return [
+        Property(
+            name="content",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.WORD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+        Property(
+            name="stage",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.WORD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+        Property(
+            name="species",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.WORD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+        Property(name="min_age_days", data_type=DataType.INT, index_filterable=True),
+        Property(name="max_age_days", data_type=DataType.INT, index_filterable=True),
+        Property(
+            name="recommended_feed",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.WORD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+        Property(
+            name="feed_dosage",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.WORD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+        Property(
+            name="medication",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.WORD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+        Property(
+            name="notes",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.WORD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+        Property(
+            name="facilityID",
+            data_type=DataType.TEXT,
+            tokenization=Tokenization.FIELD,
+            index_filterable=True,
+            index_searchable=True,
+            inverted_index_config=inverted_cfg,
+        ),
+    ]
+
+
 def load_knowledge_to_weaviate():
     # initialize client via config
     client = init_weaviate_client()
@@ -87,92 +177,11 @@ def load_knowledge_to_weaviate():
         #     vectorizer_config=Configure.Vectorizer.text2vec_transformers()
         # )
 
-        stopwords_cfg = StopwordsConfig(
-            preset="en",
-            additions=[],
-            removals=[]
-        )
-
-        inverted_cfg = InvertedIndexConfig(
-            bm25=BM25Config(k1=1.2, b=0.75),
-            cleanup_interval_seconds=60,
-            index_null_state=True,
-            index_property_length=True,
-            index_timestamps=True,
-            stopwords=stopwords_cfg,
-        )
-
         client.collections.create(
             name=class_name,
-            properties=[
-                Property(
-                    name="content",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.WORD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-                Property(
-                    name="stage",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.WORD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-                Property(
-                    name="species",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.WORD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-                Property(name="min_age_days", data_type=DataType.INT, index_filterable=True),
-                Property(name="max_age_days", data_type=DataType.INT, index_filterable=True),
-                Property(
-                    name="recommended_feed",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.WORD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-                Property(
-                    name="feed_dosage",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.WORD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-                Property(
-                    name="medication",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.WORD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-                Property(
-                    name="notes",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.WORD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-                Property(
-                    name="facilityID",
-                    data_type=DataType.TEXT,
-                    tokenization=Tokenization.FIELD,
-                    index_filterable=True,
-                    index_searchable=True,
-                    inverted_index_config=inverted_cfg,
-                ),
-            ],
-            vectorizer_config=Configure.Vectorizer.text2vec_transformers()
+            properties=knowledge_properties(),
+            vectorizer_config=get_vectorizer_config(),
+            multi_tenancy_config=get_multi_tenancy_config(),
         )
 
         print(f"Collection '{class_name}' đã được tạo thành công với Gemini.")
@@ -181,6 +190,7 @@ def load_knowledge_to_weaviate():
         collection = client.collections.get(class_name)
         print("Đang tải dữ liệu kiến thức vào Weaviate...")
 
+        data_objects = []
         for item in knowledge_data:
             content = (
                 f"Thông tin chăn nuôi: Giai đoạn {item['stage']} của loài {item['species']} "
@@ -192,7 +202,17 @@ def load_knowledge_to_weaviate():
 
             data_object = item.copy()
             data_object["content"] = content
-            collection.data.insert(data_object)
+            data_objects.append(data_object)
+
+        if multi_tenancy_enabled():
+            created = ensure_tenants(collection, [d.get("facilityID") for d in data_objects])
+            print(f"Đã tạo {len(created)} tenant: {created}")
+
+        # EMBEDDING_MODE=local: vector hoá cả lô một lần rồi insert kèm vector
+        embedder = get_embedding_service()
+        vectors = embedder.embed_texts([d["content"] for d in data_objects]) if embedder else [None] * len(data_objects)
+        for data_object, vector in zip(data_objects, vectors):
+            tenant_collection(client, class_name, data_object.get("facilityID")).data.insert(data_object, vector=vector)
 
         print("Dữ liệu đã được tải thành công!")
 
@@ -0,0 +1,32 @@
+"""Registry metrics nhỏ trong process, phục vụ endpoint `/metrics` (JSON).
+
+Các module đăng ký một hàm trả về snapshot của riêng mình (cache hit rate, trạng thái
+circuit breaker...) qua `register_metrics_source`, và có thể tăng counter đơn giản qua `increment`.
+"""
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict
+
+_counters: Dict[str, float] = defaultdict(float)
+_counters_lock = threading.Lock()
+_sources: Dict[str, Callable[[], Any]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    with _counters_lock:
+        _counters[name] += value
+
+
+def register_metrics_source(name: str, snapshot_fn: Callable[[], Any]) -> None:
+    _sources[name] = snapshot_fn
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    with _counters_lock:
+        snapshot: Dict[str, Any] = {"counters": dict(_counters)}
+    for name, fn in _sources.items():
+        try:
+            snapshot[name] = fn()
+        except Exception as e:
+            snapshot[name] = {"error": str(e)}
+    return snapshot
@@ -0,0 +1,88 @@
+"""Chuyển message từ layout một-document-mỗi-message (`messages` + `messages_archive`) sang `message_buckets`.
+
+    python -m app.utils.migrate_message_buckets --dry-run
+    python -m app.utils.migrate_message_buckets --bucket-size 100
+    python -m app.utils.migrate_message_buckets --delete-source     # sau khi đã chuyển app sang MESSAGE_STORAGE=buckets
+
+Mỗi conversation được đọc qua cả hai tầng theo thứ tự thời gian rồi ghi thành các bucket đầy (seq 0, 1, ...).
+Conversation đã có bucket thì bỏ qua, nên có thể chạy lại sau khi bị ngắt; dùng --rebuild để ghi lại từ đầu.
+Chạy lúc không có ghi mới (hoặc chạy lại lần nữa sau khi đổi MESSAGE_STORAGE): message ghi vào `messages`
+trong lúc migrate sẽ không có trong bucket.
+"""
+from bson import ObjectId
+
+from app.configurations.mongo_config import init_mongo_client, get_db, close_mongo_client
+from app.repositories.bucketed_message_repository import BucketedMessageRepository
+from app.repositories.message_repository import MESSAGE_BUCKET_SIZE, MessageRepository
+
+
+def _bucket_docs(convo_id, messages, bucket_size: int) -> list[dict]:
+    docs = []
+    for seq, start in enumerate(range(0, len(messages), bucket_size)):
+        chunk = [{
+            "_id": ObjectId(m.id),
+            "sender_type": m.sender_type,
+            "content": m.content,
+            "sender_id": m.sender_id,
+            "timestamp": m.timestamp,
+        } for m in messages[start:start + bucket_size]]
+        docs.append({"conversation_id": convo_id, "seq": seq, "count": len(chunk),
+                     "first_ts": chunk[0]["timestamp"], "last_ts": chunk[-1]["timestamp"], "messages": chunk})
+    return docs
+
+
+def migrate(bucket_size: int = MESSAGE_BUCKET_SIZE, dry_run: bool = False, rebuild: bool = False,
+            delete_source: bool = False):
+    db = get_db()
+    source = MessageRepository(db)
+    target = BucketedMessageRepository(db, bucket_size)
+    stats = {"conversations": 0, "skipped": 0, "messages": 0, "buckets": 0, "deleted_source": 0}
+
+    for convo_ids in source.iter_conversation_ids():
+        for convo_id in convo_ids:
+            existing = target.collection.count_documents({"conversation_id": convo_id}, limit=1)
+            if existing and not rebuild and not delete_source:
+                stats["skipped"] += 1
+                continue
+            messages = source.get_by_conversation_id(convo_id)
+            if delete_source:
+                # chỉ xoá khi bucket đã chứa đủ message của conversation
+                _, total = target.get_page_by_conversation(convo_id, 0, 0)
+                if total >= len(messages) and not dry_run:
+                    while source.delete_batch_by_conversation(convo_id):
+                        pass
+                    stats["deleted_source"] += len(messages)
+                continue
+
+            docs = _bucket_docs(convo_id, messages, bucket_size)
+            stats["conversations"] += 1
+            stats["messages"] += len(messages)
+            stats["buckets"] += len(docs)
+            if dry_run or not docs:
+                continue
+            if existing:
+                target.collection.delete_many({"conversation_id": convo_id})
+            target.collection.insert_many(docs, ordered=True)
+
+    print(f"Migrate message buckets (bucket_size={bucket_size}{', dry run' if dry_run else ''}): {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chuyển message sang layout bucket")
+    parser.add_argument("--bucket-size", type=int, default=MESSAGE_BUCKET_SIZE)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--rebuild", action="store_true", help="Ghi lại bucket của conversation đã migrate")
+    parser.add_argument("--delete-source", action="store_true",
+                        help="Xoá message ở layout cũ của các conversation đã có đủ trong bucket")
+    args = parser.parse_args()
+
+    init_mongo_client()
+    try:
+        migrate(bucket_size=args.bucket_size, dry_run=args.dry_run, rebuild=args.rebuild,
+                delete_source=args.delete_source)
+    finally:
+        close_mongo_client()
+        print("Đã đóng kết nối.")
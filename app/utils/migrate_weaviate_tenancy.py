@@ -0,0 +1,290 @@
+"""Chuyển FarmingKnowledge / ChatMemory từ collection dùng chung sang multi-tenancy (một tenant cho mỗi facility),
+và tắt tenant của các facility không còn hoạt động.
+
+Weaviate không cho bật multi-tenancy trên collection đã tồn tại, nên lệnh `migrate`:
+1. export mọi object (kèm vector) ra file JSONL backup,
+2. xác định facility của từng object: FarmingKnowledge theo `facilityID`, ChatMemory theo conversation trong Mongo,
+3. xoá collection, tạo lại với multi-tenancy, tạo tenant và insert lại từng tenant theo lô.
+Có object không xác định được facility thì `migrate` từ chối chạy, trừ khi có `--drop-orphans` (các object đó
+khi ấy chỉ còn trong file backup).
+
+Lệnh `restore` đọc lại file backup:
+- mặc định insert lại vào collection multi-tenant (chạy tiếp khi `migrate` bị ngắt giữa lúc insert; object đã có
+  được bỏ qua);
+- `--shared`: rollback, tạo lại collection dùng chung như trước migrate và insert toàn bộ (kể cả object mồ côi).
+
+Cần WEAVIATE_MULTI_TENANCY=true (cả khi chạy tool lẫn khi chạy app sau đó):
+    WEAVIATE_MULTI_TENANCY=true python -m app.utils.migrate_weaviate_tenancy migrate --dry-run
+    WEAVIATE_MULTI_TENANCY=true python -m app.utils.migrate_weaviate_tenancy migrate --collection all
+    WEAVIATE_MULTI_TENANCY=true python -m app.utils.migrate_weaviate_tenancy restore --collection ChatMemory \
+        --backup backups/ChatMemory-20250101T000000Z.jsonl
+    WEAVIATE_MULTI_TENANCY=true python -m app.utils.migrate_weaviate_tenancy deactivate --idle-days 30 --status OFFLOADED
+"""
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from bson import ObjectId
+
+from app.configurations.mongo_config import init_mongo_client, get_db, close_mongo_client
+from app.configurations.weaviate_config import init_weaviate_client, close_weaviate_client
+from app.repositories.conversation_repository import CONVERSATION_COLLECTION
+from app.services.embedding_service import get_vectorizer_config
+from app.services.weaviate_tenancy import ensure_tenants, get_multi_tenancy_config, multi_tenancy_enabled, \
+    set_tenant_activity, tenant_name
+
+KNOWLEDGE_COLLECTION = "FarmingKnowledge"
+MEMORY_COLLECTION = "ChatMemory"
+
+
+def _properties_for(name: str) -> list:
+    # import ở đây: hai module khởi tạo schema import weaviate ngay khi nạp
+    if name == KNOWLEDGE_COLLECTION:
+        from app.utils.load_knowledge import knowledge_properties
+
+        return knowledge_properties()
+    from app.utils.init_chat_memory import memory_properties
+
+    return memory_properties
+
+
+def _is_multi_tenant(collection) -> bool:
+    config = collection.config.get()
+    return bool(getattr(config.multi_tenancy_config, "enabled", False))
+
+
+def _conversation_facilities(conversation_ids) -> Dict[str, str]:
+    """conversationID -> facilityID, đọc theo lô từ Mongo."""
+    object_ids = []
+    for convo_id in set(conversation_ids):
+        try:
+            object_ids.append(ObjectId(convo_id))
+        except Exception:
+            continue
+    facilities = {}
+    conversations = get_db()[CONVERSATION_COLLECTION]
+    for i in range(0, len(object_ids), 1000):
+        for doc in conversations.find({"_id": {"$in": object_ids[i:i + 1000]}}, {"facilityID": 1}):
+            if doc.get("facilityID"):
+                facilities[str(doc["_id"])] = doc["facilityID"]
+    return facilities
+
+
+def _export(collection) -> List[dict]:
+    objects = []
+    for obj in collection.iterator(include_vector=True):
+        vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+        objects.append({"uuid": str(obj.uuid), "properties": dict(obj.properties), "vector": vector})
+    return objects
+
+
+def _write_backup(name: str, objects: List[dict], backup_dir: str) -> str:
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, f"{name}-{datetime.now(UTC).strftime('%Y%m%dT%H%M%SZ')}.jsonl")
+    with open(path, "wb") as f:
+        for obj in objects:
+            f.write(orjson.dumps(obj, default=str) + b"\n")
+    return path
+
+
+def _read_backup(path: str) -> List[dict]:
+    with open(path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+
+def _group_by_facility(name: str, objects: List[dict]) -> Tuple[Dict[str, List[dict]], List[dict]]:
+    """Chia object theo facility; trả về (facility -> object, object không xác định được facility)."""
+    if name == KNOWLEDGE_COLLECTION:
+        facility_of = {o["uuid"]: o["properties"].get("facilityID") for o in objects}
+    else:
+        convo_facility = _conversation_facilities(o["properties"].get("conversationID") for o in objects)
+        facility_of = {o["uuid"]: convo_facility.get(o["properties"].get("conversationID")) for o in objects}
+
+    by_facility: Dict[str, List[dict]] = defaultdict(list)
+    orphans = []
+    for obj in objects:
+        facility_id = facility_of.get(obj["uuid"])
+        if facility_id:
+            by_facility[facility_id].append(obj)
+        else:
+            orphans.append(obj)
+    return by_facility, orphans
+
+
+def _recreate(client, name: str, multi_tenant: bool):
+    if client.collections.exists(name):
+        client.collections.delete(name)
+    client.collections.create(
+        name=name,
+        properties=_properties_for(name),
+        vectorizer_config=get_vectorizer_config(),
+        multi_tenancy_config=get_multi_tenancy_config() if multi_tenant else None,
+    )
+    return client.collections.get(name)
+
+
+def _insert(target, items: List[dict], batch_size: int) -> Tuple[int, int]:
+    """Insert theo lô; trả về (số lỗi, số object đã tồn tại). Object đã có (restore chạy lại) không tính là lỗi."""
+    from weaviate.classes.data import DataObject
+
+    failed = existing = 0
+    for i in range(0, len(items), batch_size):
+        chunk = [DataObject(properties=o["properties"], uuid=o["uuid"], vector=o["vector"])
+                 for o in items[i:i + batch_size]]
+        result = target.data.insert_many(chunk)
+        for error in (getattr(result, "errors", None) or {}).values():
+            if "already exists" in str(getattr(error, "message", error)):
+                existing += 1
+            else:
+                failed += 1
+    return failed, existing
+
+
+def _insert_by_tenant(collection, by_facility: Dict[str, List[dict]], batch_size: int) -> Tuple[int, int]:
+    ensure_tenants(collection, by_facility)
+    failed = existing = 0
+    for facility_id, items in by_facility.items():
+        f, e = _insert(collection.with_tenant(tenant_name(facility_id)), items, batch_size)
+        failed, existing = failed + f, existing + e
+    return failed, existing
+
+
+def migrate_collection(client, name: str, backup_dir: str = "backups", batch_size: int = 200,
+                       dry_run: bool = False, drop_orphans: bool = False):
+    if not client.collections.exists(name):
+        print(f"Collection '{name}' không tồn tại; bỏ qua.")
+        return
+    collection = client.collections.get(name)
+    if _is_multi_tenant(collection):
+        print(f"Collection '{name}' đã bật multi-tenancy; bỏ qua.")
+        return
+
+    objects = _export(collection)
+    by_facility, orphans = _group_by_facility(name, objects)
+    sizes = sorted(((len(v), k) for k, v in by_facility.items()), reverse=True)
+    print(f"{name}: {len(objects)} object, {len(by_facility)} facility, {len(orphans)} không xác định được facility")
+    print(f"  lớn nhất: {[(tenant_name(k), n) for n, k in sizes[:5]]}")
+    if dry_run:
+        return
+    if orphans and not drop_orphans:
+        print(f"  từ chối migrate {name}: {len(orphans)} object không có facility sẽ bị bỏ. "
+              "Chạy lại với --drop-orphans nếu chấp nhận (chúng vẫn nằm trong file backup).")
+        return
+
+    backup_path = _write_backup(name, objects, backup_dir)
+    print(f"  backup: {backup_path}")
+    print(f"  bị ngắt giữa chừng thì chạy: restore --collection {name} --backup {backup_path}")
+
+    collection = _recreate(client, name, multi_tenant=True)
+    failed, _ = _insert_by_tenant(collection, by_facility, batch_size)
+    moved = len(objects) - len(orphans) - failed
+    print(f"  đã chuyển {moved} object vào {len(by_facility)} tenant ({failed} lỗi, {len(orphans)} bỏ)")
+
+
+def restore_collection(client, name: str, backup_path: str, batch_size: int = 200, shared: bool = False):
+    """
+    Insert lại object từ file backup của `migrate`. Mặc định vào collection multi-tenant (tạo nếu chưa có,
+    object đã có được bỏ qua); `shared=True` tạo lại collection dùng chung và insert toàn bộ.
+    """
+    objects = _read_backup(backup_path)
+    print(f"{name}: {len(objects)} object trong {backup_path}")
+    if shared:
+        collection = _recreate(client, name, multi_tenant=False)
+        failed, _ = _insert(collection, objects, batch_size)
+        print(f"  đã khôi phục {len(objects) - failed} object vào collection dùng chung ({failed} lỗi)")
+        return
+
+    if client.collections.exists(name):
+        collection = client.collections.get(name)
+        if not _is_multi_tenant(collection):
+            raise SystemExit(f"Collection '{name}' chưa bật multi-tenancy; dùng --shared hoặc chạy migrate.")
+    else:
+        collection = _recreate(client, name, multi_tenant=True)
+    by_facility, orphans = _group_by_facility(name, objects)
+    failed, existing = _insert_by_tenant(collection, by_facility, batch_size)
+    restored = len(objects) - len(orphans) - failed - existing
+    print(f"  đã khôi phục {restored} object ({existing} đã có, {failed} lỗi, "
+          f"{len(orphans)} không có facility: chỉ khôi phục được bằng --shared)")
+
+
+def idle_facilities(idle_days: int, now: Optional[datetime] = None) -> List[str]:
+    """Facility có conversation cập nhật gần nhất cũ hơn `idle_days` ngày."""
+    cutoff = (now or datetime.now(UTC)) - timedelta(days=idle_days)
+    pipeline = [
+        {"$group": {"_id": "$facilityID", "lastActive": {"$max": "$updated_at"}}},
+        {"$match": {"_id": {"$ne": None}, "lastActive": {"$lt": cutoff}}},
+    ]
+    return [row["_id"] for row in get_db()[CONVERSATION_COLLECTION].aggregate(pipeline)]
+
+
+def deactivate_idle_tenants(client, idle_days: int, status_name: str = "INACTIVE", dry_run: bool = False):
+    """
+    Chuyển tenant của facility không hoạt động sang INACTIVE (giữ trên đĩa, giải phóng bộ nhớ) hoặc
+    OFFLOADED (đẩy lên cloud storage, cần module offload). Auto activation bật lại tenant khi có truy vấn.
+    """
+    from weaviate.classes.tenants import TenantActivityStatus
+
+    status = TenantActivityStatus[status_name]
+    facilities = idle_facilities(idle_days)
+    print(f"{len(facilities)} facility không hoạt động quá {idle_days} ngày")
+    for name in (KNOWLEDGE_COLLECTION, MEMORY_COLLECTION):
+        if not client.collections.exists(name):
+            continue
+        collection = client.collections.get(name)
+        if dry_run:
+            existing = set(collection.tenants.get())
+            names = sorted({tenant_name(f) for f in facilities} & existing)
+        else:
+            names = set_tenant_activity(collection, facilities, status)
+        print(f"{name}: {len(names)} tenant -> {status_name}{' (dry run)' if dry_run else ''}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multi-tenancy theo facility cho Weaviate")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = sub.add_parser("migrate", help="Chuyển collection dùng chung sang multi-tenant")
+    migrate_parser.add_argument("--collection", choices=[KNOWLEDGE_COLLECTION, MEMORY_COLLECTION, "all"], default="all")
+    migrate_parser.add_argument("--backup-dir", default="backups")
+    migrate_parser.add_argument("--batch-size", type=int, default=200)
+    migrate_parser.add_argument("--dry-run", action="store_true")
+    migrate_parser.add_argument("--drop-orphans", action="store_true",
+                                help="cho phép bỏ object không xác định được facility (vẫn giữ trong backup)")
+    restore_parser = sub.add_parser("restore", help="Insert lại object từ file backup của migrate")
+    restore_parser.add_argument("--collection", choices=[KNOWLEDGE_COLLECTION, MEMORY_COLLECTION], required=True)
+    restore_parser.add_argument("--backup", required=True, help="file JSONL do migrate ghi ra")
+    restore_parser.add_argument("--batch-size", type=int, default=200)
+    restore_parser.add_argument("--shared", action="store_true",
+                                help="rollback: tạo lại collection dùng chung (không multi-tenancy)")
+    deactivate_parser = sub.add_parser("deactivate", help="Tắt tenant của facility không hoạt động")
+    deactivate_parser.add_argument("--idle-days", type=int, default=30)
+    deactivate_parser.add_argument("--status", choices=["INACTIVE", "OFFLOADED"], default="INACTIVE")
+    deactivate_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if not multi_tenancy_enabled():
+        raise SystemExit("Cần đặt WEAVIATE_MULTI_TENANCY=true để chạy công cụ này.")
+
+    weaviate_client = init_weaviate_client()
+    if weaviate_client is None:
+        raise SystemExit("Không thể kết nối tới Weaviate.")
+    init_mongo_client()
+    try:
+        if args.command == "migrate":
+            names = [KNOWLEDGE_COLLECTION, MEMORY_COLLECTION] if args.collection == "all" else [args.collection]
+            for collection_name in names:
+                migrate_collection(weaviate_client, collection_name, backup_dir=args.backup_dir,
+                                   batch_size=args.batch_size, dry_run=args.dry_run,
+                                   drop_orphans=args.drop_orphans)
+        elif args.command == "restore":
+            restore_collection(weaviate_client, args.collection, args.backup, batch_size=args.batch_size,
+                               shared=args.shared)
+        else:
+            deactivate_idle_tenants(weaviate_client, args.idle_days, args.status, dry_run=args.dry_run)
+    finally:
+        close_mongo_client()
+        close_weaviate_client()
+        print("Đã đóng kết nối.")
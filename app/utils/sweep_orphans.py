@@ -0,0 +1,33 @@
+"""Dọn message / ChatMemory của các conversation không còn tồn tại.
+
+    python -m app.utils.sweep_orphans --dry-run
+    python -m app.utils.sweep_orphans --max-ops-per-second 10
+
+Message mồ côi được đưa vào `cleanup_jobs` rồi xử lý ngay (trừ khi --no-run-jobs; worker của app cũng
+nhận các job này). ChatMemory mồ côi được xoá trực tiếp theo từng tenant.
+"""
+from app.configurations.mongo_config import init_mongo_client, close_mongo_client
+from app.configurations.weaviate_config import init_weaviate_client, close_weaviate_client
+from app.services.cleanup_service import CLEANUP_BATCH_SIZE, CLEANUP_MAX_OPS_PER_SECOND, ConversationCleanupService
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Dọn dữ liệu của conversation đã xoá")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=CLEANUP_BATCH_SIZE)
+    parser.add_argument("--max-ops-per-second", type=float, default=CLEANUP_MAX_OPS_PER_SECOND)
+    parser.add_argument("--no-run-jobs", action="store_true", help="Chỉ tạo job, để worker của app xử lý")
+    args = parser.parse_args()
+
+    init_mongo_client()
+    init_weaviate_client()
+    try:
+        service = ConversationCleanupService(batch_size=args.batch_size, max_ops_per_second=args.max_ops_per_second)
+        service.sweep_orphans(dry_run=args.dry_run)
+        if not args.dry_run and not args.no_run_jobs:
+            print(f"Đã xử lý {service.run_pending()} job dọn dẹp.")
+    finally:
+        close_weaviate_client()
+        close_mongo_client()
+        print("Đã đóng kết nối.")
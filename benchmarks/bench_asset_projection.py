@@ -0,0 +1,101 @@
+"""So sánh đọc cả document `batches` với chỉ project entry history cuối cùng (`$slice: -1`).
+
+Chạy từ thư mục gốc của repo (cần Mongo, mặc định MONGO_URI trong .env):
+    python -m benchmarks.bench_asset_projection --batches 200 --history 5000
+
+Benchmark ghi dữ liệu giả vào một collection tạm (`bench_batches_<pid>`) rồi xoá khi xong:
+mỗi đàn có `--history` sự kiện, mỗi sự kiện có feeds/medications như dữ liệu thật.
+
+- full document: find_one trả cả mảng history (hành vi cũ của find_by_asset_and_facility).
+- $slice -1: find_latest_state, chỉ entry cuối cùng, trả LatestAssetState.
+- multi-get: find_latest_states cho `--multi` đàn trong một query, so với gọi lần lượt từng đàn.
+Cột "bytes" là kích thước BSON của kết quả (ước lượng lượng dữ liệu truyền và decode).
+"""
+import argparse
+import os
+import random
+import time
+
+import bson
+
+from app.configurations.mongo_config import init_mongo_client, get_db, close_mongo_client
+from app.repositories.asset_repository import AssetRepository, LATEST_HISTORY_PROJECTION
+
+FACILITY_ID = "bench-facility"
+
+
+def make_batch(i: int, history_len: int, rng: random.Random) -> dict:
+    asset_id = f"BENCH-PORK-{i:05d}"
+    history = []
+    for day in range(history_len):
+        history.append({
+            "action": rng.choice(["FEED", "MEDICATE", "WEIGH", "MOVE"]),
+            "timestamp": f"2025-01-01T00:00:00Z+{day}",
+            "details": {
+                "facilityID": FACILITY_ID,
+                "feeds": [{"name": f"Cám CP {200 + day % 5}", "dosageKg": 2.5, "startDate": "2025-01-01",
+                           "endDate": "2025-02-01", "notes": "cho ăn 2 bữa"}],
+                "medications": [{"name": "Vắc-xin dịch tả", "dose": "2ml", "dateApplied": "2025-01-05",
+                                 "nextDueDate": "2025-03-05"}],
+                "weightKg": 20 + day * 0.4,
+            },
+        })
+    return {"assetID": asset_id, "history": history}
+
+
+def timed(label: str, fn, repeats: int = 5):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return label, best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--history", type=int, default=5000)
+    parser.add_argument("--multi", type=int, default=50)
+    args = parser.parse_args()
+
+    init_mongo_client()
+    db = get_db()
+    collection_name = f"bench_batches_{os.getpid()}"
+    collection = db[collection_name]
+    rng = random.Random(0)
+    try:
+        print(f"Seeding {args.batches} batches × {args.history} history events...")
+        for i in range(args.batches):
+            collection.insert_one(make_batch(i, args.history, rng))
+        collection.create_index("assetID")
+
+        repo = AssetRepository(db)
+        repo._collection = collection
+        asset_ids = [f"BENCH-PORK-{i:05d}" for i in rng.sample(range(args.batches), min(args.multi, args.batches))]
+        one = asset_ids[0]
+
+        rows = [
+            timed("full document (find_one)", lambda: repo.find_by_asset_and_facility(one, FACILITY_ID)),
+            timed("$slice -1 (find_latest_state)", lambda: repo.find_latest_state(one, FACILITY_ID)),
+            timed(f"{len(asset_ids)} × find_latest_state",
+                  lambda: [repo.find_latest_state(a, FACILITY_ID) for a in asset_ids]),
+            timed(f"multi-get {len(asset_ids)} (find_latest_states)",
+                  lambda: repo.find_latest_states(asset_ids, FACILITY_ID)),
+        ]
+
+        full_bytes = len(bson.encode(collection.find_one({"assetID": one}, {"_id": 0})))
+        slice_bytes = len(bson.encode(collection.find_one({"assetID": one}, LATEST_HISTORY_PROJECTION)))
+        sizes = [full_bytes, slice_bytes, slice_bytes * len(asset_ids), slice_bytes * len(asset_ids)]
+
+        print(f"{'':<42} {'ms':>10} {'bytes':>12}")
+        for (label, ms, _), size in zip(rows, sizes):
+            print(f"{label:<42} {ms:10.2f} {size:12,}")
+    finally:
+        db.drop_collection(collection_name)
+        close_mongo_client()
+
+
+if __name__ == "__main__":
+    main()
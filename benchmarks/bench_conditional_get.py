@@ -0,0 +1,113 @@
+"""Byte truyền và CPU mỗi lần "refresh" màn hình lịch sử: không nén / gzip / br so với conditional GET (304).
+
+Chạy từ thư mục gốc của repo (cần Mongo, mặc định MONGO_URI trong .env):
+    python -m benchmarks.bench_conditional_get --conversations 50 --messages 100 --rounds 200
+
+Benchmark dùng một database tạm (`bench_etag_<pid>`), xoá khi xong, và gọi app qua TestClient (không chạy
+lifespan; get_db và get_current_user được override). Mỗi lần refresh là GET /api/conversations/ rồi
+GET /api/conversations/{id}/messages như app mobile:
+- identity / gzip / br: lần tải đầy đủ với Accept-Encoding tương ứng (br chỉ khi đã cài `brotli`).
+- 304: gửi lại If-None-Match với ETag vừa nhận, dữ liệu không đổi.
+In byte nhận được (đã nén, chưa giải nén) và CPU process (time.process_time) mỗi refresh; client chạy chung
+process nên CPU gồm cả phần client, như nhau giữa các kịch bản.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, UTC
+
+from fastapi.testclient import TestClient
+
+from app.configurations.mongo_config import init_mongo_client, get_mongo_client, close_mongo_client, get_db
+from app.main import app
+from app.models.conversation import ConversationCreate
+from app.models.message import MessageCreate
+from app.repositories.conversation_repository import ConversationRepository
+from app.repositories.message_repository import get_message_repository
+from app.services.auth_service import User, get_current_user
+from app.utils.compression import _brotli_module
+
+USER = User(id="bench", email="farmer@example.com", name="Bench", role="farmer", facilityID="facility-01",
+            status="active", fabricEnrollmentID="bench")
+
+
+def seed(db, conversations: int, messages: int) -> str:
+    convo_repo = ConversationRepository(db)
+    message_repo = get_message_repository(db)
+    start = datetime.now(UTC) - timedelta(days=7)
+    first_id = None
+    for c in range(conversations):
+        convo = convo_repo.create(ConversationCreate(email=USER.email, facilityID=USER.facilityID,
+                                                     title=f"Tư vấn dinh dưỡng đàn {c}"))
+        convo_id = convo.id
+        first_id = first_id or str(convo_id)
+        entries = []
+        for m in range(messages):
+            sender = "user" if m % 2 == 0 else "bot"
+            content = (f"Đàn {c} ăn cám gì ở ngày {m}?" if sender == "user"
+                       else "Đàn đang dùng Cám CP 201, liều 2.5 kg/con/ngày; theo dõi nhiệt độ chuồng 28-30°C.")
+            entries.append((convo_id, MessageCreate(content=content, sender_type=sender, sender_id=USER.email),
+                            start + timedelta(minutes=c * messages + m)))
+        message_repo.create_many(entries)
+        last_ts, last = entries[-1][2], entries[-1][1]
+        convo_repo.record_messages(convo_id, messages, last_ts, last.content, last.sender_type)
+    return first_id
+
+
+def refresh(client: TestClient, convo_id: str, encoding: str, etags: dict | None) -> tuple[int, dict]:
+    urls = ["/api/conversations/", f"/api/conversations/{convo_id}/messages"]
+    received, new_etags = 0, {}
+    for url in urls:
+        headers = {"Accept-Encoding": encoding}
+        if etags and etags.get(url):
+            headers["If-None-Match"] = etags[url]
+        response = client.get(url, headers=headers)
+        response.read()
+        received += response.num_bytes_downloaded
+        new_etags[url] = response.headers.get("etag")
+    return received, new_etags
+
+
+def measure(client: TestClient, convo_id: str, encoding: str, conditional: bool, rounds: int) -> tuple[float, float]:
+    _, etags = refresh(client, convo_id, encoding, None)
+    received = 0
+    cpu_start = time.process_time()
+    for _ in range(rounds):
+        n, _ = refresh(client, convo_id, encoding, etags if conditional else None)
+        received += n
+    cpu = time.process_time() - cpu_start
+    return received / rounds, cpu / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    init_mongo_client()
+    db_name = f"bench_etag_{os.getpid()}"
+    db = get_mongo_client()[db_name]
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: USER
+    try:
+        convo_id = seed(db, args.conversations, args.messages)
+        client = TestClient(app)
+        scenarios = [("identity", "identity", False), ("gzip", "gzip", False)]
+        if _brotli_module() is not None:
+            scenarios.append(("br", "br", False))
+        scenarios.append(("304 (gzip)", "gzip", True))
+
+        print(f"{'scenario':<12} {'bytes/refresh':>14} {'cpu ms/refresh':>15}")
+        for name, encoding, conditional in scenarios:
+            received, cpu_ms = measure(client, convo_id, encoding, conditional, args.rounds)
+            print(f"{name:<12} {received:14,.0f} {cpu_ms:15.2f}")
+    finally:
+        app.dependency_overrides.clear()
+        get_mongo_client().drop_database(db_name)
+        close_mongo_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark CPU: embedding cục bộ theo batch so với gọi module t2v-transformers từng object.
+
+Chạy từ thư mục gốc của repo:
+    LOCAL_EMBEDDING_MODEL_PATH=models/all-MiniLM-L6-v2 \
+    T2V_INFERENCE_URL=http://localhost:8082 \
+    python -m benchmarks.bench_embedding --texts 512 --batch-sizes 1 8 32 64
+
+- local: LocalEmbedder.embed_batch với từng batch size (không qua cache).
+- module: POST {T2V_INFERENCE_URL}/vectors cho từng text, giống cách Weaviate vector hoá từng object
+  khi insert / near_text (bỏ qua nếu T2V_INFERENCE_URL không được đặt).
+"""
+import argparse
+import random
+import time
+
+import requests
+
+from app.configurations.settings import get_env
+from app.services.embedding_service import LocalEmbedder
+
+SAMPLE_SENTENCES = [
+    "Heo {age} ngày tuổi nên ăn cám gì?",
+    "Đàn FARM-PORK-{age} đã tiêm vắc-xin dịch tả chưa?",
+    "Gà {age} ngày tuổi cần bổ sung thuốc gì để tăng sức đề kháng?",
+    "Liều lượng cám CP 201 cho heo tăng trọng {age} ngày là bao nhiêu kg/con/ngày?",
+    "Xin lỗi, tôi chưa tìm thấy hướng dẫn dinh dưỡng phù hợp trong cơ sở tri thức.",
+]
+
+
+def make_texts(n: int) -> list[str]:
+    rng = random.Random(42)
+    return [rng.choice(SAMPLE_SENTENCES).format(age=rng.randint(1, 180)) for _ in range(n)]
+
+
+def bench_local(texts: list[str], batch_size: int, embedder: LocalEmbedder) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embedder.embed_batch(texts[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+def bench_module(texts: list[str], url: str) -> float:
+    start = time.perf_counter()
+    with requests.Session() as session:
+        for text in texts:
+            session.post(f"{url.rstrip('/')}/vectors", json={"text": text}, timeout=30).raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    embedder = LocalEmbedder()
+    embedder.embed_batch(texts[:8])  # warm-up
+
+    print(f"{'path':<24} {'total s':>9} {'texts/s':>10} {'ms/text':>9}")
+    for batch_size in args.batch_sizes:
+        elapsed = bench_local(texts, batch_size, embedder)
+        print(f"{f'local batch={batch_size}':<24} {elapsed:>9.3f} {len(texts) / elapsed:>10.1f} {elapsed / len(texts) * 1000:>9.2f}")
+
+    url = get_env("T2V_INFERENCE_URL")
+    if url:
+        elapsed = bench_module(texts, url)
+        print(f"{'module per-object':<24} {elapsed:>9.3f} {len(texts) / elapsed:>10.1f} {elapsed / len(texts) * 1000:>9.2f}")
+    else:
+        print("T2V_INFERENCE_URL not set; skipping module path.")
+
+
+if __name__ == "__main__":
+    main()
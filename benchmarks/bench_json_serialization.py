@@ -0,0 +1,142 @@
+"""CPU của serialize trang danh sách: đường Pydantic cũ so với đường orjson trên dict thô (app.utils.fast_json).
+
+Chạy từ thư mục gốc của repo (không cần Mongo, document được sinh sẵn như khi đọc từ pymongo):
+    python -m benchmarks.bench_json_serialization --sizes 100 1000 10000 --rounds 20
+
+- messages: GET /conversations/{id}/messages. Cũ: _sanitize_doc -> MessageInDB -> dict tay -> jsonable_encoder
+  -> json.dumps. Mới: dict thô như get_page_raw -> dict tay -> orjson.
+- conversations: GET /conversations/. Cũ: ConversationInDB(**doc) trong repository, rồi validate lại theo
+  response_model=List[ConversationInDB] và dump mode="json" -> json.dumps. Mới: dict thô như list_by_user_raw -> orjson.
+Mỗi cỡ trang in median ms mỗi request, số byte và tỉ lệ tăng tốc; kiểm tra hai đường cho cùng JSON.
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import orjson
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.conversation import ConversationInDB
+from app.models.message import MessageInDB
+from app.repositories.message_repository import _sanitize_doc
+from app.utils.fast_json import dumps
+
+
+def _json_dumps(content) -> bytes:
+    # như starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def message_docs(n: int) -> List[dict]:
+    convo_id = ObjectId()
+    start = datetime(2025, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "conversation_id": convo_id,
+        "sender_type": "user" if i % 2 == 0 else "bot",
+        "content": "Đàn gà số 3 ăn Cám CP 201, liều 2.5 kg/con/ngày; cần theo dõi nhiệt độ chuồng." * 2,
+        "sender_id": "farmer@example.com" if i % 2 == 0 else None,
+        "timestamp": start + timedelta(seconds=i * 30, milliseconds=i % 1000),
+    } for i in range(n)]
+
+
+def conversation_docs(n: int) -> List[dict]:
+    start = datetime(2025, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "email": "farmer@example.com",
+        "facilityID": "facility-01",
+        "title": f"Tư vấn dinh dưỡng đàn {i}",
+        "created_at": start + timedelta(hours=i),
+        "updated_at": start + timedelta(hours=i, minutes=5),
+        "message_count": 2 * i,
+        "last_message_preview": "Đàn đang dùng Cám CP 201, liều 2.5 kg/con/ngày.",
+        "last_sender": "bot",
+        "last_message_at": start + timedelta(hours=i, minutes=5),
+    } for i in range(n)]
+
+
+def _envelope(messages: list) -> dict:
+    return {"success": True, "data": {"messages": messages, "total": len(messages), "total_messages": len(messages),
+                                      "limit": len(messages), "offset": 0}}
+
+
+def messages_pydantic(docs: List[dict]) -> bytes:
+    models = [MessageInDB(**_sanitize_doc(dict(d))) for d in docs]
+    data = [{
+        "id": str(m.id),
+        "conversation_id": str(m.conversation_id),
+        "content": m.content,
+        "sender_type": m.sender_type,
+        "sender_id": m.sender_id,
+        "timestamp": m.timestamp.isoformat(),
+    } for m in models]
+    return _json_dumps(jsonable_encoder(_envelope(data)))
+
+
+def messages_raw(docs: List[dict]) -> bytes:
+    # get_page_raw đã đổi _id/conversation_id sang chuỗi khi đọc
+    raw = [{**d, "_id": str(d["_id"]), "conversation_id": str(d["conversation_id"])} for d in docs]
+    data = [{
+        "id": d["_id"],
+        "conversation_id": d["conversation_id"],
+        "content": d.get("content", ""),
+        "sender_type": d["sender_type"],
+        "sender_id": d.get("sender_id"),
+        "timestamp": d["timestamp"],
+    } for d in raw]
+    return dumps(_envelope(data))
+
+
+_conversation_list = TypeAdapter(List[ConversationInDB])
+
+
+def conversations_pydantic(docs: List[dict]) -> bytes:
+    models = [ConversationInDB(**{**d, "_id": str(d["_id"])}) for d in docs]
+    # FastAPI: validate giá trị trả về theo response_model rồi dump mode="json"
+    validated = _conversation_list.validate_python(models, from_attributes=True)
+    return _json_dumps(_conversation_list.dump_python(validated, mode="json", by_alias=True))
+
+
+def conversations_raw(docs: List[dict]) -> bytes:
+    return dumps([{**d, "_id": str(d["_id"])} for d in docs])
+
+
+def median_ms(fn, docs, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(docs)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = [
+        ("messages", message_docs, messages_pydantic, messages_raw),
+        ("conversations", conversation_docs, conversations_pydantic, conversations_raw),
+    ]
+    print(f"{'endpoint':<14} {'items':>6} {'pydantic ms':>12} {'orjson ms':>10} {'speedup':>8} {'bytes':>10}")
+    for name, make_docs, slow, fast in cases:
+        for size in args.sizes:
+            docs = make_docs(size)
+            if orjson.loads(slow(docs)) != orjson.loads(fast(docs)):
+                raise SystemExit(f"{name}: hai đường serialize cho JSON khác nhau (size={size})")
+            slow_ms = median_ms(slow, docs, args.rounds)
+            fast_ms = median_ms(fast, docs, args.rounds)
+            print(f"{name:<14} {size:>6} {slow_ms:>12.2f} {fast_ms:>10.2f} {slow_ms / fast_ms:>7.1f}x "
+                  f"{len(fast(docs)):>10}")
+
+
+if __name__ == "__main__":
+    main()
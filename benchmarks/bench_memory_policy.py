@@ -0,0 +1,99 @@
+"""Mô phỏng nhiều tháng chat để so sánh kích thước ChatMemory và chi phí truy vấn có/không có memory policy.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_memory_policy --months 12 --conversations-per-day 40
+
+Mỗi lượt chat sinh một câu hỏi user (có lặp lại) và một câu trả lời bot (một phần là fallback/câu mẫu,
+một phần trả lời lặp lại). Kích thước index là số object được ghi (cộng dồn, trừ phần đã hết TTL).
+Latency truy vấn được ước lượng bằng top-5 cosine brute-force (NumPy) trên số vector tương ứng,
+như cận trên cho chi phí duyệt candidate; vector là ngẫu nhiên 384 chiều (cùng số chiều MiniLM).
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, UTC
+
+import numpy as np
+
+from app.services.gemini_service import BOILERPLATE_MESSAGES
+from app.services.memory_policy import MemoryIngestionPolicy
+
+QUESTIONS = [
+    "Đàn FARM-PORK-{n:03d} đang ăn gì?",
+    "Heo {age} ngày tuổi nên ăn cám gì?",
+    "Lịch tiêm phòng của đàn FARM-PORK-{n:03d}?",
+    "Chào bạn",
+    "Cảm ơn nhé",
+]
+ANSWERS = [
+    "Đàn FARM-PORK-{n:03d} hiện dùng Cám CP 201 — liều 2.5 kg/con/ngày.",
+    "Với heo {age} ngày tuổi, bạn nên dùng Green Feed tập ăn với liều 0.8 kg/con/ngày.",
+    "Chào bạn! Tôi có thể giúp gì cho trang trại của bạn hôm nay?",
+]
+
+
+def simulate(months: int, conversations_per_day: int, turns: int, policy: MemoryIngestionPolicy | None,
+             rng: random.Random) -> list[int]:
+    """Trả về kích thước index (số memory còn hạn) ở cuối mỗi tháng."""
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    alive: list[datetime | None] = []  # expires_at của từng memory đã lưu (None = không hết hạn)
+    sizes = []
+    for day in range(months * 30):
+        now = start + timedelta(days=day)
+        for c in range(conversations_per_day):
+            conversation_id = f"{day}-{c}"
+            for _ in range(turns):
+                n, age = rng.randint(1, 30), rng.choice([20, 35, 60, 100])
+                question = rng.choice(QUESTIONS).format(n=n, age=age)
+                if rng.random() < 0.25:
+                    answer = rng.choice(BOILERPLATE_MESSAGES).format(asset_id=f"FARM-PORK-{n:03d}")
+                else:
+                    answer = rng.choice(ANSWERS).format(n=n, age=age)
+                for content, sender in ((question, "user"), (answer, "bot")):
+                    if policy is None:
+                        alive.append(None)
+                        continue
+                    decision = policy.evaluate(conversation_id, content, sender, now=now)
+                    if decision.store:
+                        policy.mark_stored(conversation_id, decision.content_hash)
+                        alive.append(decision.expires_at)
+        if (day + 1) % 30 == 0:
+            # compaction chạy định kỳ: bỏ memory đã hết hạn
+            alive = [e for e in alive if e is None or e > now]
+            sizes.append(len(alive))
+    return sizes
+
+
+def query_latency_ms(n: int, dim: int = 384, repeats: int = 20) -> float:
+    if n == 0:
+        return 0.0
+    rng = np.random.default_rng(0)
+    index = rng.standard_normal((n, dim), dtype=np.float32)
+    index /= np.linalg.norm(index, axis=1, keepdims=True)
+    query = index[0]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        scores = index @ query
+        np.argpartition(scores, -5)[-5:]
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--conversations-per-day", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=6)
+    args = parser.parse_args()
+
+    baseline = simulate(args.months, args.conversations_per_day, args.turns, None, random.Random(1))
+    with_policy = simulate(args.months, args.conversations_per_day, args.turns, MemoryIngestionPolicy(), random.Random(1))
+
+    print(f"{'month':>5} {'no policy':>12} {'policy':>10} {'ratio':>7} {'query ms (no/with)':>22}")
+    for month, (a, b) in enumerate(zip(baseline, with_policy), start=1):
+        if month in (1, 3, 6) or month % 6 == 0 or month == args.months:
+            print(f"{month:>5} {a:>12} {b:>10} {b / a:>7.0%} "
+                  f"{query_latency_ms(a):>10.2f} / {query_latency_ms(b):<9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Dung lượng và độ trễ đọc của tầng lưu trữ lạnh message (`messages_archive`) so với `messages`.
+
+Chạy từ thư mục gốc của repo (cần Mongo, mặc định MONGO_URI trong .env):
+    python -m benchmarks.bench_message_archive --conversations 200 --messages 400 --bucket-size 200
+
+Benchmark ghi dữ liệu giả vào một database tạm (`bench_archive_<pid>`) rồi xoá khi xong:
+1. seed `--conversations` × `--messages` message (câu hỏi/trả lời tiếng Việt như dữ liệu thật),
+2. đo get_page_by_conversation ở đầu/giữa/cuối conversation khi mọi message còn ở `messages`,
+3. chuyển toàn bộ sang tầng lạnh bằng MessageRetentionService rồi đo lại,
+4. in storageSize / totalIndexSize của hai collection (collStats) và tỉ lệ nén của payload.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, UTC
+
+from bson import ObjectId
+
+from app.configurations.mongo_config import init_mongo_client, get_mongo_client, close_mongo_client
+from app.repositories.message_archive_repository import MESSAGE_ARCHIVE_COLLECTION
+from app.repositories.message_repository import MESSAGE_COLLECTION, MessageRepository
+from app.services.message_retention_service import MessageRetentionService
+
+QUESTIONS = [
+    "Đàn FARM-PORK-{n} đang ăn loại cám gì?",
+    "Heo {n} ngày tuổi nên dùng thuốc gì?",
+    "Lịch tiêm vắc-xin dịch tả của đàn {n} thế nào?",
+]
+ANSWERS = [
+    "Đàn đang dùng Cám CP 201, liều 2.5 kg/con/ngày, bắt đầu từ 2025-01-{d:02d}.",
+    "Giai đoạn này nên tẩy giun định kỳ và theo dõi tiêu hoá 2 ngày đầu sau khi đổi cám.",
+    "Mũi nhắc lại vắc-xin dịch tả dự kiến vào 2025-03-{d:02d}; đảm bảo chuồng trại thoáng mát.",
+]
+
+
+def seed(collection, conversations: int, per_conversation: int, rng: random.Random) -> list[ObjectId]:
+    convo_ids = [ObjectId() for _ in range(conversations)]
+    start = datetime.now(UTC) - timedelta(days=365)
+    for convo_id in convo_ids:
+        docs = []
+        for i in range(per_conversation):
+            bot = i % 2 == 1
+            text = (rng.choice(ANSWERS) if bot else rng.choice(QUESTIONS)).format(n=rng.randint(1, 999),
+                                                                                   d=rng.randint(1, 28))
+            docs.append({"conversation_id": convo_id, "sender_type": "bot" if bot else "user", "content": text,
+                         "sender_id": None if bot else "farmer@example.com",
+                         "timestamp": start + timedelta(minutes=i)})
+        collection.insert_many(docs)
+    return convo_ids
+
+
+def collection_size(db, name: str) -> tuple[int, int]:
+    stats = db.command("collStats", name)
+    return stats.get("storageSize", 0), stats.get("totalIndexSize", 0)
+
+
+def page_latency(repo: MessageRepository, convo_ids, offset_fn, limit: int, rounds: int, rng) -> float:
+    timings = []
+    for _ in range(rounds):
+        convo_id = rng.choice(convo_ids)
+        start = time.perf_counter()
+        repo.get_page_by_conversation(convo_id, offset_fn(), limit)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--bucket-size", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    init_mongo_client()
+    db_name = f"bench_archive_{os.getpid()}"
+    db = get_mongo_client()[db_name]
+    rng = random.Random(0)
+    try:
+        print(f"Seeding {args.conversations} conversations × {args.messages} messages...")
+        convo_ids = seed(db[MESSAGE_COLLECTION], args.conversations, args.messages, rng)
+        # index do repository tự tạo, như trong app
+        repo = MessageRepository(db)
+        offsets = {
+            "first page": lambda: 0,
+            "middle page": lambda: args.messages // 2,
+            "last page": lambda: max(0, args.messages - args.limit),
+        }
+
+        hot = {label: page_latency(repo, convo_ids, fn, args.limit, args.rounds, rng) for label, fn in offsets.items()}
+        hot_size = collection_size(db, MESSAGE_COLLECTION)
+
+        retention = MessageRetentionService(repo_factory=lambda: repo, retention_days=1, bucket_size=args.bucket_size,
+                                            max_conversations=args.conversations, max_ops_per_second=0)
+        stats = retention.run_once()
+        cold = {label: page_latency(repo, convo_ids, fn, args.limit, args.rounds, rng) for label, fn in offsets.items()}
+        cold_size = collection_size(db, MESSAGE_ARCHIVE_COLLECTION)
+
+        print(f"\n{'':<14} {'messages ms':>12} {'archive ms':>12}")
+        for label in offsets:
+            print(f"{label:<14} {hot[label]:12.2f} {cold[label]:12.2f}")
+        print(f"\n{'':<14} {'storage':>12} {'indexes':>12}")
+        print(f"{'messages':<14} {hot_size[0]:12,} {hot_size[1]:12,}")
+        print(f"{'archive':<14} {cold_size[0]:12,} {cold_size[1]:12,}")
+        ratio = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        print(f"\npayload: {stats['raw_bytes']:,} -> {stats['stored_bytes']:,} bytes ({ratio:.1f}x), "
+              f"{stats['buckets']} bucket, archive trong {stats['seconds']} s")
+    finally:
+        get_mongo_client().drop_database(db_name)
+        close_mongo_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Đọc/ghi message: layout một-document-mỗi-message (`messages`) so với bucket pattern (`message_buckets`).
+
+Chạy từ thư mục gốc của repo (cần Mongo, mặc định MONGO_URI trong .env):
+    python -m benchmarks.bench_message_buckets --conversations 100 --turns 200 --bucket-size 100
+
+Benchmark dùng một database tạm (`bench_buckets_<pid>`), xoá khi xong:
+- write: mỗi lượt chat ghi message user rồi message bot bằng `create` (như handle_chat), đo tổng thời gian
+  và số lượt ghi mỗi giây cho cả hai layout (`messages` có index (conversation_id, timestamp) như production nên có).
+- read: get_page_by_conversation trang đầu / giữa / cuối, median qua `--rounds` lần.
+- size: storageSize / totalIndexSize (collStats) và số document của mỗi layout.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, UTC
+
+from bson import ObjectId
+
+from app.configurations.mongo_config import init_mongo_client, get_mongo_client, close_mongo_client
+from app.models.message import MessageCreate
+from app.repositories.bucketed_message_repository import BucketedMessageRepository, MESSAGE_BUCKET_COLLECTION
+from app.repositories.message_repository import MESSAGE_COLLECTION, MessageRepository
+
+
+def write_turns(repo, convo_ids, turns: int) -> float:
+    start_ts = datetime.now(UTC) - timedelta(days=30)
+    start = time.perf_counter()
+    for t in range(turns):
+        for c, convo_id in enumerate(convo_ids):
+            ts = start_ts + timedelta(seconds=t * 60 + c)
+            repo.create(convo_id, MessageCreate(content=f"Đàn {c} ăn cám gì ở ngày {t}?", sender_type="user",
+                                                sender_id="farmer@example.com"), ts)
+            repo.create(convo_id, MessageCreate(content="Đàn đang dùng Cám CP 201, liều 2.5 kg/con/ngày.",
+                                                sender_type="bot"), ts + timedelta(milliseconds=1))
+    return time.perf_counter() - start
+
+
+def page_latency(repo, convo_ids, offset: int, limit: int, rounds: int, rng: random.Random) -> float:
+    timings = []
+    for _ in range(rounds):
+        convo_id = rng.choice(convo_ids)
+        start = time.perf_counter()
+        repo.get_page_by_conversation(convo_id, offset, limit)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--bucket-size", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=300)
+    args = parser.parse_args()
+
+    init_mongo_client()
+    db_name = f"bench_buckets_{os.getpid()}"
+    db = get_mongo_client()[db_name]
+    db[MESSAGE_COLLECTION].create_index([("conversation_id", 1), ("timestamp", 1)])
+    rng = random.Random(0)
+    try:
+        layouts = {
+            "documents": (MessageRepository(db), MESSAGE_COLLECTION),
+            "buckets": (BucketedMessageRepository(db, args.bucket_size), MESSAGE_BUCKET_COLLECTION),
+        }
+        convo_ids = [ObjectId() for _ in range(args.conversations)]
+        writes = args.conversations * args.turns * 2
+        total = args.turns * 2
+        offsets = {"first page": 0, "middle page": total // 2, "last page": max(0, total - args.limit)}
+
+        print(f"{'':<12} {'write s':>9} {'writes/s':>10} " + " ".join(f"{k:>12}" for k in offsets)
+              + f" {'docs':>9} {'storage':>12} {'indexes':>10}")
+        for name, (repo, collection) in layouts.items():
+            elapsed = write_turns(repo, convo_ids, args.turns)
+            reads = [page_latency(repo, convo_ids, offset, args.limit, args.rounds, rng) for offset in offsets.values()]
+            stats = db.command("collStats", collection)
+            print(f"{name:<12} {elapsed:9.2f} {writes / elapsed:10,.0f} "
+                  + " ".join(f"{ms:10.2f}ms" for ms in reads)
+                  + f" {stats.get('count', 0):9,} {stats.get('storageSize', 0):12,} {stats.get('totalIndexSize', 0):10,}")
+    finally:
+        get_mongo_client().drop_database(db_name)
+        close_mongo_client()
+
+
+if __name__ == "__main__":
+    main()
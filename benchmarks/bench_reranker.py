@@ -0,0 +1,84 @@
+"""Microbenchmark cho KnowledgeReranker: 1k candidate × 1k câu hỏi.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_reranker --queries 1000 --candidates 1000
+
+- features: dựng ma trận đặc trưng (N, 5) cho một câu hỏi từ N candidate (gồm BM25 trên nội dung).
+- score_batch: chấm (Q, N, 5) với trọng số chung và trọng số riêng theo từng câu hỏi, rồi lấy top-5.
+- python loop: cùng phép chấm nhưng lặp dict bằng Python, để so sánh.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.knowledge_reranker import FEATURES, KnowledgeReranker, RerankWeights
+
+STAGES = [("Tập ăn", 25, 45), ("Tăng trọng", 46, 90), ("Vỗ béo", 91, 150), ("Úm gà", 1, 21)]
+
+
+def make_candidates(n: int, rng: random.Random) -> list[dict]:
+    candidates = []
+    for i in range(n):
+        stage, lo, hi = rng.choice(STAGES)
+        species = "Gà" if stage == "Úm gà" else rng.choice(["Heo", "Bò"])
+        candidates.append({
+            "properties": {
+                "content": f"Giai đoạn {stage} của {species} từ {lo} đến {hi} ngày tuổi. Cám CP {200 + i % 50}.",
+                "species": species,
+                "min_age_days": lo,
+                "max_age_days": hi,
+            },
+            "distance": rng.random(),
+            "created_at": time.time() - rng.randint(0, 3 * 365) * 86400,
+        })
+    return candidates
+
+
+def timed(label: str, fn, repeats: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<40} {best * 1000:10.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--candidates", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    reranker = KnowledgeReranker(facility_weights={})
+    candidates = make_candidates(args.candidates, rng)
+
+    timed(f"features (1 query × {args.candidates})",
+          lambda: reranker.features("Heo 35 ngày tuổi nên ăn cám gì?", candidates, age_days=35))
+
+    np_rng = np.random.default_rng(0)
+    features = np_rng.random((args.queries, args.candidates, len(FEATURES)), dtype=np.float32)
+    shared = RerankWeights().as_array()
+    per_query = np_rng.random((args.queries, len(FEATURES)), dtype=np.float32)
+
+    scores = timed(f"score_batch shared ({args.queries}×{args.candidates})",
+                   lambda: reranker.score_batch(features, shared))
+    timed(f"score_batch per-query ({args.queries}×{args.candidates})",
+          lambda: reranker.score_batch(features, per_query))
+    timed("top_k_batch k=5", lambda: reranker.top_k_batch(scores, 5))
+
+    # so sánh: cùng phép chấm bằng vòng lặp Python trên dict (chỉ 100 câu hỏi để không quá lâu)
+    q = min(100, args.queries)
+    dict_rows = [[dict(zip(FEATURES, row)) for row in features[i].tolist()] for i in range(q)]
+    weights = dict(zip(FEATURES, shared.tolist()))
+    timed(f"python loop ({q}×{args.candidates})", lambda: [
+        [sum(row[f] * weights[f] for f in FEATURES) for row in rows] for rows in dict_rows
+    ], repeats=1)
+
+
+if __name__ == "__main__":
+    main()
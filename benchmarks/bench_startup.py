@@ -0,0 +1,71 @@
+"""Benchmark: thời gian import `app.main` và time-to-first-request.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_startup --runs 5
+    MONGO_URI=mongodb://10.255.255.1:27017 python -m benchmarks.bench_startup   # Mongo không truy cập được
+
+- import time: mỗi lần chạy một interpreter mới `python -c "import app.main"` và đo wall time.
+- time-to-first-request: khởi động uvicorn, poll `GET /` cho tới khi nhận response đầu tiên.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def measure_import(runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app.main"], check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_first_request(runs: int, port: int) -> list[float]:
+    url = f"http://127.0.0.1:{port}/"
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while True:
+                try:
+                    httpx.get(url, timeout=0.5)
+                    break
+                except httpx.HTTPError:
+                    if proc.poll() is not None:
+                        raise RuntimeError("uvicorn exited before serving a request")
+                    time.sleep(0.01)
+            timings.append(time.perf_counter() - start)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return timings
+
+
+def report(label: str, timings: list[float]):
+    print(f"{label:<24} median {statistics.median(timings) * 1000:8.1f} ms   "
+          f"min {min(timings) * 1000:8.1f} ms   max {max(timings) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    report("import app.main", measure_import(args.runs))
+    report("time-to-first-request", measure_first_request(args.runs, args.port))
+
+
+if __name__ == "__main__":
+    main()
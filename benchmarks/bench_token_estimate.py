@@ -0,0 +1,76 @@
+"""Độ chính xác của ước lượng token cục bộ (app.services.prompt_budget) so với count_tokens của Gemini.
+
+Chạy từ thư mục gốc của repo (cần GEMINI_API_KEY):
+    python -m benchmarks.bench_token_estimate --calibrate 10
+
+Dùng các đoạn mẫu tiếng Việt/ASCII lẫn số (câu hỏi, memory, dữ liệu truy xuất):
+- hiệu chỉnh hệ số bằng `--calibrate` đoạn đầu (như lấy mẫu trong app), rồi đo sai số tương đối trên phần còn lại;
+- so sánh độ dao động số token thật của các memory cắt theo 800 ký tự (cách cũ) và theo ngân sách token.
+"""
+import argparse
+import statistics
+import time
+
+from app.services.gemini_service import get_model
+from app.services.prompt_budget import _raw_estimate, calibration, estimate_tokens, truncate_to_tokens
+
+SAMPLES = [
+    "Đàn heo 35 ngày tuổi nên ăn cám gì?",
+    "Đàn ASSET_HEO_001 đang dùng Cám CP 201, liều 2.5 kg/con/ngày, bắt đầu từ ngày 2025-03-14.",
+    "Lịch tiêm phòng của đàn G003: vắc-xin Newcastle lần 2 ngày 21, Gumboro ngày 14, cúm gia cầm ngày 28.",
+    "Tôi muốn hỏi thông tin về đàn bò B012, có bao nhiêu con bị ho trong tuần này?",
+    "Nhiệt độ chuồng nên giữ ở 28-30°C trong 2 tuần đầu, sau đó giảm dần 2°C mỗi tuần.",
+    "Feed: Starter 21% protein, 3000 kcal/kg; Grower 18% protein; Finisher 16% protein.",
+    "Heo con mới nhập chuồng cần được tiêm vắc-xin dịch tả, tai xanh và lở mồm long móng theo lịch của thú y.",
+    "Bao nhiêu đàn đang ăn Cám CP 201? Những đàn nào đến hạn tiêm trong 7 ngày tới?",
+    "Gà con mới nở cho ăn cám nào, bao nhiêu gam một ngày, uống nước có pha điện giải không?",
+    "Đàn H001 ăn gì từ ngày 30 đến ngày 60? Cho tôi xem các lần đổi thức ăn và lý do.",
+    "Theo dõi tăng trọng: tuần 1 đạt 1.2 kg, tuần 2 đạt 2.9 kg, tuần 3 đạt 5.1 kg, FCR 1.45.",
+    "Khi heo bị tiêu chảy, cần cách ly, bổ sung men tiêu hoá và điện giải, báo thú y nếu kéo dài quá 2 ngày.",
+] * 3
+
+
+def count(model, text: str) -> int:
+    return int(model.count_tokens(text).total_tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calibrate", type=int, default=10, help="số đoạn dùng để hiệu chỉnh hệ số")
+    parser.add_argument("--memory-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    model = get_model()
+    if model is None:
+        raise SystemExit("Cần GEMINI_API_KEY để gọi count_tokens.")
+
+    texts = [" ".join(SAMPLES[i:i + 1 + i % 5]) for i in range(len(SAMPLES))]
+    start = time.perf_counter()
+    for text in texts:
+        estimate_tokens(text)
+    local_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+    actual = {}
+    for text in texts:
+        actual[text] = count(model, text)
+
+    uncalibrated = [abs(_raw_estimate(t) - actual[t]) / actual[t] for t in texts[args.calibrate:]]
+    for text in texts[:args.calibrate]:
+        calibration.update(_raw_estimate(text), actual[text])
+    calibrated = [abs(estimate_tokens(t) - actual[t]) / actual[t] for t in texts[args.calibrate:]]
+
+    print(f"local estimate: {local_us:.1f} µs/text, calibration factor {calibration.factor:.3f}")
+    print(f"relative error  uncalibrated median {statistics.median(uncalibrated):.1%} max {max(uncalibrated):.1%}")
+    print(f"relative error  calibrated   median {statistics.median(calibrated):.1%} max {max(calibrated):.1%}")
+
+    memories = [" ".join(SAMPLES[i:i + 12]) for i in range(0, len(SAMPLES) - 12, 3)]
+    by_chars = [count(model, m[:800]) for m in memories]
+    by_tokens = [count(model, truncate_to_tokens(m, args.memory_tokens)) for m in memories]
+    print(f"memory tokens, cut at 800 chars:          min {min(by_chars)} max {max(by_chars)} "
+          f"stdev {statistics.pstdev(by_chars):.1f}")
+    print(f"memory tokens, cut at {args.memory_tokens} est. tokens: min {min(by_tokens)} max {max(by_tokens)} "
+          f"stdev {statistics.pstdev(by_tokens):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Chi phí chuẩn hoá payload trace API bằng parse_asset_trace so với duyệt JSON thô ở mỗi câu hỏi.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_trace_parsing --history 5000 --feeds 20 --questions 1000
+
+Payload giả có `--history` sự kiện trong `fullHistory`, entry cuối có `--feeds` feeds và medications.
+- json decode: chi phí decode body (trả một lần cho mỗi lượt gọi trace API, như requests `.json()`).
+- raw walk: mỗi câu hỏi duyệt lại payload và các alias key rồi ghép câu trả lời (hành vi trước đây).
+- parse once + format: parse một lần, các câu hỏi sau chỉ ghép từ summary đã tính sẵn.
+"""
+import argparse
+import json
+import time
+
+from app.models.asset_trace import parse_asset_trace
+
+
+def make_payload(history_len: int, n_feeds: int) -> dict:
+    history = [{"action": "WEIGH", "details": {"weightKg": 20 + i * 0.1, "note": "x" * 40}} for i in range(history_len)]
+    history.append({"details": {
+        "feeds": [{"feedName": f"Cám CP {i}", "dosageKg": 2.5, "startDate": "2025-01-01", "endDate": "2025-02-01",
+                   "notes": "2 bữa/ngày"} for i in range(n_feeds)],
+        "medication": [{"medicationName": f"Vắc-xin {i}", "dose": "2ml", "appliedDate": "2025-01-05",
+                        "nextDueDate": "2025-03-05"} for i in range(n_feeds)],
+    }})
+    return {"assetID": "BENCH-PORK-00001", "fullHistory": history}
+
+
+def raw_walk_answer(asset: dict, asset_id: str) -> str:
+    """Tái hiện cách handler cũ đọc payload: alias key và nhánh kiểu dữ liệu ở mỗi câu hỏi."""
+    full_history = asset.get("fullHistory", []) or asset.get("history", [])
+    latest_details = {}
+    if full_history:
+        latest = full_history[-1]
+        latest_details = latest.get("details", {}) if isinstance(latest, dict) else {}
+    feeds = latest_details.get("feeds") or latest_details.get("feed") or []
+    parts = []
+    for f in feeds:
+        if isinstance(f, dict):
+            seg = f.get("name") or f.get("feedName") or "(không tên)"
+            if f.get("dosageKg") is not None:
+                seg += f" — liều {f.get('dosageKg')} kg/con/ngày"
+            if f.get("startDate") or f.get("endDate"):
+                seg += f" (từ {f.get('startDate') or '??'} đến {f.get('endDate') or '??'})"
+            if f.get("notes"):
+                seg += f"; Ghi chú: {f.get('notes')}"
+            parts.append(seg)
+        else:
+            parts.append(str(f))
+    return f"Đàn {asset_id} hiện dùng các loại thức ăn: " + ", ".join(parts)
+
+
+def timed(label: str, fn, repeats: int = 3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<45} {best * 1000:10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=5000)
+    parser.add_argument("--feeds", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=1000)
+    args = parser.parse_args()
+
+    payload = make_payload(args.history, args.feeds)
+    body = json.dumps(payload)
+    asset_id = payload["assetID"]
+    print(f"payload: {len(body) / 1024:.0f} KiB, {args.history} history events, {args.questions} questions\n")
+
+    timed("json decode (once per trace call)", lambda: json.loads(body))
+    timed(f"raw walk × {args.questions}",
+          lambda: [raw_walk_answer(payload, asset_id) for _ in range(args.questions)])
+
+    def parse_then_format():
+        trace = parse_asset_trace(payload, asset_id)
+        return [f"Đàn {asset_id} hiện dùng các loại thức ăn: " + trace.feed_summary for _ in range(args.questions)]
+
+    timed(f"parse once + format × {args.questions}", parse_then_format)
+    timed("parse_asset_trace (single)", lambda: parse_asset_trace(payload, asset_id), repeats=20)
+
+    assert raw_walk_answer(payload, asset_id) == parse_then_format()[0]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""So sánh độ trễ near_vector: collection dùng chung lọc theo facilityID với collection multi-tenant (một tenant/facility),
+khi số facility tăng dần.
+
+Chạy từ thư mục gốc của repo (cần Weaviate, mặc định WEAVIATE_HOST/WEAVIATE_PORT trong .env):
+    python -m benchmarks.bench_weaviate_tenancy --facilities 10 50 200 --objects-per-facility 200 --queries 200
+
+Benchmark tạo hai collection tạm (`BenchShared<pid>`, `BenchTenant<pid>`) với vector ngẫu nhiên
+(`--dim` chiều, không qua vectorizer) rồi xoá khi xong. Mỗi mức facility nạp thêm dữ liệu cho các facility
+mới, sau đó đo p50/p95 của `--queries` truy vấn vào facility ngẫu nhiên:
+- shared: một HNSW index cho mọi facility, Filter facilityID (hành vi khi WEAVIATE_MULTI_TENANCY=false).
+- tenant: collection.with_tenant(facility), index chỉ chứa dữ liệu của facility đó.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from app.configurations.weaviate_config import init_weaviate_client, close_weaviate_client
+from app.services.weaviate_tenancy import tenant_name
+
+
+def random_vector(rng: random.Random, dim: int) -> list[float]:
+    return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+
+def seed(shared, tenants, facility_ids, per_facility: int, dim: int, rng: random.Random):
+    from weaviate.classes.data import DataObject
+    from weaviate.classes.tenants import Tenant
+
+    tenants.tenants.create([Tenant(name=tenant_name(f)) for f in facility_ids])
+    for facility_id in facility_ids:
+        objects = [
+            DataObject(properties={"content": f"{facility_id} #{i}", "facilityID": facility_id},
+                       vector=random_vector(rng, dim))
+            for i in range(per_facility)
+        ]
+        shared.data.insert_many(objects)
+        tenants.with_tenant(tenant_name(facility_id)).data.insert_many(objects)
+
+
+def measure(query, n: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        query()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facilities", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--objects-per-facility", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    from weaviate.classes.config import Configure, DataType, Property, Tokenization
+    from weaviate.classes.query import Filter
+
+    client = init_weaviate_client()
+    if client is None:
+        raise SystemExit("Không thể kết nối tới Weaviate.")
+
+    shared_name, tenant_collection_name = f"BenchShared{os.getpid()}", f"BenchTenant{os.getpid()}"
+    properties = [
+        Property(name="content", data_type=DataType.TEXT),
+        Property(name="facilityID", data_type=DataType.TEXT, tokenization=Tokenization.FIELD, index_filterable=True),
+    ]
+    rng = random.Random(0)
+    try:
+        client.collections.create(name=shared_name, properties=properties,
+                                  vectorizer_config=Configure.Vectorizer.none())
+        client.collections.create(name=tenant_collection_name, properties=properties,
+                                  vectorizer_config=Configure.Vectorizer.none(),
+                                  multi_tenancy_config=Configure.multi_tenancy(enabled=True))
+        shared = client.collections.get(shared_name)
+        tenants = client.collections.get(tenant_collection_name)
+
+        facility_ids: list[str] = []
+        print(f"{'facilities':>10} {'objects':>9} {'shared p50':>11} {'p95':>8} {'tenant p50':>11} {'p95':>8}")
+        for target in sorted(args.facilities):
+            new = [f"bench-farm-{i:04d}" for i in range(len(facility_ids), target)]
+            seed(shared, tenants, new, args.objects_per_facility, args.dim, rng)
+            facility_ids.extend(new)
+
+            def shared_query():
+                facility_id = rng.choice(facility_ids)
+                shared.query.near_vector(near_vector=random_vector(rng, args.dim), limit=args.limit,
+                                         filters=Filter.by_property("facilityID").equal(facility_id))
+
+            def tenant_query():
+                facility_id = rng.choice(facility_ids)
+                tenants.with_tenant(tenant_name(facility_id)).query.near_vector(
+                    near_vector=random_vector(rng, args.dim), limit=args.limit)
+
+            shared_p50, shared_p95 = measure(shared_query, args.queries)
+            tenant_p50, tenant_p95 = measure(tenant_query, args.queries)
+            print(f"{target:>10} {target * args.objects_per_facility:>9,} {shared_p50:>9.2f}ms {shared_p95:>6.2f}ms "
+                  f"{tenant_p50:>9.2f}ms {tenant_p95:>6.2f}ms")
+    finally:
+        for name in (shared_name, tenant_collection_name):
+            if client.collections.exists(name):
+                client.collections.delete(name)
+        close_weaviate_client()
+
+
+if __name__ == "__main__":
+    main()
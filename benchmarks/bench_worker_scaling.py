@@ -0,0 +1,89 @@
+"""Benchmark: throughput của app khi tăng số worker Gunicorn (chế độ multi-worker).
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_worker_scaling --workers 1 2 4 --duration 10 --path /
+
+Với mỗi số worker, script khởi động `gunicorn -c gunicorn.conf.py app.main:app`, bắn tải
+bằng httpx (async) trong `--duration` giây và in ra req/s cùng hiệu suất so với 1 worker
+(lý tưởng là tuyến tính: N worker ~ N lần throughput).
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null", "app.main:app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready in {timeout}s")
+
+
+async def run_load(url: str, duration: float, concurrency: int) -> int:
+    done = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal done
+        while time.monotonic() < deadline:
+            resp = await client.get(url)
+            if resp.status_code < 500:
+                done += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=10.0) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cpus = multiprocessing.cpu_count()
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, max(1, cpus // 2), cpus}))
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    baseline = None
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'efficiency':>10}")
+    for n in args.workers:
+        proc = start_server(n, args.port)
+        try:
+            wait_until_ready(url)
+            total = asyncio.run(run_load(url, args.duration, args.concurrency))
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+        rps = total / args.duration
+        baseline = baseline or rps / n
+        speedup = rps / baseline
+        print(f"{n:>8} {rps:>10.1f} {speedup:>8.2f} {speedup / n:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+# Cấu hình Gunicorn cho chế độ multi-worker:
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# preload_app = False để app được import trong từng worker sau khi fork; client Mongo,
+# Weaviate, Gemini và cache được khởi tạo trong `lifespan` của mỗi worker.
+# Khi chạy nhiều worker nên đặt CACHE_BACKEND=redis để các worker dùng chung cache.
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = False
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+forwarded_allow_ips = "*"
+accesslog = "-"